@@ -88,6 +88,12 @@ from utils import (
     cargar_y_limpiar_datos,
     generar_reporte_excel,
     generar_excel_saldos_abiertos,
+    guardar_saldos_abiertos,
+    listar_periodos_saldos,
+    cargar_saldos_abiertos,
+    periodo_de_fecha,
+    compactar_tipos,
+    leer_excel_con_encabezado,
 
     # Conciliaciones COFERSA
     generar_reporte_cofersa,
@@ -524,7 +530,7 @@ def render_especificaciones():
         logica_especifica = LOGICA_POR_CUENTA.get(cuenta_seleccionada, "No hay una guía detallada para esta cuenta.")
         st.markdown(logica_especifica)
 
-    st.subheader("3. Cargue los Archivos de Excel (.xlsx):", anchor=False)
+    st.subheader("3. Cargue los Archivos (.xlsx, .csv o .parquet):", anchor=False)
     st.markdown("*Asegúrese de que los datos estén en la **primera hoja** y los **encabezados en la primera fila**.*")
 
     columnas = estrategia_actual.get("columnas_requeridas", [])
@@ -535,24 +541,43 @@ def render_especificaciones():
 
     col1, col2 = st.columns(2)
     with col1:
-        uploaded_actual = st.file_uploader(estrategia_actual["label_actual"], type="xlsx", key=f"actual_{estrategia_actual['id']}")
+        uploaded_actual = st.file_uploader(estrategia_actual["label_actual"], type=["xlsx", "csv", "parquet"], key=f"actual_{estrategia_actual['id']}")
     with col2:
-        uploaded_anterior = st.file_uploader(estrategia_actual["label_anterior"], type="xlsx", key=f"anterior_{estrategia_actual['id']}")
+        # Saldos anteriores: del almacén local (ya limpios) o, si no hay, desde el Excel del mes pasado
+        periodos_guardados = listar_periodos_saldos(casa_seleccionada, cuenta_seleccionada)
+        origen_saldos = "Archivo Excel"
+        if periodos_guardados:
+            origen_saldos = st.radio("Origen de los saldos anteriores:", ["Almacén local", "Archivo Excel"], horizontal=True, key=f"origen_{estrategia_actual['id']}")
+        if origen_saldos == "Almacén local":
+            periodo_anterior = st.selectbox("Periodo guardado:", periodos_guardados, key=f"periodo_{estrategia_actual['id']}",
+                                            help="Debe ser anterior al mes del archivo actual (al re-procesar un mes, elija el previo).")
+            uploaded_anterior = cargar_saldos_abiertos(casa_seleccionada, cuenta_seleccionada, periodo_anterior)
+            st.caption(f"📦 {len(uploaded_anterior)} saldos abiertos de {periodo_anterior}.")
+        else:
+            uploaded_anterior = st.file_uploader(estrategia_actual["label_anterior"], type=["xlsx", "csv", "parquet"], key=f"anterior_{estrategia_actual['id']}")
         
-    if uploaded_actual and uploaded_anterior:
+    if uploaded_actual and uploaded_anterior is not None:
         if st.button("▶️ Iniciar Conciliación", type="primary", use_container_width=True):
             progress_container = st.empty()
             log_messages = []
             try:
                 with st.spinner('Cargando y limpiando datos...'):
                     df_full = cargar_y_limpiar_datos(uploaded_actual, uploaded_anterior, log_messages)
+                if df_full is not None and origen_saldos == "Almacén local":
+                    # Cada corrida se guarda con el mes de su fecha máxima: un periodo igual o posterior al del
+                    # archivo actual ya contiene sus pendientes y se contarían dos veces
+                    periodo_corrida = periodo_de_fecha(df_full['Fecha'].max())
+                    if periodo_corrida and periodo_anterior >= periodo_corrida:
+                        st.error(f"❌ El periodo guardado {periodo_anterior} no es anterior al del archivo actual ({periodo_corrida}). Elija el periodo del mes previo.")
+                        df_full = None
                 if df_full is not None:
                     progress_container.progress(0, text="Iniciando fases de conciliación...")
                     df_resultado = estrategia_actual["funcion_principal"](df_full.copy(), log_messages, progress_bar=progress_container)
                     progress_container.progress(1.0, text="¡Proceso completado!")
                     
-                    st.session_state.df_saldos_abiertos = df_resultado[~df_resultado['Conciliado']].copy()
-                    st.session_state.df_conciliados = df_resultado[df_resultado['Conciliado']].copy()
+                    # En sesión se guardan compactados (también el texto libre) para no multiplicar la memoria
+                    st.session_state.df_saldos_abiertos = compactar_tipos(df_resultado[~df_resultado['Conciliado']].copy(), log_messages, texto_libre=True)
+                    st.session_state.df_conciliados = compactar_tipos(df_resultado[df_resultado['Conciliado']].copy(), log_messages, texto_libre=True)
                     
                     # --- GENERACIÓN DE NOMBRE DE ARCHIVO ---
                     codigos_casa = {
@@ -581,7 +606,14 @@ def render_especificaciones():
                     st.session_state.nombre_archivo_salida = nombre_final
                     # ----------------------------------------------
 
-                    st.session_state.excel_saldos_output = generar_excel_saldos_abiertos(st.session_state.df_saldos_abiertos)
+                    # Los pendientes quedan en el almacén local para el próximo mes; el Excel es opcional
+                    periodo = periodo_de_fecha(fecha_max)
+                    if periodo:
+                        guardar_saldos_abiertos(st.session_state.df_saldos_abiertos, casa_seleccionada, cuenta_seleccionada, periodo)
+                        log_messages.append(f"💾 Saldos abiertos guardados en el almacén local ({periodo}): {len(st.session_state.df_saldos_abiertos)} partidas.")
+                    else:
+                        log_messages.append("⚠️ Sin fecha válida: los saldos abiertos no se guardaron en el almacén local.")
+                    st.session_state.excel_saldos_output = None
                     
                     st.session_state.excel_output = generar_reporte_excel(
                         df_full, st.session_state.df_saldos_abiertos, st.session_state.df_conciliados,
@@ -620,16 +652,21 @@ def render_especificaciones():
             # Ej: Saldos_071_212.05.1019 NOV.25.xlsx
             nombre_saldos = "Saldos_" + st.session_state.get('nombre_archivo_salida', 'proximo_mes.xlsx')
             
-            st.download_button(
-                "⬇️ Descargar Saldos para Próximo Mes (Excel)", 
-                st.session_state.excel_saldos_output, 
-                file_name=nombre_saldos, # <--- CAMBIO SUGERIDO
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", 
-                use_container_width=True, 
-                key="download_saldos_xlsx"
-            )
+            if st.session_state.get('excel_saldos_output') is None:
+                if st.button("📄 Preparar Saldos para Próximo Mes (Excel)", use_container_width=True, key="preparar_saldos_xlsx"):
+                    st.session_state.excel_saldos_output = generar_excel_saldos_abiertos(st.session_state.df_saldos_abiertos)
+                    st.rerun()
+            else:
+                st.download_button(
+                    "⬇️ Descargar Saldos para Próximo Mes (Excel)", 
+                    st.session_state.excel_saldos_output, 
+                    file_name=nombre_saldos, # <--- CAMBIO SUGERIDO
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", 
+                    use_container_width=True, 
+                    key="download_saldos_xlsx"
+                )
         
-        st.info("**Instrucción de Ciclo Mensual:** Para el próximo mes, debe usar el archivo CSV descargado como el archivo de 'saldos anteriores'.")
+        st.info("**Instrucción de Ciclo Mensual:** Los saldos abiertos quedan guardados en el almacén local; el próximo mes elija 'Almacén local' como origen de los saldos anteriores. El Excel de saldos sigue disponible como respaldo.")
         
         with st.expander("Ver registro detallado del proceso"):
             st.text_area("Log de Conciliación", '\n'.join(st.session_state.log_messages), height=300, key="log_area")
@@ -677,13 +714,13 @@ def render_especificaciones_cofersa():
         from guides import LOGICA_POR_CUENTA
         st.markdown(LOGICA_POR_CUENTA.get(cuenta_seleccionada, "Guía no disponible."))
 
-    st.subheader("Cargue los Archivos (.xlsx o .xls):", anchor=False)
+    st.subheader("Cargue los Archivos (.xlsx, .xls, .csv o .parquet):", anchor=False)
     
     col1, col2 = st.columns(2)
     with col1:
-        uploaded_actual = st.file_uploader("Movimientos del Mes Actual", type=['xlsx', 'xls'], key="cof_act")
+        uploaded_actual = st.file_uploader("Movimientos del Mes Actual", type=['xlsx', 'xls', 'csv', 'parquet'], key="cof_act")
     with col2:
-        uploaded_anterior = st.file_uploader("Saldos del Mes Anterior", type=['xlsx', 'xls'], key="cof_ant")
+        uploaded_anterior = st.file_uploader("Saldos del Mes Anterior", type=['xlsx', 'xls', 'csv', 'parquet'], key="cof_ant")
         
     if uploaded_actual and uploaded_anterior:
         if st.button("▶️ Iniciar Conciliación COFERSA", type="primary", use_container_width=True):
@@ -1192,7 +1229,7 @@ def render_comisiones_bancarias():
             try:
                 with st.spinner(f"Analizando {modo_auditoria} de {casa_sel}..."):
                     # Cargamos los archivos para la lógica y para la réplica en el reporte
-                    df_cb_data = pd.read_excel(f_cb)
+                    df_cb_data, _ = leer_excel_con_encabezado(f_cb, ['ASIENTO'], minimo=1, exacto=True, por_defecto=0)
                     df_cg_data = pd.read_excel(f_cg)
                     df_cb_replica = pd.read_excel(f_cb, header=None) # Para la hoja de consulta exacta
 
@@ -1261,7 +1298,7 @@ def render_comisiones_bancarias_cofersa():
             log = []
             try:
                 with st.spinner("Analizando datos de Cofersa..."):
-                    df_cb_data = pd.read_excel(f_cb)
+                    df_cb_data, _ = leer_excel_con_encabezado(f_cb, ['ASIENTO'], minimo=1, exacto=True, por_defecto=0)
                     df_cg_data = pd.read_excel(f_cg)
                     df_cb_replica = pd.read_excel(f_cb, header=None)
 
@@ -1891,15 +1928,7 @@ def render_apartados_liberaciones():
 
             # B. Carga de datos con detección de encabezado automática
             nombre_real_hoja = hojas_disponibles[hojas_mes.index(mes_anterior_sel)]
-            df_temp_m = pd.read_excel(f_maestro, sheet_name=nombre_real_hoja, header=None)
-            h_row_m = 0
-            for i in range(min(20, len(df_temp_m))):
-                fila_titles = [str(x).upper() for x in df_temp_m.iloc[i].values]
-                if "CTA" in fila_titles or "CUENTA" in fila_titles:
-                    h_row_m = i
-                    break
-            
-            df_m = pd.read_excel(f_maestro, sheet_name=nombre_real_hoja, header=h_row_m)
+            df_m, _ = leer_excel_con_encabezado(f_maestro, ['CTA', 'CUENTA'], hoja=nombre_real_hoja, minimo=1, exacto=True, por_defecto=0)
             df_b_raw = pd.read_excel(f_balance, header=None)
 
             # C. Ejecución de la IA (Logic)
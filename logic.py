@@ -13,13 +13,20 @@ import unicodedata
 import xlsxwriter
 from difflib import SequenceMatcher  # Necesario para la detección de errores de tipeo
 import bisect
+from collections import deque
 import datetime
+import time
+from utils import convertir_montos, convertir_monto, leer_excel_con_encabezado, buscar_hoja_con_encabezado, aplicar_encabezado
 
 # --- Tolerancias Generales (Mayoreo) ---
 TOLERANCIA_MAX_BS = 2.00      # Margen permitido en Bolívares
 TOLERANCIA_MAX_USD = 0.50     # Margen permitido en Dólares
 TOLERANCIA_CERO = 0.00        # Para cruces que deben ser exactos
 
+# --- Las mismas tolerancias en céntimos enteros (columnas Monto_BS_c / Monto_USD_c) ---
+TOLERANCIA_MAX_BS_C = round(TOLERANCIA_MAX_BS * 100)
+TOLERANCIA_MAX_USD_C = round(TOLERANCIA_MAX_USD * 100)
+
 # --- Tolerancias Estrictas (Cierres Contables) ---
 TOLERANCIA_ESTRICTA_USD = 0.00 # Usado en Cobros Viajeros
 TOLERANCIA_ESTRICTA_BS = 0.00  # Usado en Asientos por Clasificar
@@ -28,6 +35,12 @@ TOLERANCIA_ESTRICTA_BS = 0.00  # Usado en Asientos por Clasificar
 TOLERANCIA_COFERSA = 0.00     # Saldo 0 estricto para Envíos y Fondos
 TOLERANCIA_ESTRICTA = 0.00  
 
+# --- Presupuesto de Búsqueda Combinatoria (Grupos N vs 1) ---
+MAX_ELEMENTOS_GRUPO = 6               # Máximo de movimientos que pueden sumar contra 1
+PRESUPUESTO_SUBCONJUNTOS = 200_000    # Operaciones permitidas por cada monto objetivo
+LIMITE_SEGUNDOS_GRUPOS = 60           # Tiempo máximo de cada fase de grupos (complejos y por NIT)
+PRESUPUESTO_GRUPOS_NIT = 300_000      # Nodos de búsqueda permitidos por NIT (sub-grupos que suman cero)
+
 # ==============================================================================
 # 2. HELPERS UNIVERSALES (RADAR DE COLUMNAS Y LIMPIEZA)
 # ==============================================================================
@@ -49,31 +62,445 @@ def buscar_columna_comisiones(df, palabras):
             return col
     return None
 
+def texto_celdas(serie):
+    """
+    str() de cada celda y '' en las vacías, siempre como object: admite .str aunque la columna venga
+    entera en blanco (float64 NaN) y permite recorrer celda a celda las columnas category del mayor compactado.
+    """
+    return serie.astype(object).map(str, na_action='ignore').fillna('')
+
+# --- Motor de Emparejamiento 1 a 1 (Débitos vs Créditos) ---
+def _buscar_libre(padres, i):
+    """Union-Find con compresión de caminos: devuelve la siguiente posición libre."""
+    raiz = i
+    while padres[raiz] != raiz: raiz = padres[raiz]
+    while padres[i] != raiz: padres[i], i = raiz, padres[i]
+    return raiz
+
+def emparejar_debitos_creditos(montos_d, montos_c, tolerancia):
+    """
+    Empareja cada débito (en su orden original) con el crédito libre cuya suma
+    con él quede más cerca de cero, siempre que la diferencia no supere la tolerancia.
+    En empates gana el crédito que aparece primero, igual que el recorrido clásico
+    débito x crédito, pero usando los créditos ordenados y searchsorted.
+    Con tolerancia 0 (montos en céntimos) el cruce es una búsqueda por hash del monto opuesto.
+    Devuelve dos arreglos de posiciones (pos_d, pos_c).
+    """
+    montos_d, montos_c = np.asarray(montos_d), np.asarray(montos_c)
+    n_c = len(montos_c)
+    if len(montos_d) == 0 or n_c == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+
+    if tolerancia == 0:
+        libres = {}
+        for j, c in enumerate(montos_c.tolist()): libres.setdefault(c, deque()).append(j)
+        pos_d, pos_c = [], []
+        for i, d in enumerate(montos_d.tolist()):
+            cola = libres.get(-d)
+            if cola:
+                pos_d.append(i)
+                pos_c.append(cola.popleft())
+        return np.array(pos_d, dtype=int), np.array(pos_c, dtype=int)
+
+    orden = np.argsort(montos_c, kind='stable')
+    c_ord = montos_c[orden]
+    objetivos = np.searchsorted(c_ord, -montos_d, side='left')
+
+    # Bloques de montos idénticos: dentro de cada bloque la menor posición original es la primera libre
+    nuevo_bloque = np.r_[True, c_ord[1:] != c_ord[:-1]]
+    bloque = (np.cumsum(nuevo_bloque) - 1).tolist()
+    inicios = np.flatnonzero(nuevo_bloque)
+    fines = np.r_[inicios[1:] - 1, n_c - 1].tolist()
+    inicios = inicios.tolist()
+
+    c_lista, orden_lista = c_ord.tolist(), orden.tolist()
+    libre_der = list(range(n_c + 1))   # posición n_c = centinela
+    libre_izq = list(range(n_c + 1))   # desplazado en 1: la posición 0 es el centinela
+
+    pos_d, pos_c = [], []
+    for i, (d, k) in enumerate(zip(montos_d.tolist(), objetivos.tolist())):
+        izq = _buscar_libre(libre_izq, k) - 1
+        der = _buscar_libre(libre_der, k)
+        dif_izq = abs(d + c_lista[izq]) if izq >= 0 else np.inf
+        dif_der = abs(d + c_lista[der]) if der < n_c else np.inf
+        mejor_dif = min(dif_izq, dif_der)
+        if mejor_dif > tolerancia: continue
+
+        candidatos = []
+        while izq >= 0 and abs(d + c_lista[izq]) == mejor_dif:
+            inicio = inicios[bloque[izq]]
+            candidatos.append(_buscar_libre(libre_der, inicio))
+            izq = _buscar_libre(libre_izq, inicio) - 1
+        while der < n_c and abs(d + c_lista[der]) == mejor_dif:
+            candidatos.append(der)
+            der = _buscar_libre(libre_der, fines[bloque[der]] + 1)
+
+        elegido = min(candidatos, key=lambda j: orden_lista[j])
+        libre_der[elegido] = elegido + 1
+        libre_izq[elegido + 1] = elegido
+        pos_d.append(i)
+        pos_c.append(orden_lista[elegido])
+    return np.array(pos_d, dtype=int), np.array(pos_c, dtype=int)
+
+def emparejar_por_grupo(df_pendientes, col_monto, tolerancia, col_grupo=None):
+    """
+    Aplica emparejar_debitos_creditos dentro de cada grupo de `col_grupo`
+    (o sobre todo el bloque si no se indica). Devuelve las etiquetas de índice
+    de débitos y créditos emparejados y la clave de grupo de cada par.
+    Con una columna en céntimos (Monto_BS_c, ...) la tolerancia también va en céntimos.
+    """
+    montos = df_pendientes[col_monto].to_numpy()
+    indice = df_pendientes.index
+    if col_grupo is None: grupos = {None: np.arange(len(df_pendientes))}
+    else: grupos = df_pendientes.groupby(col_grupo).indices
+
+    idx_d, idx_c, claves = [], [], []
+    for clave, posiciones in grupos.items():
+        if len(posiciones) < 2: continue
+        posiciones = np.sort(posiciones)
+        montos_grupo = montos[posiciones]
+        pos_deb = posiciones[montos_grupo > 0]
+        pos_cre = posiciones[montos_grupo < 0]
+        par_d, par_c = emparejar_debitos_creditos(montos[pos_deb], montos[pos_cre], tolerancia)
+        idx_d.extend(indice[pos_deb[par_d]])
+        idx_c.extend(indice[pos_cre[par_c]])
+        claves.extend([clave] * len(par_d))
+    return idx_d, idx_c, claves
+
+def pares_en_banda(montos_d, montos_c, tolerancia):
+    """
+    Join por banda: devuelve todas las parejas (pos_d, pos_c, diferencia) con
+    |débito + crédito| <= tolerancia, sin construir el producto cartesiano.
+    Los créditos se ordenan por |monto| y cada débito solo mira su ventana.
+    """
+    montos_d, montos_c = np.asarray(montos_d), np.asarray(montos_c)
+    vacio = np.array([], dtype=int)
+    if len(montos_d) == 0 or len(montos_c) == 0: return vacio, vacio, np.array([])
+
+    orden = np.argsort(-montos_c, kind='stable')
+    abs_ord = -montos_c[orden]
+    margen = tolerancia + 1e-9  # La ventana es holgada; el filtro exacto va abajo
+    desde = np.searchsorted(abs_ord, montos_d - margen, side='left')
+    hasta = np.searchsorted(abs_ord, montos_d + margen, side='right')
+    cantidad = np.maximum(hasta - desde, 0)
+
+    pos_d = np.repeat(np.arange(len(montos_d)), cantidad)
+    inicio_bloque = np.repeat(np.cumsum(cantidad) - cantidad, cantidad)
+    pos_ord = np.repeat(desde, cantidad) + (np.arange(len(pos_d)) - inicio_bloque)
+    pos_c = orden[pos_ord]
+    diferencia = np.abs(montos_d[pos_d] + montos_c[pos_c])
+    validos = diferencia <= tolerancia
+    return pos_d[validos], pos_c[validos], diferencia[validos]
+
+def nuevo_acumulador():
+    """Acumulador de cruces de una fase: índices y su etiqueta de Grupo_Conciliado."""
+    return {'indices': [], 'etiquetas': []}
+
+def acumular_cruce(acumulador, indices, etiqueta):
+    """
+    Registra un cruce sin tocar el DataFrame. `etiqueta` puede ser un texto
+    (común a todas las filas) o una lista paralela a `indices`. Devuelve las filas registradas.
+    """
+    indices = list(indices)
+    acumulador['indices'].extend(indices)
+    if isinstance(etiqueta, str): acumulador['etiquetas'].extend([etiqueta] * len(indices))
+    else: acumulador['etiquetas'].extend(etiqueta)
+    return len(indices)
+
+def acumular_pares(acumulador, df, idx_d, idx_c, prefijos):
+    """
+    Registra una lista de pares: cada lado recibe `prefijo + Asiento de su contrapartida`.
+    `prefijos` puede ser un texto o una lista (uno por par).
+    """
+    if not len(idx_d): return 0
+    if isinstance(prefijos, str): prefijos = [prefijos] * len(idx_d)
+    asientos_d = df.loc[idx_d, 'Asiento'].tolist()
+    asientos_c = df.loc[idx_c, 'Asiento'].tolist()
+    etiquetas_d = [f'{p}{a}' for p, a in zip(prefijos, asientos_c)]
+    etiquetas_c = [f'{p}{a}' for p, a in zip(prefijos, asientos_d)]
+    return acumular_cruce(acumulador, list(idx_d) + list(idx_c), etiquetas_d + etiquetas_c)
+
+def volcar_acumulador(df, acumulador, col_etiqueta='Grupo_Conciliado'):
+    """Escribe en bloque (una sola vez por fase) Conciliado y la(s) columna(s) de etiqueta, y vacía el acumulador."""
+    indices, etiquetas = acumulador['indices'], acumulador['etiquetas']
+    if not indices: return 0
+    df.loc[indices, 'Conciliado'] = True
+    for col in ([col_etiqueta] if isinstance(col_etiqueta, str) else col_etiqueta):
+        df.loc[indices, col] = etiquetas
+    acumulador['indices'], acumulador['etiquetas'] = [], []
+    return len(indices)
+
+def marcar_pares_conciliados(df, idx_d, idx_c, prefijos):
+    """
+    Escribe en bloque Conciliado/Grupo_Conciliado para una lista de pares.
+    Cada lado recibe `prefijo + Asiento de su contrapartida`.
+    """
+    acumulador = nuevo_acumulador()
+    acumular_pares(acumulador, df, idx_d, idx_c, prefijos)
+    return volcar_acumulador(df, acumulador)
+
+def clave_por_prefijo_asiento(df, reglas, por_defecto, col_asiento='Asiento'):
+    """
+    Elige, fila a fila y de forma vectorizada, la columna clave según el prefijo del Asiento.
+    - reglas: lista ordenada de (prefijos, col_preferida, col_respaldo). Gana la primera
+      regla cuyo prefijo coincida; se usa la preferida y, si viene vacía, la de respaldo.
+    - por_defecto: (col_a, col_b) para los demás asientos: col_a si es más larga, si no col_b.
+    """
+    asiento = df[col_asiento].astype(str).str.upper()
+    texto = lambda col: df[col].astype(str)
+
+    condiciones, opciones = [], []
+    for prefijos, preferida, respaldo in reglas:
+        valor_pref, valor_resp = texto(preferida), texto(respaldo)
+        condiciones.append(asiento.str.startswith(prefijos).to_numpy())
+        opciones.append(np.where(valor_pref != '', valor_pref, valor_resp))
+
+    valor_a, valor_b = texto(por_defecto[0]), texto(por_defecto[1])
+    defecto = np.where(valor_a.str.len() > valor_b.str.len(), valor_a, valor_b)
+    return pd.Series(np.select(condiciones, opciones, default=defecto), index=df.index, dtype=object)
+
+def ejecutar_fases_particionadas(df, fases, log_messages, columnas_particion=('Clave_Grupo',)):
+    """
+    Ejecuta en orden una lista de fases (columna, clave, funcion, args) sin volver a
+    filtrar el DataFrame completo en cada una.
+    - Las particiones por `columnas_particion` se calculan UNA sola vez.
+    - Se mantiene un mapa vivo de filas pendientes; tras cada fase solo se refresca su partición.
+    - Cada fase se llama como funcion(df, *args, log_messages, df_pendientes=...) y recibe
+      solo las filas pendientes de su partición (columna None = todas las pendientes).
+      Las escrituras siguen yendo a `df`.
+    Devuelve el total de movimientos conciliados.
+    """
+    particiones = {col: df.groupby(col, sort=False).indices for col in columnas_particion}
+    todas = np.arange(len(df))
+    sin_filas = np.array([], dtype=int)
+    col_conciliado = df.columns.get_loc('Conciliado')
+    pendiente = ~df['Conciliado'].to_numpy(dtype=bool)
+
+    total = 0
+    for columna, clave, funcion, args in fases:
+        posiciones = particiones[columna].get(clave, sin_filas) if columna else todas
+        activas = posiciones[pendiente[posiciones]]
+        total += funcion(df, *args, log_messages, df_pendientes=df.iloc[activas]) or 0
+        pendiente[posiciones] = ~df.iloc[posiciones, col_conciliado].to_numpy(dtype=bool)
+    return total
+
+def clasificar_por_reglas(textos, reglas, por_defecto):
+    """
+    Clasificador por palabras clave evaluado sobre toda la columna a la vez.
+    - reglas: lista ORDENADA de (condición, salida). La condición es una tupla de grupos
+      de palabras; la regla aplica si en el texto aparece al menos una palabra de CADA grupo.
+    - salida / por_defecto: tupla con un valor por cada columna de resultado.
+    Cada grupo se compila una sola vez en una expresión regular (alternancia escapada).
+    Gana la primera regla que aplique. Devuelve una lista de arreglos, uno por columna.
+    """
+    textos = pd.Series(textos).astype(str)
+    presencia = {}
+    def presente(grupo):
+        grupo = tuple(grupo)
+        if grupo not in presencia:
+            patron = re.compile('|'.join(re.escape(palabra) for palabra in grupo))
+            presencia[grupo] = textos.str.contains(patron, na=False).to_numpy(dtype=bool)
+        return presencia[grupo]
+
+    condiciones = [np.logical_and.reduce([presente(grupo) for grupo in condicion]) for condicion, _ in reglas]
+    elegida = np.select(condiciones, np.arange(len(reglas)), default=len(reglas)) if reglas else np.full(len(textos), 0)
+    tabla = np.empty((len(reglas) + 1, len(por_defecto)), dtype=object)
+    for fila, salida in enumerate([salida for _, salida in reglas] + [por_defecto]):
+        tabla[fila, :] = salida
+    return [tabla[elegida, k] for k in range(tabla.shape[1])]
+
+# Ajustes por valoración de moneda ("DIFF000182", "Diferencias de cambio al...", "Ajuste cambio", etc.)
+REGLAS_AJUSTE_CAMBIARIO = [
+    ((['DIFF'],), (True,)),
+    ((['CAMBIO'], ['DIFERENCIA', 'DIF', 'AJUSTE']), (True,)),
+]
+
+def es_ajuste_cambiario_vectorizado(textos, reglas=REGLAS_AJUSTE_CAMBIARIO):
+    """Máscara booleana: True donde el texto (en mayúsculas) cumple alguna regla de ajuste cambiario."""
+    textos = pd.Series(textos)
+    marcas = clasificar_por_reglas(textos.astype(str).str.upper(), reglas, (False,))[0]
+    return pd.Series(marcas.astype(bool), index=textos.index)
+
+def a_centimos(montos):
+    """Convierte montos decimales a enteros en céntimos (redondeo al céntimo más cercano)."""
+    valores = np.nan_to_num(np.asarray(montos, dtype=float))
+    return np.rint(valores * 100).astype(np.int64)
+
+def asegurar_centimos(df, columnas=('Monto_BS', 'Monto_USD')):
+    """Agrega <monto>_c (int64, céntimos) si no vino ya calculada desde la carga."""
+    for col in columnas:
+        if col in df.columns and f'{col}_c' not in df.columns:
+            df[f'{col}_c'] = a_centimos(df[col])
+    return df
+
+def _sumas_de_k(valores, k, tope):
+    """Genera (suma, posiciones) de todas las combinaciones de k valores (ordenados asc) con suma <= tope."""
+    n = len(valores)
+    def recorrer(inicio, faltan, parcial, combo):
+        if faltan == 0:
+            yield parcial, combo
+            return
+        for p in range(inicio, n - faltan + 1):
+            # Los valores siguientes son >= valores[p]: si ni así cabe, no hay nada más adelante
+            if parcial + faltan * valores[p] > tope: break
+            yield from recorrer(p + 1, faltan - 1, parcial + valores[p], combo + (p,))
+    yield from recorrer(0, k, 0, ())
+
+def buscar_subconjunto_suma(montos_c, objetivo_c, tolerancia_c=0, max_elementos=MAX_ELEMENTOS_GRUPO,
+                            presupuesto=PRESUPUESTO_SUBCONJUNTOS, limite_tiempo=None):
+    """
+    Busca entre `montos_c` (enteros positivos en céntimos) un subconjunto de 2 a
+    `max_elementos` valores cuya suma quede en objetivo_c ± tolerancia_c.
+    - Hasta 4 elementos: encuentro a mitad de camino (tabla hash de sumas parciales).
+    - De 5 en adelante: programación dinámica por tamaño sobre las sumas alcanzables (<= objetivo).
+    Prefiere siempre el grupo más pequeño. La búsqueda se corta (None) al agotar `presupuesto`
+    operaciones o al pasar `limite_tiempo` (time.monotonic()).
+    Devuelve las posiciones del subconjunto o None.
+    """
+    montos_c = np.asarray(montos_c, dtype=np.int64)
+    orden = np.argsort(montos_c, kind='stable')
+    valores = montos_c[orden].tolist()
+    n = len(valores)
+    # Los montos son positivos: ningún grupo suma <= 0, pero un objetivo cercano a cero sí admite grupos
+    minimo, maximo = max(objetivo_c - tolerancia_c, 1), objetivo_c + tolerancia_c
+    if n < 2 or max_elementos < 2 or maximo < minimo: return None
+
+    ancho = tolerancia_c + 1  # Cubeta hash: una ventana de tolerancia toca como mucho 3 cubetas
+    trabajo, revision = 0, 0
+
+    def sin_presupuesto():
+        nonlocal revision
+        if trabajo > presupuesto: return True
+        if limite_tiempo is None or trabajo < revision: return False
+        revision = trabajo + 1024  # Consultar el reloj cada ~1000 operaciones
+        return time.monotonic() > limite_tiempo
+
+    def resultado(posiciones):
+        return sorted(orden[list(posiciones)].tolist())
+
+    # --- (A) Encuentro a mitad de camino para grupos de 2 a 4 ---
+    tablas = {}
+    for r in range(2, min(max_elementos, 4) + 1):
+        k_izq, k_der = r // 2, r - r // 2
+        if k_der not in tablas:
+            tabla = {}
+            for suma, combo in _sumas_de_k(valores, k_der, maximo):
+                tabla.setdefault(suma // ancho, []).append((suma, combo))
+                trabajo += 1
+                if sin_presupuesto(): return None
+            tablas[k_der] = tabla
+        tabla = tablas[k_der]
+        for suma_izq, combo_izq in _sumas_de_k(valores, k_izq, maximo):
+            falta_min, falta_max = minimo - suma_izq, maximo - suma_izq
+            for cubeta in range(falta_min // ancho, falta_max // ancho + 1):
+                for suma_der, combo_der in tabla.get(cubeta, ()):
+                    trabajo += 1
+                    if falta_min <= suma_der <= falta_max and combo_izq[-1] < combo_der[0]:
+                        return resultado(combo_izq + combo_der)
+            trabajo += 1
+            if sin_presupuesto(): return None
+
+    if max_elementos <= 4: return None
+
+    # --- (B) Programación dinámica por tamaño para grupos de 5 o más ---
+    # capas[k]: suma alcanzable con k elementos -> una combinación que la produce. Cada valor se suma
+    # recorriendo las capas de mayor a menor para no usarlo dos veces en el mismo grupo.
+    # (A) ya descartó hasta 4 elementos: un grupo de 5 es el mínimo; uno mayor solo se acepta
+    # después de recorrer todos los valores sin hallar otro más pequeño.
+    capas = [{0: ()}] + [{} for _ in range(max_elementos)]
+    mejor = None
+    for p, v in enumerate(valores):
+        if v > maximo: break
+        for k in range(min(p, max_elementos - 1), -1, -1):
+            siguiente = capas[k + 1]
+            for suma, combo in list(capas[k].items()):
+                trabajo += 1
+                if sin_presupuesto(): return None
+                nueva = suma + v
+                if nueva > maximo or nueva in siguiente: continue
+                siguiente[nueva] = combo + (p,)
+                if nueva >= minimo and k >= 1 and (mejor is None or k + 1 < len(mejor)):
+                    mejor = combo + (p,)
+                    if len(mejor) <= 5: return resultado(mejor)
+    return resultado(mejor) if mejor is not None else None
+
+def buscar_subconjunto_suma_cero(montos_c, tolerancia_c=0, presupuesto=PRESUPUESTO_GRUPOS_NIT, limite_tiempo=None):
+    """
+    Busca el subconjunto más pequeño (2 o más elementos) de montos con signo, en céntimos,
+    cuya suma quede en 0 ± tolerancia_c. Prueba tamaños crecientes con una búsqueda en
+    profundidad sobre los montos ordenados, podando con lo mínimo y lo máximo que aún
+    pueden aportar los elementos restantes.
+    Entre los grupos del tamaño mínimo elige el primero en el orden del mayor (el que
+    encontraba la enumeración con combinations), no el primero por monto.
+    La búsqueda se corta al superar `presupuesto` nodos o al pasar `limite_tiempo`
+    (time.monotonic()); si ya había un grupo del tamaño mínimo, se devuelve ese.
+    Devuelve (posiciones o None, nodos_usados).
+    """
+    montos_c = np.asarray(montos_c, dtype=np.int64)
+    orden = np.argsort(montos_c, kind='stable')
+    valores = montos_c[orden].tolist()
+    n = len(valores)
+    acumulado = [0] + np.cumsum(valores).tolist()
+    nodos, revision, cortado = 0, 0, False
+    mejor = None
+
+    def sin_presupuesto():
+        nonlocal revision, cortado
+        if nodos > presupuesto: cortado = True
+        elif limite_tiempo is not None and nodos >= revision:
+            revision = nodos + 1024  # Consultar el reloj cada ~1000 nodos
+            cortado = time.monotonic() > limite_tiempo
+        return cortado
+
+    def buscar(inicio, faltan, parcial, combo):
+        nonlocal nodos, mejor
+        nodos += 1
+        if sin_presupuesto(): return
+        if faltan == 0:
+            if abs(parcial) <= tolerancia_c:
+                posiciones = sorted(orden[list(combo)].tolist())
+                if mejor is None or posiciones < mejor: mejor = posiciones
+            return
+        # Lo máximo que pueden sumar `faltan` elementos es tomar los más grandes del final
+        if parcial + acumulado[n] - acumulado[n - faltan] < -tolerancia_c: return
+        for p in range(inicio, n - faltan + 1):
+            # Lo mínimo es tomar los siguientes en orden; si ya se pasa, los demás también
+            if parcial + acumulado[p + faltan] - acumulado[p] > tolerancia_c: break
+            buscar(p + 1, faltan - 1, parcial + valores[p], combo + (p,))
+            if cortado: return
+
+    for tamano in range(2, n + 1):
+        buscar(0, tamano, 0, ())
+        if mejor is not None or cortado: break
+    return mejor, nodos
+
 # ==============================================================================
 # 3. MÓDULOS DE CONCILIACIÓN - GRUPO MAYOREO
 # ==============================================================================
 
 # --- (A) Módulo: Fondos en Tránsito (BS) (111.04.1001)---
+REGLAS_FONDOS_EN_TRANSITO = [
+    ((['DIFERENCIA EN CAMBIO', 'DIF. CAMBIO', 'DIFERENCIAL', 'DIFERENCIAS DE CAMBIO', 'DIFERENCIAS DE SALDOS', 'DIFERENCIA DE SALDO', 'DIF. SALDO'],), ('DIF_CAMBIO', 'GRUPO_DIF_CAMBIO')),
+    ((['AJUSTE'],), ('AJUSTE_GENERAL', 'GRUPO_AJUSTE')),
+    ((['REINTEGRO', 'SILLACA'],), ('REINTEGRO_SILLACA', 'GRUPO_SILLACA')),
+    ((['REMESA'],), ('REMESA_GENERAL', 'GRUPO_REMESA')),
+    ((['NOTA DE DEBITO', 'NOTA DE CREDITO'],), ('NOTA_GENERAL', 'GRUPO_NOTA')),
+    ((['BANCO A BANCO'],), ('BANCO_A_BANCO', 'GRUPO_BANCO')),
+]
+
 def normalizar_referencia_fondos_en_transito(df):
     """Clasifica movimientos según palabras clave en la referencia para Fondos en Tránsito."""
     df_copy = df.copy()
-    
-    def clasificar(referencia_str):
-        if pd.isna(referencia_str): return 'OTRO', 'OTRO', ''
-        ref = str(referencia_str).upper().strip()
-        ref_lit_norm = re.sub(r'[^A-Z0-9]', '', ref)
-        if any(keyword in ref for keyword in ['DIFERENCIA EN CAMBIO', 'DIF. CAMBIO', 'DIFERENCIAL', 'DIFERENCIAS DE CAMBIO', 'DIFERENCIAS DE SALDOS', 'DIFERENCIA DE SALDO', 'DIF. SALDO']): return 'DIF_CAMBIO', 'GRUPO_DIF_CAMBIO', ref_lit_norm
-        if 'AJUSTE' in ref: return 'AJUSTE_GENERAL', 'GRUPO_AJUSTE', ref_lit_norm
-        if 'REINTEGRO' in ref or 'SILLACA' in ref: return 'REINTEGRO_SILLACA', 'GRUPO_SILLACA', ref_lit_norm
-        if 'REMESA' in ref: return 'REMESA_GENERAL', 'GRUPO_REMESA', ref_lit_norm
-        if 'NOTA DE DEBITO' in ref or 'NOTA DE CREDITO' in ref: return 'NOTA_GENERAL', 'GRUPO_NOTA', ref_lit_norm
-        if 'BANCO A BANCO' in ref: return 'BANCO_A_BANCO', 'GRUPO_BANCO', ref_lit_norm
-        return 'OTRO', 'OTRO', ref_lit_norm
-    df_copy[['Clave_Normalizada', 'Clave_Grupo', 'Referencia_Normalizada_Literal']] = df_copy['Referencia'].apply(clasificar).apply(pd.Series)
+    es_nulo = df_copy['Referencia'].isna().to_numpy()
+    ref = df_copy['Referencia'].astype(str).str.upper().str.strip()
+    clave, grupo = clasificar_por_reglas(ref, REGLAS_FONDOS_EN_TRANSITO, ('OTRO', 'OTRO'))
+    df_copy['Clave_Normalizada'] = np.where(es_nulo, 'OTRO', clave)
+    df_copy['Clave_Grupo'] = np.where(es_nulo, 'OTRO', grupo)
+    df_copy['Referencia_Normalizada_Literal'] = ref.str.replace(r'[^A-Z0-9]', '', regex=True).mask(es_nulo, '')
     return df_copy
 
-def conciliar_diferencia_cambio(df, log_messages):
-    df_a_conciliar = df[(df['Clave_Grupo'] == 'GRUPO_DIF_CAMBIO') & (~df['Conciliado'])]
+def conciliar_diferencia_cambio(df, log_messages, df_pendientes=None):
+    df_a_conciliar = df_pendientes if df_pendientes is not None else df[(df['Clave_Grupo'] == 'GRUPO_DIF_CAMBIO') & (~df['Conciliado'])]
     total_conciliados = len(df_a_conciliar)
     if total_conciliados > 0:
         indices = df_a_conciliar.index
@@ -82,8 +509,8 @@ def conciliar_diferencia_cambio(df, log_messages):
         log_messages.append(f"✔️ Fase Auto: {total_conciliados} conciliados por ser 'Diferencia en Cambio/Saldo'.")
     return total_conciliados
 
-def conciliar_ajuste_automatico(df, log_messages):
-    df_a_conciliar = df[(df['Clave_Grupo'] == 'GRUPO_AJUSTE') & (~df['Conciliado'])]
+def conciliar_ajuste_automatico(df, log_messages, df_pendientes=None):
+    df_a_conciliar = df_pendientes if df_pendientes is not None else df[(df['Clave_Grupo'] == 'GRUPO_AJUSTE') & (~df['Conciliado'])]
     total_conciliados = len(df_a_conciliar)
     if total_conciliados > 0:
         indices = df_a_conciliar.index
@@ -92,126 +519,53 @@ def conciliar_ajuste_automatico(df, log_messages):
         log_messages.append(f"✔️ Fase Auto: {total_conciliados} conciliados por ser 'AJUSTE'.")
     return total_conciliados
 
-def conciliar_pares_exactos_cero(df, clave_grupo, fase_name, log_messages):
-    TOLERANCIA_CERO = 0.0
-    df_pendientes = df[(df['Clave_Grupo'] == clave_grupo) & (~df['Conciliado'])].copy()
+def conciliar_pares_exactos_cero(df, clave_grupo, fase_name, log_messages, df_pendientes=None):
+    if df_pendientes is None: df_pendientes = df[(df['Clave_Grupo'] == clave_grupo) & (~df['Conciliado'])]
     if df_pendientes.empty: return 0
     log_messages.append(f"\n--- {fase_name} ---")
-    grupos = df_pendientes.groupby('Referencia_Normalizada_Literal')
-    total_conciliados = 0
-    for ref_norm, grupo in grupos:
-        if len(grupo) < 2: continue
-        debitos_indices = grupo[grupo['Monto_BS'] > 0].index
-        creditos_indices = grupo[grupo['Monto_BS'] < 0].index
-        debitos_usados = set()
-        creditos_usados = set()
-        for idx_d in debitos_indices:
-            if idx_d in debitos_usados: continue
-            monto_d = df.loc[idx_d, 'Monto_BS']
-            for idx_c in creditos_indices:
-                if idx_c in creditos_usados: continue
-                monto_c = df.loc[idx_c, 'Monto_BS']
-                if abs(monto_d + monto_c) <= TOLERANCIA_CERO:
-                    asiento_d, asiento_c = df.loc[idx_d, 'Asiento'], df.loc[idx_c, 'Asiento']
-                    df.loc[[idx_d, idx_c], 'Conciliado'] = True
-                    df.loc[idx_d, 'Grupo_Conciliado'] = f'PAR_REF_EXACTO_{ref_norm}_{asiento_c}'
-                    df.loc[idx_c, 'Grupo_Conciliado'] = f'PAR_REF_EXACTO_{ref_norm}_{asiento_d}'
-                    total_conciliados += 2
-                    debitos_usados.add(idx_d)
-                    creditos_usados.add(idx_c)
-                    break 
+    idx_d, idx_c, refs = emparejar_por_grupo(df_pendientes, 'Monto_BS_c', 0, 'Referencia_Normalizada_Literal')
+    total_conciliados = marcar_pares_conciliados(df, idx_d, idx_c, [f'PAR_REF_EXACTO_{ref_norm}_' for ref_norm in refs])
     if total_conciliados > 0: log_messages.append(f"✔️ {fase_name}: {total_conciliados} movimientos conciliados.")
     return total_conciliados
 
-def conciliar_pares_exactos_por_referencia(df, clave_grupo, fase_name, log_messages):
-    df_pendientes = df[(df['Clave_Grupo'] == clave_grupo) & (~df['Conciliado'])].copy()
+def conciliar_pares_exactos_por_referencia(df, clave_grupo, fase_name, log_messages, df_pendientes=None):
+    if df_pendientes is None: df_pendientes = df[(df['Clave_Grupo'] == clave_grupo) & (~df['Conciliado'])]
     if df_pendientes.empty: return 0
     log_messages.append(f"\n--- {fase_name} ---")
-    grupos = df_pendientes.groupby('Referencia_Normalizada_Literal')
-    total_conciliados = 0
-    for ref_norm, grupo in grupos:
-        if len(grupo) < 2: continue
-        debitos_indices = grupo[grupo['Monto_BS'] > 0].index.tolist()
-        creditos_indices = grupo[grupo['Monto_BS'] < 0].index.tolist()
-        debitos_usados = set()
-        creditos_usados = set()
-        for idx_d in debitos_indices:
-            if idx_d in debitos_usados: continue
-            monto_d = df.loc[idx_d, 'Monto_BS']
-            mejor_match_idx, mejor_match_diff = None, TOLERANCIA_MAX_BS + 1
-            for idx_c in creditos_indices:
-                if idx_c in creditos_usados: continue
-                diferencia = abs(monto_d + df.loc[idx_c, 'Monto_BS'])
-                if diferencia < mejor_match_diff:
-                    mejor_match_diff, mejor_match_idx = diferencia, idx_c
-            if mejor_match_idx is not None and mejor_match_diff <= TOLERANCIA_MAX_BS:
-                asiento_d, asiento_c = df.loc[idx_d, 'Asiento'], df.loc[mejor_match_idx, 'Asiento']
-                df.loc[[idx_d, mejor_match_idx], 'Conciliado'] = True
-                df.loc[idx_d, 'Grupo_Conciliado'] = f'PAR_REF_{ref_norm}_{asiento_c}'
-                df.loc[mejor_match_idx, 'Grupo_Conciliado'] = f'PAR_REF_{ref_norm}_{asiento_d}'
-                total_conciliados += 2
-                debitos_usados.add(idx_d)
-                creditos_usados.add(mejor_match_idx)
+    idx_d, idx_c, refs = emparejar_por_grupo(df_pendientes, 'Monto_BS_c', TOLERANCIA_MAX_BS_C, 'Referencia_Normalizada_Literal')
+    total_conciliados = marcar_pares_conciliados(df, idx_d, idx_c, [f'PAR_REF_{ref_norm}_' for ref_norm in refs])
     if total_conciliados > 0: log_messages.append(f"✔️ {fase_name}: {total_conciliados} movimientos conciliados.")
     return total_conciliados
 
-def cruzar_pares_simples(df, clave_normalizada, fase_name, log_messages):
-    df_pendientes = df[~df['Conciliado']].copy()
-    df_pendientes['Monto_BS_Abs_Redondeado'] = (df_pendientes['Monto_BS'].abs().round(0))
-    df_a_cruzar = df_pendientes[df_pendientes['Clave_Normalizada'] == clave_normalizada]
+def cruzar_pares_simples(df, clave_normalizada, fase_name, log_messages, df_pendientes=None):
+    df_a_cruzar = df_pendientes if df_pendientes is not None else df[(~df['Conciliado']) & (df['Clave_Normalizada'] == clave_normalizada)]
     if df_a_cruzar.empty: return 0
     log_messages.append(f"\n--- {fase_name} ---")
-    grupos = df_a_cruzar.groupby('Monto_BS_Abs_Redondeado')
-    total_conciliados = 0
-    for _, grupo in grupos:
-        debitos_indices = grupo[grupo['Monto_BS'] > 0].index.tolist()
-        creditos_indices = grupo[grupo['Monto_BS'] < 0].index.tolist()
-        debitos_usados = set()
-        creditos_usados = set()
-        for idx_d in debitos_indices:
-            if idx_d in debitos_usados: continue
-            monto_d = df.loc[idx_d, 'Monto_BS']
-            mejor_match_idx, mejor_match_diff = None, TOLERANCIA_MAX_BS + 1
-            for idx_c in creditos_indices:
-                if idx_c in creditos_usados: continue
-                diferencia = abs(monto_d + df.loc[idx_c, 'Monto_BS'])
-                if diferencia < mejor_match_diff:
-                    mejor_match_diff, mejor_match_idx = diferencia, idx_c
-            if mejor_match_idx is not None and mejor_match_diff <= TOLERANCIA_MAX_BS:
-                asiento_d, asiento_c = df.loc[idx_d, 'Asiento'], df.loc[mejor_match_idx, 'Asiento']
-                df.loc[[idx_d, mejor_match_idx], 'Conciliado'] = True
-                df.loc[idx_d, 'Grupo_Conciliado'] = f'PAR_BS_{asiento_c}'
-                df.loc[mejor_match_idx, 'Grupo_Conciliado'] = f'PAR_BS_{asiento_d}'
-                total_conciliados += 2
-                debitos_usados.add(idx_d)
-                creditos_usados.add(mejor_match_idx)
-    if 'Monto_BS_Abs_Redondeado' in df.columns: df.drop(columns=['Monto_BS_Abs_Redondeado'], inplace=True, errors='ignore')
+    monto_abs_redondeado = df_a_cruzar['Monto_BS'].abs().round(0)
+    idx_d, idx_c, _ = emparejar_por_grupo(df_a_cruzar, 'Monto_BS_c', TOLERANCIA_MAX_BS_C, monto_abs_redondeado)
+    total_conciliados = marcar_pares_conciliados(df, idx_d, idx_c, 'PAR_BS_')
     if total_conciliados > 0: log_messages.append(f"✔️ {fase_name}: {total_conciliados} movimientos conciliados.")
     return total_conciliados
 
-def cruzar_grupos_por_criterio(df, clave_normalizada, agrupacion_col, grupo_prefix, fase_name, log_messages):
-    df_pendientes = df[(df['Clave_Normalizada'] == clave_normalizada) & (~df['Conciliado'])].copy()
+def cruzar_grupos_por_criterio(df, clave_normalizada, agrupacion_col, grupo_prefix, fase_name, log_messages, df_pendientes=None):
+    if df_pendientes is None: df_pendientes = df[(df['Clave_Normalizada'] == clave_normalizada) & (~df['Conciliado'])]
     if df_pendientes.empty: return 0
     log_messages.append(f"\n--- {fase_name} ---")
-    indices_conciliados = set()
+    acumulador = nuevo_acumulador()
     if agrupacion_col == 'Fecha': grupos = df_pendientes.groupby(df_pendientes['Fecha'].dt.date.fillna('NaT'))
-    else: grupos = df_pendientes.groupby(agrupacion_col)
+    else: grupos = df_pendientes.groupby(agrupacion_col, observed=True)
     for criterio, grupo in grupos:
-        if len(grupo) > 1 and abs(grupo['Monto_BS'].sum()) <= TOLERANCIA_MAX_BS:
-            grupo_id = f"GRUPO_{grupo_prefix}_{criterio}"
-            indices_a_conciliar = grupo.index
-            df.loc[indices_a_conciliar, 'Conciliado'] = True
-            df.loc[indices_a_conciliar, 'Grupo_Conciliado'] = grupo_id
-            indices_conciliados.update(indices_a_conciliar)
-    total_conciliados = len(indices_conciliados)
+        if len(grupo) > 1 and abs(grupo['Monto_BS_c'].sum()) <= TOLERANCIA_MAX_BS_C:
+            acumular_cruce(acumulador, grupo.index, f"GRUPO_{grupo_prefix}_{criterio}")
+    total_conciliados = volcar_acumulador(df, acumulador)
     if total_conciliados > 0: log_messages.append(f"✔️ {fase_name}: {total_conciliados} movimientos conciliados.")
     return total_conciliados
 
-def conciliar_lote_por_grupo(df, clave_grupo, fase_name, log_messages):
+def conciliar_lote_por_grupo(df, clave_grupo, fase_name, log_messages, df_pendientes=None):
     log_messages.append(f"\n--- {fase_name} ---")
-    df_pendientes = df[(~df['Conciliado']) & (df['Clave_Grupo'] == clave_grupo)].copy()
+    if df_pendientes is None: df_pendientes = df[(~df['Conciliado']) & (df['Clave_Grupo'] == clave_grupo)]
     if df_pendientes.empty or len(df_pendientes) < 2: return 0
-    if abs(df_pendientes['Monto_BS'].sum()) <= TOLERANCIA_MAX_BS:
+    if abs(df_pendientes['Monto_BS_c'].sum()) <= TOLERANCIA_MAX_BS_C:
         fecha_max = df_pendientes['Fecha'].max().strftime('%Y-%m-%d')
         grupo_id = f"LOTE_{clave_grupo.replace('GRUPO_', '')}_{fecha_max}"
         indices_a_conciliar = df_pendientes.index
@@ -222,109 +576,95 @@ def conciliar_lote_por_grupo(df, clave_grupo, fase_name, log_messages):
         return total_conciliados
     return 0
 
-def conciliar_grupos_globales_por_referencia(df, log_messages):
+def conciliar_grupos_globales_por_referencia(df, log_messages, df_pendientes=None):
     log_messages.append(f"\n--- FASE GLOBAL N-a-N (Cruce por Referencia Literal) ---")
-    df_pendientes = df[~df['Conciliado']].copy()
+    if df_pendientes is None: df_pendientes = df[~df['Conciliado']]
     df_pendientes = df_pendientes[df_pendientes['Referencia_Normalizada_Literal'].notna() & (df_pendientes['Referencia_Normalizada_Literal'] != '') & (df_pendientes['Referencia_Normalizada_Literal'] != 'OTRO')]
     if df_pendientes.empty: return 0
     grupos = df_pendientes.groupby('Referencia_Normalizada_Literal')
-    total_conciliados = 0
+    acumulador = nuevo_acumulador()
     for ref_norm, grupo in grupos:
-        if len(grupo) > 1 and abs(grupo['Monto_BS'].sum()) <= TOLERANCIA_MAX_BS:
-            grupo_id = f"GRUPO_REF_GLOBAL_{ref_norm}"
-            indices_a_conciliar = grupo.index
-            df.loc[indices_a_conciliar, 'Conciliado'] = True
-            df.loc[indices_a_conciliar, 'Grupo_Conciliado'] = grupo_id
-            total_conciliados += len(indices_a_conciliar)
+        if len(grupo) > 1 and abs(grupo['Monto_BS_c'].sum()) <= TOLERANCIA_MAX_BS_C:
+            acumular_cruce(acumulador, grupo.index, f"GRUPO_REF_GLOBAL_{ref_norm}")
+    total_conciliados = volcar_acumulador(df, acumulador)
     if total_conciliados > 0: log_messages.append(f"✔️ Fase Global N-a-N: {total_conciliados} movimientos conciliados.")
     return total_conciliados
 
-def conciliar_pares_globales_remanentes(df, log_messages):
+def conciliar_pares_globales_remanentes(df, log_messages, df_pendientes=None):
     log_messages.append(f"\n--- FASE GLOBAL 1-a-1 (Cruce de pares remanentes) ---")
-    df_pendientes = df[~df['Conciliado']].copy()
+    if df_pendientes is None: df_pendientes = df[~df['Conciliado']]
     if df_pendientes.empty or len(df_pendientes) < 2: return 0
-    debitos = df_pendientes[df_pendientes['Monto_BS'] > 0].index.tolist()
-    creditos = df_pendientes[df_pendientes['Monto_BS'] < 0].index.tolist()
-    total_conciliados = 0
-    creditos_usados = set()
-    for idx_d in debitos:
-        monto_d = df.loc[idx_d, 'Monto_BS']
-        mejor_match_idx, mejor_match_diff = None, TOLERANCIA_MAX_BS + 1
-        for idx_c in creditos:
-            if idx_c in creditos_usados: continue
-            diferencia = abs(monto_d + df.loc[idx_c, 'Monto_BS'])
-            if diferencia < mejor_match_diff:
-                mejor_match_diff, mejor_match_idx = diferencia, idx_c
-        if mejor_match_idx is not None and mejor_match_diff <= TOLERANCIA_MAX_BS:
-            asiento_d, asiento_c = df.loc[idx_d, 'Asiento'], df.loc[mejor_match_idx, 'Asiento']
-            df.loc[[idx_d, mejor_match_idx], 'Conciliado'] = True
-            df.loc[idx_d, 'Grupo_Conciliado'] = f'PAR_GLOBAL_{asiento_c}'
-            df.loc[mejor_match_idx, 'Grupo_Conciliado'] = f'PAR_GLOBAL_{asiento_d}'
-            creditos_usados.add(mejor_match_idx)
-            total_conciliados += 2
+    idx_d, idx_c, _ = emparejar_por_grupo(df_pendientes, 'Monto_BS_c', TOLERANCIA_MAX_BS_C)
+    total_conciliados = marcar_pares_conciliados(df, idx_d, idx_c, 'PAR_GLOBAL_')
     if total_conciliados > 0: log_messages.append(f"✔️ Fase Global 1-a-1: {total_conciliados} movimientos conciliados.")
     return total_conciliados
 
 def run_conciliation_fondos_en_transito (df, log_messages):
-    df = normalizar_referencia_fondos_en_transito(df)
+    df = asegurar_centimos(normalizar_referencia_fondos_en_transito(df))
     log_messages.append("\n--- INICIANDO LÓGICA DE FONDOS EN TRÁNSITO ---")
-    conciliar_diferencia_cambio(df, log_messages)
-    conciliar_ajuste_automatico(df, log_messages)
-    conciliar_pares_exactos_cero(df, 'GRUPO_SILLACA', 'FASE SILLACA 1/7 (Cruce CERO)', log_messages)
-    conciliar_pares_exactos_por_referencia(df, 'GRUPO_SILLACA', 'FASE SILLACA 2/7 (Pares por Referencia)', log_messages)
-    cruzar_pares_simples(df, 'REINTEGRO_SILLACA', 'FASE SILLACA 3/7 (Pares por Monto)', log_messages)
-    cruzar_grupos_por_criterio(df, 'REINTEGRO_SILLACA', 'Asiento', 'SILLACA_ASIENTO', 'FASE SILLACA 4/7 (Grupos por Asiento)', log_messages)
-    cruzar_grupos_por_criterio(df, 'REINTEGRO_SILLACA', 'Referencia_Normalizada_Literal', 'SILLACA_REF', 'FASE SILLACA 5/7 (Grupos por Ref. Literal)', log_messages)
-    cruzar_grupos_por_criterio(df, 'REINTEGRO_SILLACA', 'Fecha', 'SILLACA_FECHA', 'FASE SILLACA 6/7 (Grupos por Fecha)', log_messages)
-    conciliar_lote_por_grupo(df, 'GRUPO_SILLACA', 'FASE SILLACA 7/7 (CRUCE POR LOTE)', log_messages)
-    conciliar_pares_exactos_cero(df, 'GRUPO_NOTA', 'FASE NOTAS 1/6 (Cruce CERO)', log_messages)
-    conciliar_pares_exactos_por_referencia(df, 'GRUPO_NOTA', 'FASE NOTAS 2/6 (Pares por Referencia)', log_messages)
-    cruzar_pares_simples(df, 'NOTA_GENERAL', 'FASE NOTAS 3/6 (Pares por Monto)', log_messages)
-    cruzar_grupos_por_criterio(df, 'NOTA_GENERAL', 'Referencia_Normalizada_Literal', 'NOTA_REF', 'FASE NOTAS 4/6 (Grupos por Ref. Literal)', log_messages)
-    cruzar_grupos_por_criterio(df, 'NOTA_GENERAL', 'Fecha', 'NOTA_FECHA', 'FASE NOTAS 5/6 (Grupos por Fecha)', log_messages)
-    conciliar_lote_por_grupo(df, 'GRUPO_NOTA', 'FASE NOTAS 6/6 (CRUCE POR LOTE)', log_messages)
-    conciliar_pares_exactos_cero(df, 'GRUPO_BANCO', 'FASE BANCO 1/5 (Cruce CERO)', log_messages)
-    conciliar_pares_exactos_por_referencia(df, 'GRUPO_BANCO', 'FASE BANCO 2/5 (Pares por Referencia)', log_messages)
-    cruzar_pares_simples(df, 'BANCO_A_BANCO', 'FASE BANCO 3/5 (Pares por Monto)', log_messages)
-    cruzar_grupos_por_criterio(df, 'BANCO_A_BANCO', 'Referencia_Normalizada_Literal', 'BANCO_REF', 'FASE BANCO 4/5 (Grupos por Ref. Literal)', log_messages)
-    cruzar_grupos_por_criterio(df, 'BANCO_A_BANCO', 'Fecha', 'BANCO_FECHA', 'FASE BANCO 5/5 (Grupos por Fecha)', log_messages)
-    conciliar_pares_exactos_cero(df, 'GRUPO_REMESA', 'FASE REMESA 1/3 (Cruce CERO)', log_messages)
-    cruzar_pares_simples(df, 'REMESA_GENERAL', 'FASE REMESA 2/3 (Pares por Monto)', log_messages)
-    cruzar_grupos_por_criterio(df, 'REMESA_GENERAL', 'Referencia_Normalizada_Literal', 'REMESA_REF', 'FASE REMESA 3/3 (Grupos por Ref. Literal)', log_messages)
-    conciliar_grupos_globales_por_referencia(df, log_messages)
-    conciliar_pares_globales_remanentes(df, log_messages)
-    conciliar_grupos_complejos_usd(df, log_messages)
-    conciliar_pares_globales_remanentes(df, log_messages)
+    G, N = 'Clave_Grupo', 'Clave_Normalizada'
+    fases = [
+        (G, 'GRUPO_DIF_CAMBIO', conciliar_diferencia_cambio, ()),
+        (G, 'GRUPO_AJUSTE', conciliar_ajuste_automatico, ()),
+        (G, 'GRUPO_SILLACA', conciliar_pares_exactos_cero, ('GRUPO_SILLACA', 'FASE SILLACA 1/7 (Cruce CERO)')),
+        (G, 'GRUPO_SILLACA', conciliar_pares_exactos_por_referencia, ('GRUPO_SILLACA', 'FASE SILLACA 2/7 (Pares por Referencia)')),
+        (N, 'REINTEGRO_SILLACA', cruzar_pares_simples, ('REINTEGRO_SILLACA', 'FASE SILLACA 3/7 (Pares por Monto)')),
+        (N, 'REINTEGRO_SILLACA', cruzar_grupos_por_criterio, ('REINTEGRO_SILLACA', 'Asiento', 'SILLACA_ASIENTO', 'FASE SILLACA 4/7 (Grupos por Asiento)')),
+        (N, 'REINTEGRO_SILLACA', cruzar_grupos_por_criterio, ('REINTEGRO_SILLACA', 'Referencia_Normalizada_Literal', 'SILLACA_REF', 'FASE SILLACA 5/7 (Grupos por Ref. Literal)')),
+        (N, 'REINTEGRO_SILLACA', cruzar_grupos_por_criterio, ('REINTEGRO_SILLACA', 'Fecha', 'SILLACA_FECHA', 'FASE SILLACA 6/7 (Grupos por Fecha)')),
+        (G, 'GRUPO_SILLACA', conciliar_lote_por_grupo, ('GRUPO_SILLACA', 'FASE SILLACA 7/7 (CRUCE POR LOTE)')),
+        (G, 'GRUPO_NOTA', conciliar_pares_exactos_cero, ('GRUPO_NOTA', 'FASE NOTAS 1/6 (Cruce CERO)')),
+        (G, 'GRUPO_NOTA', conciliar_pares_exactos_por_referencia, ('GRUPO_NOTA', 'FASE NOTAS 2/6 (Pares por Referencia)')),
+        (N, 'NOTA_GENERAL', cruzar_pares_simples, ('NOTA_GENERAL', 'FASE NOTAS 3/6 (Pares por Monto)')),
+        (N, 'NOTA_GENERAL', cruzar_grupos_por_criterio, ('NOTA_GENERAL', 'Referencia_Normalizada_Literal', 'NOTA_REF', 'FASE NOTAS 4/6 (Grupos por Ref. Literal)')),
+        (N, 'NOTA_GENERAL', cruzar_grupos_por_criterio, ('NOTA_GENERAL', 'Fecha', 'NOTA_FECHA', 'FASE NOTAS 5/6 (Grupos por Fecha)')),
+        (G, 'GRUPO_NOTA', conciliar_lote_por_grupo, ('GRUPO_NOTA', 'FASE NOTAS 6/6 (CRUCE POR LOTE)')),
+        (G, 'GRUPO_BANCO', conciliar_pares_exactos_cero, ('GRUPO_BANCO', 'FASE BANCO 1/5 (Cruce CERO)')),
+        (G, 'GRUPO_BANCO', conciliar_pares_exactos_por_referencia, ('GRUPO_BANCO', 'FASE BANCO 2/5 (Pares por Referencia)')),
+        (N, 'BANCO_A_BANCO', cruzar_pares_simples, ('BANCO_A_BANCO', 'FASE BANCO 3/5 (Pares por Monto)')),
+        (N, 'BANCO_A_BANCO', cruzar_grupos_por_criterio, ('BANCO_A_BANCO', 'Referencia_Normalizada_Literal', 'BANCO_REF', 'FASE BANCO 4/5 (Grupos por Ref. Literal)')),
+        (N, 'BANCO_A_BANCO', cruzar_grupos_por_criterio, ('BANCO_A_BANCO', 'Fecha', 'BANCO_FECHA', 'FASE BANCO 5/5 (Grupos por Fecha)')),
+        (G, 'GRUPO_REMESA', conciliar_pares_exactos_cero, ('GRUPO_REMESA', 'FASE REMESA 1/3 (Cruce CERO)')),
+        (N, 'REMESA_GENERAL', cruzar_pares_simples, ('REMESA_GENERAL', 'FASE REMESA 2/3 (Pares por Monto)')),
+        (N, 'REMESA_GENERAL', cruzar_grupos_por_criterio, ('REMESA_GENERAL', 'Referencia_Normalizada_Literal', 'REMESA_REF', 'FASE REMESA 3/3 (Grupos por Ref. Literal)')),
+        (None, None, conciliar_grupos_globales_por_referencia, ()),
+        (None, None, conciliar_pares_globales_remanentes, ()),
+        (None, None, conciliar_grupos_complejos_usd, ()),
+        (None, None, conciliar_pares_globales_remanentes, ()),
+    ]
+    ejecutar_fases_particionadas(df, fases, log_messages, columnas_particion=(G, N))
     log_messages.append("\n--- PROCESO DE CONCILIACIÓN FINALIZADO ---")
     return df
 
 # --- (B) Módulo: Fondos por Depositar (ME) (111.04.6001)---
+# Salida: (Clave_Normalizada, Clave_Grupo, Literal fijo). Literal None = referencia limpia.
+REGLAS_FONDOS_USD = [
+    ((['TRASPASO'], ['MERCANTIL', 'ZINLI', 'BEVAL', 'SILLACA']), ('TRASPASO', 'GRUPO_TRASPASO', 'TRASPASO_GENERICO_FONDOS')),
+    ((['DIFERENCIA'], ['CAMBIO']), ('DIF_CAMBIO', 'GRUPO_DIF_CAMBIO', None)),
+    ((['BANCO A BANCO'],), ('BANCO_A_BANCO', 'GRUPO_BANCO', 'BANCO_A_BANCO')),
+    ((['BANCARIZACION'],), ('BANCARIZACION', 'GRUPO_BANCARIZACION', None)),
+    ((['REINTEGRO'],), ('REINTEGRO', 'GRUPO_REINTEGRO', None)),
+    ((['REMESA'],), ('REMESA', 'GRUPO_REMESA', None)),
+    ((['TARJETA'], ['GASTOS', 'INGRESO']), ('TARJETA_GASTOS', 'GRUPO_TARJETA', 'LOTE_TARJETAS')),
+    ((['NOTA DE DEBITO'],), ('NOTA_DEBITO', 'GRUPO_NOTA', 'NOTA_DEBITO')),
+    ((['NOTA DE CREDITO'],), ('NOTA_CREDITO', 'GRUPO_NOTA', 'NOTA_CREDITO')),
+]
+
 def normalizar_referencia_fondos_usd(df):
     df_copy = df.copy()
-    
-    def clasificar_usd(ref_str):
-        if pd.isna(ref_str): return 'OTRO', 'OTRO', 'OTRO'
-        ref = str(ref_str).upper().strip()
-        if 'TRASPASO' in ref:
-            if any(keyword in ref for keyword in ['MERCANTIL', 'ZINLI', 'BEVAL', 'SILLACA']):
-                ref_lit_norm = 'TRASPASO_GENERICO_FONDOS'
-                return 'TRASPASO', 'GRUPO_TRASPASO', ref_lit_norm
-        ref_lit_norm = re.sub(r'[^\w]', '', ref)
-        if 'DIFERENCIA' in ref and 'CAMBIO' in ref: return 'DIF_CAMBIO', 'GRUPO_DIF_CAMBIO', ref_lit_norm
-        if 'BANCO A BANCO' in ref: return 'BANCO_A_BANCO', 'GRUPO_BANCO', 'BANCO_A_BANCO'
-        if 'BANCARIZACION' in ref: return 'BANCARIZACION', 'GRUPO_BANCARIZACION', ref_lit_norm
-        if 'REINTEGRO' in ref: return 'REINTEGRO', 'GRUPO_REINTEGRO', ref_lit_norm
-        if 'REMESA' in ref: return 'REMESA', 'GRUPO_REMESA', ref_lit_norm
-        if 'TARJETA' in ref and ('GASTOS' in ref or 'INGRESO' in ref): return 'TARJETA_GASTOS', 'GRUPO_TARJETA', 'LOTE_TARJETAS'
-        if 'NOTA DE DEBITO' in ref: return 'NOTA_DEBITO', 'GRUPO_NOTA', 'NOTA_DEBITO'
-        if 'NOTA DE CREDITO' in ref: return 'NOTA_CREDITO', 'GRUPO_NOTA', 'NOTA_CREDITO'
-        return 'OTRO', 'OTRO', ref_lit_norm
-
-    df_copy[['Clave_Normalizada', 'Clave_Grupo', 'Referencia_Normalizada_Literal']] = df_copy['Referencia'].apply(clasificar_usd).apply(pd.Series)
+    es_nulo = df_copy['Referencia'].isna().to_numpy()
+    ref = df_copy['Referencia'].astype(str).str.upper().str.strip()
+    clave, grupo, literal = clasificar_por_reglas(ref, REGLAS_FONDOS_USD, ('OTRO', 'OTRO', None))
+    literal_limpio = ref.str.replace(r'[^\w]', '', regex=True).to_numpy(dtype=object)
+    literal = np.where(pd.isna(literal), literal_limpio, literal)
+
+    df_copy['Clave_Normalizada'] = np.where(es_nulo, 'OTRO', clave)
+    df_copy['Clave_Grupo'] = np.where(es_nulo, 'OTRO', grupo)
+    df_copy['Referencia_Normalizada_Literal'] = np.where(es_nulo, 'OTRO', literal)
     return df_copy
     
 def conciliar_automaticos_usd(df, log_messages):
-    total = 0
+    acumulador = nuevo_acumulador()
     grupos_a_revisar = [
         ('GRUPO_DIF_CAMBIO', 'AUTOMATICO_DIF_CAMBIO'), 
         ('GRUPO_AJUSTE', 'AUTOMATICO_AJUSTE'),
@@ -337,45 +677,41 @@ def conciliar_automaticos_usd(df, log_messages):
         
         if not indices.empty:
             # Verificamos si la suma total del grupo es Cero
-            suma_grupo = df.loc[indices, 'Monto_USD'].sum()
+            suma_grupo = df.loc[indices, 'Monto_USD_c'].sum()
             
-            if abs(suma_grupo) <= TOLERANCIA_MAX_USD:
-                df.loc[indices, ['Conciliado', 'Grupo_Conciliado']] = [True, etiqueta]
+            if abs(suma_grupo) <= TOLERANCIA_MAX_USD_C:
+                acumular_cruce(acumulador, indices, etiqueta)
                 log_messages.append(f"✔️ Fase Auto (USD): {len(indices)} conciliados por ser '{etiqueta}'.")
-                total += len(indices)
             else:
                 # Si no suman cero todos juntos, intentamos agrupar por la referencia literal forzada
                 # Esto ayuda si hay varios meses de tarjetas en el mismo archivo
                 subgrupos = df.loc[indices].groupby('Referencia_Normalizada_Literal')
                 for ref_lit, subgrupo in subgrupos:
-                    if abs(subgrupo['Monto_USD'].sum()) <= TOLERANCIA_MAX_USD:
-                         df.loc[subgrupo.index, ['Conciliado', 'Grupo_Conciliado']] = [True, f"{etiqueta}_{ref_lit}"]
-                         total += len(subgrupo.index)
+                    if abs(subgrupo['Monto_USD_c'].sum()) <= TOLERANCIA_MAX_USD_C:
+                         acumular_cruce(acumulador, subgrupo.index, f"{etiqueta}_{ref_lit}")
                          log_messages.append(f"✔️ Fase Auto (USD): {len(subgrupo)} conciliados en '{etiqueta}' (Subgrupo).")
 
-    return total
+    return volcar_acumulador(df, acumulador)
 
 def conciliar_grupos_por_referencia_usd(df, log_messages):
     log_messages.append("\n--- FASE GRUPOS POR REFERENCIA EXACTA (USD) ---")
-    total_conciliados = 0
+    acumulador = nuevo_acumulador()
     df_pendientes = df.loc[~df['Conciliado']]
     grupos = df_pendientes.groupby('Referencia_Normalizada_Literal')
     for ref_norm, grupo in grupos:
-        if len(grupo) > 1 and abs(grupo['Monto_USD'].sum()) <= TOLERANCIA_MAX_USD:
-            indices = grupo.index
-            grupo_id = f"GRUPO_REF_{ref_norm}"
-            df.loc[indices, ['Conciliado', 'Grupo_Conciliado']] = [True, grupo_id]
-            total_conciliados += len(indices)
+        if len(grupo) > 1 and abs(grupo['Monto_USD_c'].sum()) <= TOLERANCIA_MAX_USD_C:
+            acumular_cruce(acumulador, grupo.index, f"GRUPO_REF_{ref_norm}")
+    total_conciliados = volcar_acumulador(df, acumulador)
     if total_conciliados > 0:
         log_messages.append(f"✔️ Fase Grupos por Ref. Exacta: {total_conciliados} movimientos conciliados.")
     return total_conciliados
 
 def conciliar_pares_globales_exactos_usd(df, log_messages):
     log_messages.append("\n--- FASE PARES GLOBALES EXACTOS (USD) ---")
-    total_conciliados = 0
+    acumulador = nuevo_acumulador()
     df_pendientes = df.loc[~df['Conciliado']].copy()
     
-    df_pendientes['Monto_Abs'] = df_pendientes['Monto_USD'].abs()
+    df_pendientes['Monto_Abs'] = df_pendientes['Monto_USD_c'].abs()
     
     grupos_por_monto = df_pendientes.groupby('Monto_Abs')
     
@@ -383,58 +719,34 @@ def conciliar_pares_globales_exactos_usd(df, log_messages):
         if len(grupo) < 2:
             continue
             
-        debitos = grupo[grupo['Monto_USD'] > 0].index.to_list()
-        creditos = grupo[grupo['Monto_USD'] < 0].index.to_list()
+        debitos = grupo[grupo['Monto_USD_c'] > 0].index.to_list()
+        creditos = grupo[grupo['Monto_USD_c'] < 0].index.to_list()
         
+        # Mismo monto absoluto en céntimos: cada par suma exactamente cero
         pares_a_conciliar = min(len(debitos), len(creditos))
         
         if pares_a_conciliar > 0:
-            for i in range(pares_a_conciliar):
-                idx_d = debitos[i]
-                idx_c = creditos[i]
-                
-                if abs(df.loc[idx_d, 'Monto_USD'] + df.loc[idx_c, 'Monto_USD']) <= 0.01:
-                    asiento_d = df.loc[idx_d, 'Asiento']
-                    asiento_c = df.loc[idx_c, 'Asiento']
-                    df.loc[[idx_d, idx_c], 'Conciliado'] = True
-                    df.loc[idx_d, 'Grupo_Conciliado'] = f'PAR_EXACTO_{asiento_c}'
-                    df.loc[idx_c, 'Grupo_Conciliado'] = f'PAR_EXACTO_{asiento_d}'
-                    total_conciliados += 2
+            acumular_pares(acumulador, df, debitos[:pares_a_conciliar], creditos[:pares_a_conciliar], 'PAR_EXACTO_')
 
+    total_conciliados = volcar_acumulador(df, acumulador)
     if total_conciliados > 0:
         log_messages.append(f"✔️ Fase Pares Exactos: {total_conciliados} movimientos conciliados.")
     
     return total_conciliados
 
 def conciliar_pares_por_referencia_usd(df, clave_grupo, fase_name, log_messages):
-    df_pendientes = df.loc[(df['Clave_Grupo'] == clave_grupo) & (~df['Conciliado'])].copy()
+    df_pendientes = df.loc[(df['Clave_Grupo'] == clave_grupo) & (~df['Conciliado'])]
     if df_pendientes.empty: return 0
     log_messages.append(f"\n--- {fase_name} (USD) ---")
-    grupos, total_conciliados = df_pendientes.groupby('Referencia_Normalizada_Literal'), 0
-    for ref_norm, grupo in grupos:
-        if len(grupo) < 2: continue
-        debitos_idx, creditos_idx = grupo[grupo['Monto_USD'] > 0].index.tolist(), grupo[grupo['Monto_USD'] < 0].index.tolist()
-        debitos_usados, creditos_usados = set(), set()
-        for idx_d in debitos_idx:
-            if idx_d in debitos_usados: continue
-            monto_d, mejor_match, mejor_diff = df.loc[idx_d, 'Monto_USD'], None, TOLERANCIA_MAX_USD + 1
-            for idx_c in creditos_idx:
-                if idx_c in creditos_usados: continue
-                diff = abs(monto_d + df.loc[idx_c, 'Monto_USD'])
-                if diff < mejor_diff: mejor_diff, mejor_match = diff, idx_c
-            if mejor_match is not None and mejor_diff <= TOLERANCIA_MAX_USD:
-                asientos = (df.loc[idx_d, 'Asiento'], df.loc[mejor_match, 'Asiento'])
-                df.loc[idx_d, 'Grupo_Conciliado'] = f'PAR_REF_{ref_norm[:10]}_{asientos[1]}'
-                df.loc[mejor_match, 'Grupo_Conciliado'] = f'PAR_REF_{ref_norm[:10]}_{asientos[0]}'
-                df.loc[[idx_d, mejor_match], 'Conciliado'] = True
-                total_conciliados += 2
-                debitos_usados.add(idx_d); creditos_usados.add(mejor_match)
+    idx_d, idx_c, refs = emparejar_por_grupo(df_pendientes, 'Monto_USD_c', TOLERANCIA_MAX_USD_C, 'Referencia_Normalizada_Literal')
+    total_conciliados = marcar_pares_conciliados(df, idx_d, idx_c, [f'PAR_REF_{ref_norm[:10]}_' for ref_norm in refs])
     if total_conciliados > 0: log_messages.append(f"✔️ {fase_name}: {total_conciliados} movimientos conciliados.")
     return total_conciliados
     
+
 def conciliar_lote_por_grupo_usd(df, clave_grupo, fase_name, log_messages):
-    df_pendientes = df.loc[(~df['Conciliado']) & (df['Clave_Grupo'] == clave_grupo)].copy()
-    if len(df_pendientes) > 1 and abs(df_pendientes['Monto_USD'].sum()) <= TOLERANCIA_MAX_USD:
+    df_pendientes = df.loc[(~df['Conciliado']) & (df['Clave_Grupo'] == clave_grupo)]
+    if len(df_pendientes) > 1 and abs(df_pendientes['Monto_USD_c'].sum()) <= TOLERANCIA_MAX_USD_C:
         grupo_id = f"LOTE_{clave_grupo.replace('GRUPO_', '')}_{df_pendientes['Fecha'].max().strftime('%Y%m%d')}"
         df.loc[df_pendientes.index, ['Conciliado', 'Grupo_Conciliado']] = [True, grupo_id]
         log_messages.append(f"✔️ {fase_name}: {len(df_pendientes.index)} movimientos conciliados como lote.")
@@ -443,13 +755,13 @@ def conciliar_lote_por_grupo_usd(df, clave_grupo, fase_name, log_messages):
 
 def conciliar_pares_banco_a_banco_usd(df, log_messages):
     log_messages.append("\n--- FASE PARES BANCO A BANCO (USD) ---")
-    total_conciliados = 0
+    acumulador = nuevo_acumulador()
     df_pendientes = df.loc[(~df['Conciliado']) & (df['Clave_Grupo'] == 'GRUPO_BANCO')].copy()
     
     if df_pendientes.empty:
         return 0
 
-    df_pendientes['Monto_Abs'] = df_pendientes['Monto_USD'].abs()
+    df_pendientes['Monto_Abs'] = df_pendientes['Monto_USD_c'].abs()
     
     grupos_por_monto = df_pendientes.groupby('Monto_Abs')
     
@@ -457,138 +769,82 @@ def conciliar_pares_banco_a_banco_usd(df, log_messages):
         if len(grupo) < 2:
             continue
             
-        debitos = grupo[grupo['Monto_USD'] > 0].index.to_list()
-        creditos = grupo[grupo['Monto_USD'] < 0].index.to_list()
+        debitos = grupo[grupo['Monto_USD_c'] > 0].index.to_list()
+        creditos = grupo[grupo['Monto_USD_c'] < 0].index.to_list()
         
         pares_a_conciliar = min(len(debitos), len(creditos))
         
         if pares_a_conciliar > 0:
-            for i in range(pares_a_conciliar):
-                idx_d = debitos[i]
-                idx_c = creditos[i]
-                asiento_d = df.loc[idx_d, 'Asiento']
-                asiento_c = df.loc[idx_c, 'Asiento']
-                
-                df.loc[[idx_d, idx_c], 'Conciliado'] = True
-                df.loc[idx_d, 'Grupo_Conciliado'] = f'PAR_BANCO_{asiento_c}'
-                df.loc[idx_c, 'Grupo_Conciliado'] = f'PAR_BANCO_{asiento_d}'
-                total_conciliados += 2
+            acumular_pares(acumulador, df, debitos[:pares_a_conciliar], creditos[:pares_a_conciliar], 'PAR_BANCO_')
 
+    total_conciliados = volcar_acumulador(df, acumulador)
     if total_conciliados > 0:
         log_messages.append(f"✔️ Fase Pares Banco a Banco: {total_conciliados} movimientos conciliados.")
     
     return total_conciliados
 
-def conciliar_grupos_complejos_usd(df, log_messages, progress_bar=None):
+def conciliar_grupos_complejos_usd(df, log_messages, progress_bar=None, df_pendientes=None):
     """
     Fase Avanzada: Busca combinaciones de N movimientos contra 1 (N:1).
-    MEJORA: Capacidad ampliada hasta 6 combinaciones si el volumen de datos lo permite.
+    Trabaja en céntimos enteros con buscar_subconjunto_suma: hasta MAX_ELEMENTOS_GRUPO
+    elementos sin importar el volumen, acotado por un presupuesto de operaciones
+    por objetivo y un límite de tiempo para toda la fase.
     """
     log_messages.append("\n--- FASE GRUPOS COMPLEJOS (N vs 1) (USD) ---")
-    
-    pendientes = df.loc[~df['Conciliado']]
-    num_pendientes = len(pendientes)
-    
-    # Mientras menos datos, más combinaciones podemos probar sin colgar el sistema.
-    if num_pendientes < 50:
-        MAX_COMBINACIONES = 6 # ¡Potencia máxima! (Busca hasta 6 facturas contra 1 pago)
-    elif num_pendientes < 200:
-        MAX_COMBINACIONES = 5
-    elif num_pendientes < 1000:
-        MAX_COMBINACIONES = 4
-    else:
-        MAX_COMBINACIONES = 3 # Modo seguro para archivos grandes
-        
-    log_messages.append(f"ℹ️ Analizando combinaciones de hasta {MAX_COMBINACIONES} elementos contra 1...")
-    
-    debitos = pendientes[pendientes['Monto_USD'] > 0].copy()
-    creditos = pendientes[pendientes['Monto_USD'] < 0].copy()
-
-    if debitos.empty or creditos.empty: return 0
-
-    total_conciliados_fase = 0
-    indices_usados = set()
+    log_messages.append(f"ℹ️ Analizando combinaciones de hasta {MAX_ELEMENTOS_GRUPO} elementos contra 1...")
+
+    pendientes = df_pendientes if df_pendientes is not None else df.loc[~df['Conciliado']]
+    montos_c = pendientes['Monto_USD_c'].to_numpy()
+    es_debito, es_credito = montos_c > 0, montos_c < 0
+    if not es_debito.any() or not es_credito.any(): return 0
+
+    idx_deb, idx_cre = pendientes.index[es_debito], pendientes.index[es_credito]
+    cent_deb, cent_cre = montos_c[es_debito], -montos_c[es_credito]  # Créditos en valor absoluto
+    asientos_deb = pendientes.loc[es_debito, 'Asiento'].tolist()
+    asientos_cre = pendientes.loc[es_credito, 'Asiento'].tolist()
+    libres_deb = np.ones(len(idx_deb), dtype=bool)
+    libres_cre = np.ones(len(idx_cre), dtype=bool)
+
+    tolerancia_c = TOLERANCIA_MAX_USD_C
+    limite_tiempo = time.monotonic() + LIMITE_SEGUNDOS_GRUPOS
+    acumulador = nuevo_acumulador()
+
+    def buscar_contra(cent_objetivos, libres_objetivo, cent_candidatos, libres_candidatos):
+        """Recorre los objetivos de mayor a menor y devuelve [(pos_objetivo, pos_candidatos)]."""
+        hallazgos = []
+        for pos in np.argsort(-cent_objetivos, kind='stable').tolist():
+            if not libres_objetivo[pos]: continue
+            if time.monotonic() > limite_tiempo: break
+            objetivo = int(cent_objetivos[pos])
+            candidatos = np.flatnonzero(libres_candidatos & (cent_candidatos <= objetivo + tolerancia_c))
+            if len(candidatos) < 2: continue
+            combo = buscar_subconjunto_suma(cent_candidatos[candidatos], objetivo, tolerancia_c,
+                                            limite_tiempo=limite_tiempo)
+            if combo is None: continue
+            seleccion = candidatos[combo]
+            libres_candidatos[seleccion] = False
+            libres_objetivo[pos] = False
+            hallazgos.append((pos, seleccion))
+        return hallazgos
 
     # --- CASO 1: N Débitos vs 1 Crédito (Ej: Varias Facturas vs 1 Pago) ---
-    creditos_ordenados = creditos.sort_values('Monto_USD', ascending=True) 
-
-    for idx_c, row_c in creditos_ordenados.iterrows():
-        if idx_c in indices_usados: continue
-        
-        target = abs(row_c['Monto_USD'])
-        
-        # Filtramos candidatos para reducir la carga computacional
-        candidatos = debitos[
-            (debitos['Monto_USD'] <= target + TOLERANCIA_MAX_USD) & 
-            (~debitos.index.isin(indices_usados))
-        ]
-        
-        # Si hay demasiados candidatos (>30), limitamos la profundidad para este caso específico
-        limit_local = MAX_COMBINACIONES
-        if len(candidatos) > 40 and limit_local > 4:
-            limit_local = 4 # Bajamos a 4 si hay demasiados candidatos para este número específico
-        
-        if len(candidatos) < 2: continue
-        
-        encontrado = False
-        for r in range(2, limit_local + 1):
-            # Itertools es rápido, pero con r=6 puede tardar
-            for combo_idx in combinations(candidatos.index, r):
-                suma_combo = df.loc[list(combo_idx), 'Monto_USD'].sum()
-                
-                if np.isclose(suma_combo, target, atol=TOLERANCIA_MAX_USD):
-                    indices_todos = list(combo_idx) + [idx_c]
-                    asiento_c = row_c['Asiento']
-                    
-                    df.loc[indices_todos, 'Conciliado'] = True
-                    df.loc[indices_todos, 'Grupo_Conciliado'] = f'GRUPO_{r}v1_{asiento_c}'
-                    
-                    indices_usados.update(indices_todos)
-                    total_conciliados_fase += len(indices_todos)
-                    encontrado = True
-                    log_messages.append(f"   ⚡ Match Complejo: {r} Débitos suman {target:.2f}")
-                    break
-            if encontrado: break
+    for pos_c, sel_d in buscar_contra(cent_cre, libres_cre, cent_deb, libres_deb):
+        r = len(sel_d)
+        acumular_cruce(acumulador, list(idx_deb[sel_d]) + [idx_cre[pos_c]], f'GRUPO_{r}v1_{asientos_cre[pos_c]}')
+        log_messages.append(f"   ⚡ Match Complejo: {r} Débitos suman {cent_cre[pos_c] / 100:.2f}")
 
     if progress_bar: progress_bar.progress(0.7, text="Buscando N créditos contra 1 débito...")
 
     # --- CASO 2: 1 Débito vs N Créditos (Ej: 1 Depósito vs Varias CxC) ---
-    debitos_ordenados = debitos.sort_values('Monto_USD', ascending=False)
+    for pos_d, sel_c in buscar_contra(cent_deb, libres_deb, cent_cre, libres_cre):
+        r = len(sel_c)
+        acumular_cruce(acumulador, list(idx_cre[sel_c]) + [idx_deb[pos_d]], f'GRUPO_1v{r}_{asientos_deb[pos_d]}')
+        log_messages.append(f"   ⚡ Match Complejo: 1 Débito cruza con {r} Créditos")
 
-    for idx_d, row_d in debitos_ordenados.iterrows():
-        if idx_d in indices_usados: continue
-        
-        target = row_d['Monto_USD']
-        
-        candidatos = creditos[
-            (creditos['Monto_USD'].abs() <= target + TOLERANCIA_MAX_USD) & 
-            (~creditos.index.isin(indices_usados))
-        ]
-        
-        limit_local = MAX_COMBINACIONES
-        if len(candidatos) > 40 and limit_local > 4: limit_local = 4
-
-        if len(candidatos) < 2: continue
-        
-        encontrado = False
-        for r in range(2, limit_local + 1):
-            for combo_idx in combinations(candidatos.index, r):
-                suma_combo = df.loc[list(combo_idx), 'Monto_USD'].sum()
-                
-                if np.isclose(target + suma_combo, 0, atol=TOLERANCIA_MAX_USD):
-                    indices_todos = list(combo_idx) + [idx_d]
-                    asiento_d = row_d['Asiento']
-                    
-                    df.loc[indices_todos, 'Conciliado'] = True
-                    df.loc[indices_todos, 'Grupo_Conciliado'] = f'GRUPO_1v{r}_{asiento_d}'
-                    
-                    indices_usados.update(indices_todos)
-                    total_conciliados_fase += len(indices_todos)
-                    encontrado = True
-                    log_messages.append(f"   ⚡ Match Complejo: 1 Débito cruza con {r} Créditos")
-                    break
-            if encontrado: break
+    if time.monotonic() > limite_tiempo:
+        log_messages.append(f"⚠️ Grupos Complejos: se alcanzó el límite de {LIMITE_SEGUNDOS_GRUPOS} s; quedan objetivos sin revisar.")
 
+    total_conciliados_fase = volcar_acumulador(df, acumulador)
     if total_conciliados_fase > 0:
         log_messages.append(f"✔️ Fase Grupos Complejos: {total_conciliados_fase} movimientos conciliados.")
     
@@ -601,43 +857,24 @@ def conciliar_pares_globales_remanentes_usd(df, log_messages):
     if len(pendientes) < 2:
         return 0
 
-    debitos = pendientes[pendientes['Monto_USD'] > 0].copy()
-    creditos = pendientes[pendientes['Monto_USD'] < 0].copy()
+    debitos = pendientes[pendientes['Monto_USD_c'] > 0].copy()
+    creditos = pendientes[pendientes['Monto_USD_c'] < 0].copy()
 
     if debitos.empty or creditos.empty:
         return 0
 
-    debitos.reset_index(inplace=True)
-    creditos.reset_index(inplace=True)
+    pos_d, pos_c, diferencia = pares_en_banda(debitos['Monto_USD_c'], creditos['Monto_USD_c'], TOLERANCIA_MAX_USD_C)
 
-    debitos['join_key'] = 1
-    creditos['join_key'] = 1
+    # Menor diferencia primero (empates en el orden original); un débito y luego un crédito por par
+    orden = np.lexsort((pos_c, pos_d, diferencia))
+    pos_d, pos_c = pos_d[orden], pos_c[orden]
+    primeros = np.sort(np.unique(pos_d, return_index=True)[1])
+    pos_d, pos_c = pos_d[primeros], pos_c[primeros]
+    primeros = np.sort(np.unique(pos_c, return_index=True)[1])
+    pos_d, pos_c = pos_d[primeros], pos_c[primeros]
 
-    pares_potenciales = pd.merge(debitos, creditos, on='join_key', suffixes=('_d', '_c'))
-    
-    pares_potenciales['diferencia'] = abs(pares_potenciales['Monto_USD_d'] + pares_potenciales['Monto_USD_c'])
-    
-    pares_validos = pares_potenciales[pares_potenciales['diferencia'] <= TOLERANCIA_MAX_USD].copy()
-    
-    pares_validos.sort_values(by='diferencia', inplace=True)
-    
-    pares_finales = pares_validos.drop_duplicates(subset=['index_d'], keep='first')
-    pares_finales = pares_finales.drop_duplicates(subset=['index_c'], keep='first')
-    
-    total_conciliados = 0
-    if not pares_finales.empty:
-        indices_d = pares_finales['index_d'].tolist()
-        indices_c = pares_finales['index_c'].tolist()
-        
-        df.loc[indices_d + indices_c, 'Conciliado'] = True
-        
-        for _, row in pares_finales.iterrows():
-            idx_d, asiento_d = row['index_d'], row['Asiento_d']
-            idx_c, asiento_c = row['index_c'], row['Asiento_c']
-            df.loc[idx_d, 'Grupo_Conciliado'] = f'PAR_GLOBAL_{asiento_c}'
-            df.loc[idx_c, 'Grupo_Conciliado'] = f'PAR_GLOBAL_{asiento_d}'
-        
-        total_conciliados = len(indices_d) + len(indices_c)
+    total_conciliados = marcar_pares_conciliados(
+        df, list(debitos.index[pos_d]), list(creditos.index[pos_c]), 'PAR_GLOBAL_')
 
     if total_conciliados > 0:
         log_messages.append(f"✔️ Fase Global Optimizada: {total_conciliados} movimientos conciliados.")
@@ -647,7 +884,7 @@ def conciliar_pares_globales_remanentes_usd(df, log_messages):
 def conciliar_gran_total_final_usd(df, log_messages):
     log_messages.append("\n--- FASE FINAL (USD) ---")
     df_pendientes = df.loc[~df['Conciliado']]
-    if not df_pendientes.empty and abs(df_pendientes['Monto_USD'].sum()) <= TOLERANCIA_MAX_USD:
+    if not df_pendientes.empty and abs(df_pendientes['Monto_USD_c'].sum()) <= TOLERANCIA_MAX_USD_C:
         df.loc[df_pendientes.index, ['Conciliado', 'Grupo_Conciliado']] = [True, "LOTE_GRAN_TOTAL_FINAL"]
         log_messages.append(f"✔️ Fase Final: ¡Éxito! {len(df_pendientes.index)} remanentes conciliados.")
         return len(df_pendientes.index)
@@ -655,7 +892,7 @@ def conciliar_gran_total_final_usd(df, log_messages):
 
 def run_conciliation_fondos_por_depositar(df, log_messages, progress_bar=None):
     log_messages.append("\n--- INICIANDO LÓGICA DE FONDOS POR DEPOSITAR (USD) ---")
-    df = normalizar_referencia_fondos_usd(df)
+    df = asegurar_centimos(normalizar_referencia_fondos_usd(df))
     
     conciliar_automaticos_usd(df, log_messages)
     if progress_bar: progress_bar.progress(0.1, text="Fase 1/6: Conciliaciones automáticas completada.")
@@ -703,14 +940,48 @@ def normalizar_datos_cobros_viajeros(df, log_messages):
         return re.sub(r'\D', '', str(texto))
 
     # Columnas normalizadas para las claves de cruce
-    df_copy['Referencia_Norm_Num'] = df_copy['Referencia'].apply(extraer_solo_numeros)
-    df_copy['Fuente_Norm_Num'] = df_copy['Fuente'].apply(extraer_solo_numeros)
+    df_copy['Referencia_Norm_Num'] = texto_celdas(df_copy['Referencia']).apply(extraer_solo_numeros)
+    df_copy['Fuente_Norm_Num'] = texto_celdas(df_copy['Fuente']).apply(extraer_solo_numeros)
     
     # Columna para identificar reversos
     df_copy['Es_Reverso'] = df_copy['Referencia'].str.contains('REVERSO', case=False, na=False)
     
     return df_copy
 
+def emparejar_reversos_por_sufijo(df_reversos, df_originales):
+    """
+    Empareja cada reverso con el primer original libre del mismo NIT y monto opuesto
+    cuya Referencia/Fuente numérica sea sufijo de la clave del reverso (o viceversa).
+    Usa un índice NIT -> monto -> sufijo para no recorrer todos los originales.
+    Devuelve una lista de (idx_reverso, idx_original).
+    """
+    por_clave, por_sufijo = {}, {}
+    columnas = ['NIT_Normalizado', 'Monto_USD_c', 'Referencia_Norm_Num', 'Fuente_Norm_Num']
+    for pos, (nit, monto, ref, fuente) in enumerate(df_originales[columnas].itertuples(index=False)):
+        for clave in {ref, fuente}:
+            if not clave: continue
+            por_clave.setdefault((nit, monto, clave), []).append(pos)
+            for i in range(len(clave)):
+                por_sufijo.setdefault((nit, monto, clave[i:]), []).append(pos)
+
+    libres = np.ones(len(df_originales), dtype=bool)
+    indices_o = df_originales.index
+    pares = []
+    columnas = ['NIT_Normalizado', 'Monto_USD_c', 'Referencia_Norm_Num']
+    for idx_r, (nit, monto, clave_reverso) in zip(df_reversos.index, df_reversos[columnas].itertuples(index=False)):
+        if not clave_reverso: continue
+        contrapartida = -monto
+        # Candidatos: originales cuya clave es sufijo del reverso + originales que terminan en la clave del reverso
+        listas = [por_clave.get((nit, contrapartida, clave_reverso[i:]), ()) for i in range(len(clave_reverso))]
+        listas.append(por_sufijo.get((nit, contrapartida, clave_reverso), ()))
+        primeros = [next((p for p in lista if libres[p]), None) for lista in listas]
+        primeros = [p for p in primeros if p is not None]
+        if not primeros: continue
+        elegido = min(primeros)
+        libres[elegido] = False
+        pares.append((idx_r, indices_o[elegido]))
+    return pares
+
 def run_conciliation_cobros_viajeros(df, log_messages, progress_bar=None):
     """
     Versión final que maneja coincidencias parciales y limpieza automática de Diferencial Cambiario.
@@ -718,20 +989,14 @@ def run_conciliation_cobros_viajeros(df, log_messages, progress_bar=None):
     """
     log_messages.append("\n--- INICIANDO LÓGICA DE COBROS VIAJEROS (V12 - TOLERANCIA CERO) ---")
     
-    df = normalizar_datos_cobros_viajeros(df, log_messages)
+    df = asegurar_centimos(normalizar_datos_cobros_viajeros(df, log_messages))
     if progress_bar: progress_bar.progress(0.1, text="Fase de Normalización completada.")
 
     total_conciliados = 0
     indices_usados = set()
 
     # --- FASE 0: CONCILIACIÓN AUTOMÁTICA (DIFERENCIAL CAMBIARIO) ---
-    def es_ajuste_cambiario(texto):
-        t = str(texto).upper()
-        if 'DIFF' in t: return True
-        if 'CAMBIO' in t and ('DIFERENCIA' in t or 'DIF' in t or 'AJUSTE' in t): return True
-        return False
-
-    indices_dif = df[df['Referencia'].apply(es_ajuste_cambiario) & (~df['Conciliado'])].index
+    indices_dif = df[es_ajuste_cambiario_vectorizado(df['Referencia']) & (~df['Conciliado'])].index
 
     if not indices_dif.empty:
         df.loc[indices_dif, 'Conciliado'] = True
@@ -746,62 +1011,38 @@ def run_conciliation_cobros_viajeros(df, log_messages, progress_bar=None):
     df_reversos = df[df['Es_Reverso'] & (~df['Conciliado'])].copy()
     df_originales = df[~df['Es_Reverso'] & (~df['Conciliado'])].copy()
 
-    for idx_r, reverso_row in df_reversos.iterrows():
-        if idx_r in indices_usados: continue
-        
-        clave_reverso = reverso_row['Referencia_Norm_Num']
-        if not clave_reverso: continue
-
-        nit_reverso = reverso_row['NIT_Normalizado']
-        
-        for idx_o, original_row in df_originales.iterrows():
-            if idx_o in indices_usados or original_row['NIT_Normalizado'] != nit_reverso:
-                continue
-
-            clave_orig_ref = original_row['Referencia_Norm_Num']
-            clave_orig_fuente = original_row['Fuente_Norm_Num']
-            
-            match_en_referencia = (clave_reverso and clave_orig_ref and (clave_reverso.endswith(clave_orig_ref) or clave_orig_ref.endswith(clave_reverso)))
-            match_en_fuente = (clave_reverso and clave_orig_fuente and (clave_reverso.endswith(clave_orig_fuente) or clave_orig_fuente.endswith(clave_reverso)))
-
-            # Comparación con tolerancia 0.00
-            if (match_en_referencia or match_en_fuente) and np.isclose(reverso_row['Monto_USD'] + original_row['Monto_USD'], 0, atol=TOLERANCIA_ESTRICTA_USD):
-                indices_a_conciliar = [idx_r, idx_o]
-                df.loc[indices_a_conciliar, 'Conciliado'] = True
-                df.loc[indices_a_conciliar, 'Grupo_Conciliado'] = f"REVERSO_{nit_reverso}_{clave_reverso}"
-                indices_usados.update(indices_a_conciliar)
-                total_conciliados += 2
-                log_messages.append(f"✔️ Reverso conciliado para NIT {nit_reverso}.")
-                break 
+    acumulador = nuevo_acumulador()
+    for idx_r, idx_o in emparejar_reversos_por_sufijo(df_reversos, df_originales):
+        nit_reverso = df_reversos.at[idx_r, 'NIT_Normalizado']
+        acumular_cruce(acumulador, [idx_r, idx_o], f"REVERSO_{nit_reverso}_{df_reversos.at[idx_r, 'Referencia_Norm_Num']}")
+        indices_usados.update([idx_r, idx_o])
+        log_messages.append(f"✔️ Reverso conciliado para NIT {nit_reverso}.")
+    total_conciliados += volcar_acumulador(df, acumulador)
 
     if progress_bar: progress_bar.progress(0.5, text="Fase de Reversos completada.")
 
     # --- FASE 2: CONCILIACIÓN ESTÁNDAR N-a-N (Búsqueda por Recibo/Depósito) ---
     log_messages.append("--- Fase 2: Buscando grupos de conciliación estándar N-a-N ---")
     
+    # MEJORA: Si ambos números existen, tomamos el más largo para mayor precisión
+    # Esto resuelve el problema de los números truncados en JIANLONG MO
+    REGLAS_CLAVE_VINCULO = [
+        (('CC', 'CG'), 'Fuente_Norm_Num', 'Referencia_Norm_Num'),
+        (('CB',), 'Referencia_Norm_Num', 'Fuente_Norm_Num'),
+    ]
     df['Clave_Vinculo'] = ''
-    for index, row in df[~df['Conciliado']].iterrows():
-        asiento = str(row['Asiento']).upper()
-        f_num = str(row.get('Fuente_Norm_Num', ''))
-        r_num = str(row.get('Referencia_Norm_Num', ''))
-        
-        # MEJORA: Si ambos números existen, tomamos el más largo para mayor precisión
-        # Esto resuelve el problema de los números truncados en JIANLONG MO
-        if asiento.startswith(('CC', 'CG')):
-            df.loc[index, 'Clave_Vinculo'] = f_num if f_num != '' else r_num
-        elif asiento.startswith('CB'):
-            df.loc[index, 'Clave_Vinculo'] = r_num if r_num != '' else f_num
-        else:
-            df.loc[index, 'Clave_Vinculo'] = f_num if len(f_num) > len(r_num) else r_num
+    mascara_pendientes = ~df['Conciliado']
+    df.loc[mascara_pendientes, 'Clave_Vinculo'] = clave_por_prefijo_asiento(
+        df.loc[mascara_pendientes], REGLAS_CLAVE_VINCULO, ('Fuente_Norm_Num', 'Referencia_Norm_Num'))
 
     df_procesable = df[(~df['Conciliado']) & (df['Clave_Vinculo'] != '')]
     grupos = df_procesable.groupby(['NIT_Normalizado', 'Clave_Vinculo'])
     
     for (nit, clave), grupo in grupos:
-        if len(grupo) >= 2 and np.isclose(grupo['Monto_USD'].sum(), 0, atol=TOLERANCIA_ESTRICTA_USD):
-            df.loc[grupo.index, ['Conciliado', 'Grupo_Conciliado']] = [True, f"VIAJERO_{nit}_{clave}"]
+        if len(grupo) >= 2 and grupo['Monto_USD_c'].sum() == 0:
+            acumular_cruce(acumulador, grupo.index, f"VIAJERO_{nit}_{clave}")
             indices_usados.update(grupo.index)
-            total_conciliados += len(grupo)
+    total_conciliados += volcar_acumulador(df, acumulador)
 
     # --- FASE 3: EL BARRIDO DEFINITIVO POR NIT (Solución JIANLONG MO) ---
     # Si después de todo, el saldo de un NIT es CERO, se cierra.
@@ -809,16 +1050,17 @@ def run_conciliation_cobros_viajeros(df, log_messages, progress_bar=None):
     
     df_pendientes_final = df[~df['Conciliado']]
     # Agrupamos por NIT y sumamos. Usamos filter para quedarnos con los que dan CERO.
-    resumen_nit = df_pendientes_final.groupby('NIT_Normalizado')['Monto_USD'].sum().round(2)
-    nits_a_cerrar = resumen_nit[abs(resumen_nit) <= TOLERANCIA_ESTRICTA_USD].index
+    resumen_nit = df_pendientes_final.groupby('NIT_Normalizado')['Monto_USD_c'].sum()
+    nits_a_cerrar = resumen_nit[resumen_nit == 0].index
 
+    indices_por_nit = df_pendientes_final.groupby('NIT_Normalizado').groups
     for nit in nits_a_cerrar:
         if nit == 'SIN_NIT': continue
-        indices = df_pendientes_final[df_pendientes_final['NIT_Normalizado'] == nit].index
+        indices = indices_por_nit.get(nit, [])
         if len(indices) > 0:
-            df.loc[indices, ['Conciliado', 'Grupo_Conciliado']] = [True, f"BARRIDO_NETO_NIT_{nit}"]
-            total_conciliados += len(indices)
+            acumular_cruce(acumulador, indices, f"BARRIDO_NETO_NIT_{nit}")
             log_messages.append(f"✔️ NIT {nit}: Conciliado por saldo neto cero en el barrido final.")
+    total_conciliados += volcar_acumulador(df, acumulador)
 
     if progress_bar: progress_bar.progress(1.0)
     log_messages.append(f"✔️ Proceso finalizado. Conciliados: {total_conciliados}")
@@ -846,7 +1088,7 @@ def conciliar_grupos_por_empleado(df, log_messages):
     """Concilia movimientos por empleado si la suma total en USD es cero."""
     log_messages.append("\n--- FASE 1: Conciliación de saldos totales por empleado (USD) ---")
     
-    total_conciliados = 0
+    acumulador = nuevo_acumulador()
     df_pendientes = df.loc[~df['Conciliado']]
     grupos_por_empleado = df_pendientes.groupby('Clave_Empleado')
     
@@ -866,16 +1108,10 @@ def conciliar_grupos_por_empleado(df, log_messages):
         if clave_empleado == 'SIN_NIT' or pd.isna(clave_empleado) or not clave_empleado:
             continue
             
-        suma_usd = grupo['Monto_USD'].sum()
+        suma_usd_c = grupo['Monto_USD_c'].sum()
         
-        if abs(suma_usd) <= TOLERANCIA_MAX_USD:
-            indices_a_conciliar = grupo.index
-            
-            df.loc[indices_a_conciliar, 'Conciliado'] = True
-            df.loc[indices_a_conciliar, 'Grupo_Conciliado'] = f"SALDO_CERO_EMP_{clave_empleado}"
-            
-            num_movs = len(indices_a_conciliar)
-            total_conciliados += num_movs
+        if abs(suma_usd_c) <= TOLERANCIA_MAX_USD_C:
+            num_movs = acumular_cruce(acumulador, grupo.index, f"SALDO_CERO_EMP_{clave_empleado}")
             
             # Extracción segura del nombre
             if col_nombre and not grupo.empty:
@@ -883,8 +1119,9 @@ def conciliar_grupos_por_empleado(df, log_messages):
             else:
                 nombre_empleado = clave_empleado # Si no hay columna de nombre, usamos el NIT
                 
-            log_messages.append(f"✔️ Empleado '{nombre_empleado}' ({clave_empleado}) conciliado. Suma: ${suma_usd:.2f} ({num_movs} movimientos).")
+            log_messages.append(f"✔️ Empleado '{nombre_empleado}' ({clave_empleado}) conciliado. Suma: ${suma_usd_c / 100:.2f} ({num_movs} movimientos).")
 
+    total_conciliados = volcar_acumulador(df, acumulador)
     if total_conciliados > 0:
         log_messages.append(f"✔️ Fase 1: {total_conciliados} movimientos conciliados por saldo cero por empleado.")
     else:
@@ -900,7 +1137,7 @@ def run_conciliation_deudores_empleados_me(df, log_messages, progress_bar=None):
     log_messages.append("\n--- INICIANDO LÓGICA DE DEUDORES EMPLEADOS (ME) ---")
     
     # Paso 1: Normalizar los datos para obtener una clave de empleado fiable
-    df = normalizar_datos_deudores_empleados(df, log_messages)
+    df = asegurar_centimos(normalizar_datos_deudores_empleados(df, log_messages))
     if progress_bar: progress_bar.progress(0.3, text="Fase de Normalización completada.")
     
     # Paso 2: Ejecutar la lógica de conciliación principal
@@ -914,17 +1151,12 @@ def run_conciliation_deudores_empleados_me(df, log_messages, progress_bar=None):
 def normalizar_referencia_viajes(df, log_messages):
     log_messages.append("✔️ Fase de Normalización: Clasificando movimientos por tipo (Impuestos/Viáticos).")
     
-    def clasificar_tipo(referencia_str):
-        if pd.isna(referencia_str):
-            return 'OTRO'
-        ref = str(referencia_str).upper().strip()
-        if 'TIMBRES' in ref or 'FISCAL' in ref:
-            return 'IMPUESTOS'
-        if 'VIAJE' in ref or 'VIATICOS' in ref:
-            return 'VIATICOS'
-        return 'OTRO'
-
-    df['Tipo'] = df['Referencia'].apply(clasificar_tipo)
+    reglas_tipo = [
+        ((['TIMBRES', 'FISCAL'],), ('IMPUESTOS',)),
+        ((['VIAJE', 'VIATICOS'],), ('VIATICOS',)),
+    ]
+    tipo = clasificar_por_reglas(df['Referencia'].astype(str).str.upper(), reglas_tipo, ('OTRO',))[0]
+    df['Tipo'] = np.where(df['Referencia'].isna(), 'OTRO', tipo)
     
     nit_col_name = next((col for col in df.columns if str(col).strip().upper() in ['NIT', 'RIF']), None)
     if nit_col_name:
@@ -937,10 +1169,10 @@ def normalizar_referencia_viajes(df, log_messages):
 
 def conciliar_pares_exactos_por_nit_viajes(df, log_messages):
     log_messages.append("\n--- FASE 1: Búsqueda de Pares Exactos por NIT ---")
-    total_conciliados = 0
+    acumulador = nuevo_acumulador()
     
     df_pendientes = df.loc[~df['Conciliado']].copy()
-    df_pendientes['Monto_Abs'] = df_pendientes['Monto_BS'].abs()
+    df_pendientes['Monto_Abs'] = df_pendientes['Monto_BS_c'].abs()
     
     grupos = df_pendientes.groupby(['NIT_Normalizado', 'Monto_Abs'])
     
@@ -948,29 +1180,26 @@ def conciliar_pares_exactos_por_nit_viajes(df, log_messages):
         if len(grupo) < 2 or nit == 'SIN_NIT':
             continue
             
-        debitos = grupo[grupo['Monto_BS'] > 0].index.to_list()
-        creditos = grupo[grupo['Monto_BS'] < 0].index.to_list()
+        debitos = grupo[grupo['Monto_BS_c'] > 0].index.to_list()
+        creditos = grupo[grupo['Monto_BS_c'] < 0].index.to_list()
         
+        # Mismo monto absoluto en céntimos: cada par suma exactamente cero
         pares_a_conciliar = min(len(debitos), len(creditos))
         
         if pares_a_conciliar > 0:
-            for i in range(pares_a_conciliar):
-                idx_d, idx_c = debitos[i], creditos[i]
-                
-                if abs(df.loc[idx_d, 'Monto_BS'] + df.loc[idx_c, 'Monto_BS']) <= 0.01:
-                    asiento_d, asiento_c = df.loc[idx_d, 'Asiento'], df.loc[idx_c, 'Asiento']
-                    df.loc[[idx_d, idx_c], 'Conciliado'] = True
-                    df.loc[idx_d, 'Grupo_Conciliado'] = f'PAR_NIT_{nit}_{asiento_c}'
-                    df.loc[idx_c, 'Grupo_Conciliado'] = f'PAR_NIT_{nit}_{asiento_d}'
-                    total_conciliados += 2
+            acumular_pares(acumulador, df, debitos[:pares_a_conciliar], creditos[:pares_a_conciliar], f'PAR_NIT_{nit}_')
 
+    total_conciliados = volcar_acumulador(df, acumulador)
     if total_conciliados > 0:
         log_messages.append(f"✔️ Fase 1: {total_conciliados} movimientos conciliados como pares exactos por NIT.")
     return total_conciliados
 
-def conciliar_grupos_por_nit_viajes(df, log_messages):
+def conciliar_grupos_por_nit_viajes(df, log_messages, presupuesto=PRESUPUESTO_GRUPOS_NIT):
     log_messages.append("\n--- FASE 2: Búsqueda de Grupos por NIT ---")
     total_conciliados_fase = 0
+    tolerancia_c = TOLERANCIA_MAX_BS_C
+    limite_tiempo = time.monotonic() + LIMITE_SEGUNDOS_GRUPOS
+    acumulador = nuevo_acumulador()
     
     df_pendientes = df.loc[~df['Conciliado']]
     grupos_por_nit = df_pendientes.groupby('NIT_Normalizado')
@@ -979,33 +1208,33 @@ def conciliar_grupos_por_nit_viajes(df, log_messages):
         if nit == 'SIN_NIT' or len(grupo) < 2:
             continue
             
-        if abs(grupo['Monto_BS'].sum()) <= TOLERANCIA_MAX_BS:
-            indices = grupo.index
-            df.loc[indices, ['Conciliado', 'Grupo_Conciliado']] = [True, f'GRUPO_TOTAL_NIT_{nit}']
-            total_conciliados_fase += len(indices)
-            log_messages.append(f"✔️ Conciliado grupo completo para NIT {nit} ({len(indices)} movimientos).")
-            continue
-
-        LIMITE_COMBINACION = 10
-        movimientos_grupo = grupo.index.to_list()
-        
-        if len(movimientos_grupo) > LIMITE_COMBINACION:
-            log_messages.append(f"ℹ️ Se omitió la búsqueda de sub-grupos para NIT {nit} por exceso de movimientos (> {LIMITE_COMBINACION}).")
+        if abs(grupo['Monto_BS_c'].sum()) <= tolerancia_c:
+            total_conciliados_fase += acumular_cruce(acumulador, grupo.index, f'GRUPO_TOTAL_NIT_{nit}')
+            log_messages.append(f"✔️ Conciliado grupo completo para NIT {nit} ({len(grupo)} movimientos).")
             continue
 
-        indices_usados_en_grupo = set()
-        for i in range(2, len(movimientos_grupo) + 1):
-            for combo_indices in combinations(movimientos_grupo, i):
-                if not indices_usados_en_grupo.isdisjoint(combo_indices):
-                    continue
-                
-                suma_combo = df.loc[list(combo_indices), 'Monto_BS'].sum()
-                if abs(suma_combo) <= TOLERANCIA_MAX_BS:
-                    grupo_id = f"GRUPO_PARCIAL_NIT_{nit}_{total_conciliados_fase}"
-                    df.loc[list(combo_indices), ['Conciliado', 'Grupo_Conciliado']] = [True, grupo_id]
-                    indices_usados_en_grupo.update(combo_indices)
-                    total_conciliados_fase += len(combo_indices)
-
+        if time.monotonic() > limite_tiempo: break
+
+        # Búsqueda de sub-grupos que suman cero, siempre el más pequeño primero, con un solo presupuesto por NIT
+        indices_libres = grupo.index.to_numpy()
+        montos_libres = grupo['Monto_BS_c'].to_numpy()
+        restante = presupuesto
+        while len(indices_libres) >= 2:
+            combo, nodos = buscar_subconjunto_suma_cero(montos_libres, tolerancia_c, restante, limite_tiempo)
+            restante -= nodos
+            if restante < 0:
+                log_messages.append(f"ℹ️ Se agotó el presupuesto de búsqueda de sub-grupos para NIT {nit} ({len(indices_libres)} movimientos pendientes).")
+            if combo is None: break
+            grupo_id = f"GRUPO_PARCIAL_NIT_{nit}_{total_conciliados_fase}"
+            total_conciliados_fase += acumular_cruce(acumulador, indices_libres[combo], grupo_id)
+            indices_libres = np.delete(indices_libres, combo)
+            montos_libres = np.delete(montos_libres, combo)
+            if restante < 0 or time.monotonic() > limite_tiempo: break
+
+    if time.monotonic() > limite_tiempo:
+        log_messages.append(f"⚠️ Fase 2: se alcanzó el límite de {LIMITE_SEGUNDOS_GRUPOS} s; quedan NITs sin revisar.")
+
+    volcar_acumulador(df, acumulador)
     if total_conciliados_fase > 0:
         log_messages.append(f"✔️ Fase 2: {total_conciliados_fase} movimientos conciliados en grupos por NIT.")
     return total_conciliados_fase
@@ -1013,7 +1242,7 @@ def conciliar_grupos_por_nit_viajes(df, log_messages):
 def run_conciliation_viajes(df, log_messages, progress_bar=None):
     log_messages.append("\n--- INICIANDO LÓGICA DE CUENTAS DE VIAJES (BS) ---")
     
-    df = normalizar_referencia_viajes(df, log_messages)
+    df = asegurar_centimos(normalizar_referencia_viajes(df, log_messages))
     if progress_bar: progress_bar.progress(0.2, text="Fase de Normalización completada.")
     
     conciliar_pares_exactos_por_nit_viajes(df, log_messages)
@@ -1060,7 +1289,7 @@ def run_conciliation_otras_cxp(df, log_messages, progress_bar=None):
     """
     log_messages.append("\n--- INICIANDO LÓGICA DE OTRAS CUENTAS POR PAGAR (VES) ---")
     
-    df = normalizar_datos_otras_cxp(df, log_messages)
+    df = asegurar_centimos(normalizar_datos_otras_cxp(df, log_messages))
     if progress_bar: progress_bar.progress(0.2, text="Fase de Normalización completada.")
 
     total_conciliados = 0
@@ -1068,13 +1297,11 @@ def run_conciliation_otras_cxp(df, log_messages, progress_bar=None):
     # --- FASE 0: CONCILIACIÓN AUTOMÁTICA (DIFERENCIA EN CAMBIO) ---
     # Detectamos referencias que contengan 'DIFF' o la combinación 'DIFERENCIA' y 'CAMBIO'
     # Esto cubre "Diferencias de cambio al...", "DIFF000182", "Ajuste Diferencial", etc.
-    def es_diferencial_cambiario(texto):
-        t = str(texto).upper()
-        if 'DIFF' in t: return True
-        if 'CAMBIO' in t and ('DIFERENCIA' in t or 'DIF.' in t or 'AJUSTE' in t): return True
-        return False
-
-    indices_dif = df[df['Referencia'].apply(es_diferencial_cambiario) & (~df['Conciliado'])].index
+    reglas_diferencial = [
+        ((['DIFF'],), (True,)),
+        ((['CAMBIO'], ['DIFERENCIA', 'DIF.', 'AJUSTE']), (True,)),
+    ]
+    indices_dif = df[es_ajuste_cambiario_vectorizado(df['Referencia'], reglas_diferencial) & (~df['Conciliado'])].index
 
     if not indices_dif.empty:
         df.loc[indices_dif, 'Conciliado'] = True
@@ -1091,26 +1318,22 @@ def run_conciliation_otras_cxp(df, log_messages, progress_bar=None):
     if not df_procesable.empty:
         log_messages.append(f"ℹ️ Se encontraron {len(grupos)} combinaciones de NIT/Envío para analizar.")
 
+    acumulador = nuevo_acumulador()
     for (nit, envio), grupo in grupos:
         if len(grupo) < 2: 
             continue
 
         # CASO 1: Conciliación Estándar (Suma Cero)
-        if np.isclose(grupo['Monto_BS'].sum(), 0, atol=TOLERANCIA_MAX_BS):
-            indices_a_conciliar = grupo.index
-            df.loc[indices_a_conciliar, 'Conciliado'] = True
-            df.loc[indices_a_conciliar, 'Grupo_Conciliado'] = f"OTRAS_CXP_{nit}_{envio}"
-            total_conciliados += len(indices_a_conciliar)
+        if abs(grupo['Monto_BS_c'].sum()) <= TOLERANCIA_MAX_BS_C:
+            acumular_cruce(acumulador, grupo.index, f"OTRAS_CXP_{nit}_{envio}")
             
         # CASO 2: Conciliación por Magnitud (Corrección de Signos para Débitos vs Débitos)
         elif len(grupo) == 2:
-            vals = grupo['Monto_BS'].abs().values
+            vals = grupo['Monto_BS_c'].abs().values
             # Si el valor absoluto es igual (con tolerancia)
-            if np.isclose(vals[0], vals[1], atol=TOLERANCIA_MAX_BS):
-                indices_a_conciliar = grupo.index
-                df.loc[indices_a_conciliar, 'Conciliado'] = True
-                df.loc[indices_a_conciliar, 'Grupo_Conciliado'] = f"OTRAS_CXP_MAGNITUD_{nit}_{envio}"
-                total_conciliados += len(indices_a_conciliar)
+            if abs(vals[0] - vals[1]) <= TOLERANCIA_MAX_BS_C:
+                acumular_cruce(acumulador, grupo.index, f"OTRAS_CXP_MAGNITUD_{nit}_{envio}")
+    total_conciliados += volcar_acumulador(df, acumulador)
 
     if total_conciliados > 0:
         log_messages.append(f"✔️ Conciliación finalizada: Se conciliaron {total_conciliados} movimientos en total.")
@@ -1131,7 +1354,7 @@ def run_conciliation_haberes_clientes(df, log_messages, progress_bar=None):
     
     # 1. Normalización (Usamos la misma lógica de limpieza de NIT)
     # Reutilizamos normalizar_datos_otras_cxp que ya limpia NITs y Referencias
-    df = normalizar_datos_otras_cxp(df, log_messages) 
+    df = asegurar_centimos(normalizar_datos_otras_cxp(df, log_messages))
     if progress_bar: progress_bar.progress(0.2, text="Fase de Normalización completada.")
 
     total_conciliados = 0
@@ -1140,15 +1363,14 @@ def run_conciliation_haberes_clientes(df, log_messages, progress_bar=None):
     # Agrupamos por NIT. Si la suma de todos sus movimientos es 0, se cierran.
     df_pendientes = df[~df['Conciliado']]
     grupos_nit = df_pendientes.groupby('NIT_Normalizado')
+    acumulador = nuevo_acumulador()
     
     for nit, grupo in grupos_nit:
         if nit == 'SIN_NIT': continue # Saltamos los vacíos para la fase 2
         
-        if np.isclose(grupo['Monto_BS'].sum(), 0, atol=TOLERANCIA_MAX_BS):
-            indices = grupo.index
-            df.loc[indices, 'Conciliado'] = True
-            df.loc[indices, 'Grupo_Conciliado'] = f"HABER_NIT_{nit}"
-            total_conciliados += len(indices)
+        if abs(grupo['Monto_BS_c'].sum()) <= TOLERANCIA_MAX_BS_C:
+            acumular_cruce(acumulador, grupo.index, f"HABER_NIT_{nit}")
+    total_conciliados += volcar_acumulador(df, acumulador)
             
     log_messages.append(f"✔️ Fase 1 (Por NIT): {total_conciliados} movimientos conciliados.")
     if progress_bar: progress_bar.progress(0.5, text="Fase 1 completada.")
@@ -1157,35 +1379,27 @@ def run_conciliation_haberes_clientes(df, log_messages, progress_bar=None):
     # Buscamos pares (Débito vs Crédito) que tengan exactamente el mismo monto absoluto
     # Esto cruza filas con NIT vs filas SIN NIT (o NIT errado).
     df_pendientes = df[~df['Conciliado']].copy()
-    df_pendientes['Monto_Abs'] = df_pendientes['Monto_BS'].abs()
+    df_pendientes['Monto_Abs'] = df_pendientes['Monto_BS_c'].abs()
     
-    # Agrupamos por monto absoluto
+    # Agrupamos por monto absoluto (céntimos): cada débito/crédito del grupo suma exactamente cero
     grupos_monto = df_pendientes.groupby('Monto_Abs')
-    count_fase2 = 0
     
     for monto, grupo in grupos_monto:
-        if len(grupo) < 2 or monto <= TOLERANCIA_MAX_BS: continue
+        if len(grupo) < 2 or monto <= TOLERANCIA_MAX_BS_C: continue
         
-        debitos = grupo[grupo['Monto_BS'] > 0].index.tolist()
-        creditos = grupo[grupo['Monto_BS'] < 0].index.tolist()
+        debitos = grupo[grupo['Monto_BS_c'] > 0].index.tolist()
+        creditos = grupo[grupo['Monto_BS_c'] < 0].index.tolist()
         
         # Emparejamos 1 a 1
         pares = min(len(debitos), len(creditos))
-        for i in range(pares):
-            idx_d = debitos[i]
-            idx_c = creditos[i]
-            
-            # Validamos suma cero estricta
-            if np.isclose(df.loc[idx_d, 'Monto_BS'] + df.loc[idx_c, 'Monto_BS'], 0, atol=TOLERANCIA_MAX_BS):
-                # Intentamos rescatar el NIT del que sí lo tenga para la etiqueta
-                nit_d = df.loc[idx_d, 'NIT_Normalizado']
-                nit_c = df.loc[idx_c, 'NIT_Normalizado']
-                nit_ref = nit_d if nit_d != 'SIN_NIT' else (nit_c if nit_c != 'SIN_NIT' else 'GENERICO')
-                
-                df.loc[[idx_d, idx_c], 'Conciliado'] = True
-                df.loc[[idx_d, idx_c], 'Grupo_Conciliado'] = f"HABER_MONTO_{nit_ref}_{int(monto)}"
-                count_fase2 += 2
-
+        for idx_d, idx_c in zip(debitos[:pares], creditos[:pares]):
+            # Intentamos rescatar el NIT del que sí lo tenga para la etiqueta
+            nit_d = grupo.at[idx_d, 'NIT_Normalizado']
+            nit_c = grupo.at[idx_c, 'NIT_Normalizado']
+            nit_ref = nit_d if nit_d != 'SIN_NIT' else (nit_c if nit_c != 'SIN_NIT' else 'GENERICO')
+            acumular_cruce(acumulador, [idx_d, idx_c], f"HABER_MONTO_{nit_ref}_{monto // 100}")
+
+    count_fase2 = volcar_acumulador(df, acumulador)
     total_conciliados += count_fase2
     log_messages.append(f"✔️ Fase 2 (Por Monto/Sin NIT): {count_fase2} movimientos conciliados.")
     if progress_bar: progress_bar.progress(1.0, text="Proceso Finalizado.")
@@ -1200,7 +1414,6 @@ def run_conciliation_asientos_por_clasificar(df, log_messages, progress_bar=None
     Incluye diagnóstico de saldo final y redondeo forzado.
     """
     log_messages.append("\n--- INICIANDO LÓGICA DE ASIENTOS POR CLASIFICAR (BS) ---")
-    TOLERANCIA_ESTRICTA_BS = 0.00
     
     # 1. Normalización
     df_copy = df.copy()
@@ -1209,19 +1422,14 @@ def run_conciliation_asientos_por_clasificar(df, log_messages, progress_bar=None
         df['NIT_Normalizado'] = df_copy[nit_col_name].astype(str).str.upper().str.replace(r'[^A-Z0-9]', '', regex=True)
     else:
         df['NIT_Normalizado'] = 'SIN_NIT'
+    asegurar_centimos(df)
 
     if progress_bar: progress_bar.progress(0.1, text="Fase de Normalización completada.")
     
     total_conciliados = 0
 
     # --- FASE 0: LIMPIEZA AUTOMÁTICA (DIFERENCIAL CAMBIARIO) ---
-    def es_ajuste_cambiario(texto):
-        t = str(texto).upper()
-        if 'DIFF' in t: return True
-        if 'CAMBIO' in t and ('DIFERENCIA' in t or 'DIF' in t or 'AJUSTE' in t): return True
-        return False
-
-    mask_dif = df['Referencia'].apply(es_ajuste_cambiario) | df['Fuente'].apply(es_ajuste_cambiario)
+    mask_dif = es_ajuste_cambiario_vectorizado(df['Referencia']) | es_ajuste_cambiario_vectorizado(df['Fuente'])
     indices_dif = df[mask_dif & (~df['Conciliado'])].index
 
     if not indices_dif.empty:
@@ -1231,74 +1439,54 @@ def run_conciliation_asientos_por_clasificar(df, log_messages, progress_bar=None
         log_messages.append(f"✔️ Fase Auto: {len(indices_dif)} movimientos de Diferencial Cambiario conciliados.")
 
     # --- FASE 1: CRUCE POR NIT (1 a 1 y N a N) ---
-    df_pendientes = df[~df['Conciliado']]
-    grupos_nit = df_pendientes.groupby('NIT_Normalizado')
-    
-    for nit, grupo in grupos_nit:
-        if nit == 'SIN_NIT' or len(grupo) < 2: continue
-        
-        # A. Pares Exactos (1 a 1)
-        debitos = grupo[grupo['Monto_BS'] > 0].index.tolist()
-        creditos = grupo[grupo['Monto_BS'] < 0].index.tolist()
-        usados_local = set()
-        
-        for idx_d in debitos:
-            if idx_d in usados_local: continue
-            monto_d = df.loc[idx_d, 'Monto_BS']
-            for idx_c in creditos:
-                if idx_c in usados_local: continue
-                if np.isclose(monto_d + df.loc[idx_c, 'Monto_BS'], 0, atol=TOLERANCIA_ESTRICTA_BS):
-                    df.loc[[idx_d, idx_c], 'Conciliado'] = True
-                    df.loc[[idx_d, idx_c], 'Grupo_Conciliado'] = f"PAR_NIT_{nit}"
-                    total_conciliados += 2
-                    usados_local.add(idx_d); usados_local.add(idx_c)
-                    break
-        
-        # B. Grupo Completo (N a N)
-        remanente = grupo[~grupo.index.isin(usados_local)]
-        if len(remanente) > 1:
-            # Usamos round para evitar errores de flotante
-            if round(remanente['Monto_BS'].sum(), 2) == 0.00:
-                indices = remanente.index
-                df.loc[indices, 'Conciliado'] = True
-                df.loc[indices, 'Grupo_Conciliado'] = f"GRUPO_NIT_{nit}"
-                total_conciliados += len(indices)
+    df_pendientes = df[(~df['Conciliado']) & (df['NIT_Normalizado'] != 'SIN_NIT')]
+    acumulador = nuevo_acumulador()
+    
+    # A. Pares Exactos (1 a 1): búsqueda por hash del monto opuesto en céntimos dentro de cada NIT
+    idx_d, idx_c, nits = emparejar_por_grupo(df_pendientes, 'Monto_BS_c', 0, 'NIT_Normalizado')
+    for par_d, par_c, nit in zip(idx_d, idx_c, nits):
+        acumular_cruce(acumulador, [par_d, par_c], f"PAR_NIT_{nit}")
+    
+    # B. Grupo Completo (N a N): el remanente de cada NIT suma exactamente cero
+    remanente = df_pendientes[~df_pendientes.index.isin(idx_d + idx_c)]
+    resumen = remanente.groupby('NIT_Normalizado')['Monto_BS_c'].agg(['sum', 'size'])
+    indices_por_nit = remanente.groupby('NIT_Normalizado').groups
+    for nit in resumen.index[(resumen['sum'] == 0) & (resumen['size'] > 1)]:
+        acumular_cruce(acumulador, indices_por_nit[nit], f"GRUPO_NIT_{nit}")
+    total_conciliados += volcar_acumulador(df, acumulador)
 
     if progress_bar: progress_bar.progress(0.6, text="Fase por NIT completada.")
 
     # --- FASE 2: CRUCE GLOBAL POR MONTO ---
     df_pendientes_final = df[~df['Conciliado']].copy()
-    df_pendientes_final['Monto_Abs'] = df_pendientes_final['Monto_BS'].abs()
+    df_pendientes_final['Monto_Abs'] = df_pendientes_final['Monto_BS_c'].abs()
     
     for monto, grupo in df_pendientes_final.groupby('Monto_Abs'):
-        if len(grupo) < 2 or monto <= 0.01: continue
+        if len(grupo) < 2 or monto <= 1: continue
         
-        debitos = grupo[grupo['Monto_BS'] > 0].index.tolist()
-        creditos = grupo[grupo['Monto_BS'] < 0].index.tolist()
+        debitos = grupo[grupo['Monto_BS_c'] > 0].index.tolist()
+        creditos = grupo[grupo['Monto_BS_c'] < 0].index.tolist()
         
+        # Mismo monto absoluto en céntimos: cada par suma exactamente cero
         pares = min(len(debitos), len(creditos))
-        for i in range(pares):
-            idx_d, idx_c = debitos[i], creditos[i]
-            if np.isclose(df.loc[idx_d, 'Monto_BS'] + df.loc[idx_c, 'Monto_BS'], 0, atol=TOLERANCIA_ESTRICTA_BS):
-                df.loc[[idx_d, idx_c], 'Conciliado'] = True
-                df.loc[[idx_d, idx_c], 'Grupo_Conciliado'] = f"GLOBAL_MONTO_{int(monto)}"
-                total_conciliados += 2
+        for idx_d, idx_c in zip(debitos[:pares], creditos[:pares]):
+            acumular_cruce(acumulador, [idx_d, idx_c], f"GLOBAL_MONTO_{monto // 100}")
+    total_conciliados += volcar_acumulador(df, acumulador)
 
     # --- FASE 3: BARRIDO FINAL (DIAGNÓSTICO Y CORRECCIÓN) ---
     df_remanente = df[~df['Conciliado']]
     
     if not df_remanente.empty:
-        suma_final_real = df_remanente['Monto_BS'].sum()
-        suma_final_redondeada = round(suma_final_real, 2)
+        # Suma exacta en céntimos enteros (sin deriva de flotantes)
+        suma_final_c = int(df_remanente['Monto_BS_c'].sum())
         
         # MENSAJE DE DIAGNÓSTICO (Aparecerá en el Log de la web)
         log_messages.append(f"🔎 DIAGNÓSTICO FASE FINAL:")
         log_messages.append(f"   > Movimientos pendientes: {len(df_remanente)}")
-        log_messages.append(f"   > Suma Real (Python): {suma_final_real:.10f}")
-        log_messages.append(f"   > Suma Redondeada (2 dec): {suma_final_redondeada}")
+        log_messages.append(f"   > Suma pendiente: {suma_final_c / 100:.2f}")
 
-        # Si la suma redondeada es cero (o casi cero, permitiendo 1 centimo de basura)
-        if abs(suma_final_redondeada) <= 0.01:
+        # Si la suma es cero (o casi cero, permitiendo 1 centimo de basura)
+        if abs(suma_final_c) <= 1:
             indices = df_remanente.index
             df.loc[indices, 'Conciliado'] = True
             df.loc[indices, 'Grupo_Conciliado'] = 'LOTE_FINAL_REMANENTE'
@@ -1347,19 +1535,18 @@ def normalizar_datos_proveedores(df, log_messages):
 def run_conciliation_devoluciones_proveedores(df, log_messages):
     log_messages.append("\n--- INICIANDO LÓGICA DE DEVOLUCIONES A PROVEEDORES (USD) ---")
     
-    df = normalizar_datos_proveedores(df, log_messages) 
+    df = asegurar_centimos(normalizar_datos_proveedores(df, log_messages))
     
-    total_conciliados = 0
+    acumulador = nuevo_acumulador()
     df_procesable = df.loc[(~df['Conciliado']) & (df['Clave_Proveedor'].notna()) & (df['Clave_Comp'].notna())]
     
     grupos = df_procesable.groupby(['Clave_Proveedor', 'Clave_Comp'])
     
     log_messages.append(f"ℹ️ Se encontraron {len(grupos)} grupos de Proveedor/COMP para analizar.")
     for (proveedor_clave, comp), grupo in grupos:
-        if abs(round(grupo['Monto_USD'].sum(), 2)) <= TOLERANCIA_MAX_USD:
-            indices = grupo.index
-            df.loc[indices, ['Conciliado', 'Grupo_Conciliado']] = [True, f"PROV_{proveedor_clave}_{comp}"]
-            total_conciliados += len(indices)
+        if abs(grupo['Monto_USD_c'].sum()) <= TOLERANCIA_MAX_USD_C:
+            acumular_cruce(acumulador, grupo.index, f"PROV_{proveedor_clave}_{comp}")
+    total_conciliados = volcar_acumulador(df, acumulador)
 
     if total_conciliados > 0:
         log_messages.append(f"✔️ Conciliación por Proveedor/COMP: {total_conciliados} movimientos conciliados.")
@@ -1394,7 +1581,7 @@ def run_conciliation_proveedores_costos(df, log_messages, progress_bar=None):
             except: return 'NO_EMB'
         return 'NO_EMB'
 
-    df['Numero_Embarque'] = df['Referencia'].apply(extraer_y_normalizar_emb)
+    df['Numero_Embarque'] = texto_celdas(df['Referencia']).apply(extraer_y_normalizar_emb)
 
     # --- 2. VÍNCULO POR FACTURA (Backfill) ---
     def extraer_factura_clean(texto):
@@ -1406,7 +1593,7 @@ def run_conciliation_proveedores_costos(df, log_messages, progress_bar=None):
             return str(int(num_only)) if num_only else val
         return None
 
-    df['Factura_Norm'] = df['Fuente'].apply(extraer_factura_clean).fillna(df['Referencia'].apply(extraer_factura_clean))
+    df['Factura_Norm'] = texto_celdas(df['Fuente']).apply(extraer_factura_clean).fillna(texto_celdas(df['Referencia']).apply(extraer_factura_clean))
     df_con_ambos = df[(df['Numero_Embarque'] != 'NO_EMB') & (df['Factura_Norm'].notna())]
     mapa_fac_emb = df_con_ambos.groupby('Factura_Norm')['Numero_Embarque'].first().to_dict()
 
@@ -1422,10 +1609,12 @@ def run_conciliation_proveedores_costos(df, log_messages, progress_bar=None):
     mapa_emb_nit = shipments_with_nit.groupby('Numero_Embarque')['NIT_Norm'].first().to_dict()
     df['NIT_Reporte'] = df['Numero_Embarque'].map(mapa_emb_nit).fillna(df['NIT_Norm'])
 
-    # Inicialización
+    # Inicialización (montos en céntimos enteros: 1 = 0.01, 100 = 1.00)
     df['Conciliado'] = False
     df['Grupo_Conciliado'] = ""
+    asegurar_centimos(df)
     total_conciliados = 0 
+    acumulador = nuevo_acumulador()
 
     # --- FASE 1: POR EMBARQUE INDIVIDUAL (DOBLE LLAVE USD/BS) ---
     df_p1 = df[~df['Conciliado']]
@@ -1434,18 +1623,17 @@ def run_conciliation_proveedores_costos(df, log_messages, progress_bar=None):
     for emb, grupo in grupos_emb:
         if len(grupo) < 2: continue
         
-        suma_usd_abs = abs(round(grupo['Monto_USD'].sum(), 2))
-        suma_bs_abs = abs(round(grupo['Monto_BS'].sum(), 2))
+        suma_usd_abs = abs(grupo['Monto_USD_c'].sum())
+        suma_bs_abs = abs(grupo['Monto_BS_c'].sum())
         
         # REGLA: Si cuadra en USD pero tiene diferencia en BS (> 1.00), va a AJUSTE
-        if suma_usd_abs <= 0.01 and suma_bs_abs <= 1.00:
-            df.loc[grupo.index, ['Conciliado', 'Grupo_Conciliado']] = [True, f"EMBARQUE_{emb}"]
-            total_conciliados += len(grupo)
-        elif suma_usd_abs <= 1.00:
+        if suma_usd_abs <= 1 and suma_bs_abs <= 100:
+            acumular_cruce(acumulador, grupo.index, f"EMBARQUE_{emb}")
+        elif suma_usd_abs <= 100:
             # Aquí entra: diferencia en USD de hasta $1.00 
             # O USD en cero pero con diferencia en BS
-            df.loc[grupo.index, ['Conciliado', 'Grupo_Conciliado']] = [True, f"REQUIERE_AJUSTE_{emb}"]
-            total_conciliados += len(grupo)
+            acumular_cruce(acumulador, grupo.index, f"REQUIERE_AJUSTE_{emb}")
+    total_conciliados += volcar_acumulador(df, acumulador)
 
     # --- FASE 1.7: RESCATE DE HUÉRFANOS VS EMBARQUE (CON TOLERANCIA USD/BS) ---
     df_p1_7 = df[~df['Conciliado']]
@@ -1456,28 +1644,28 @@ def run_conciliation_proveedores_costos(df, log_messages, progress_bar=None):
         if abiertos.empty or huerfanos.empty: continue
         
         for emb, grupo_emb in abiertos.groupby('Numero_Embarque'):
-            saldo_usd_emb = grupo_emb['Monto_USD'].sum()
+            saldo_usd_emb = grupo_emb['Monto_USD_c'].sum()
             
             # Buscamos en los huérfanos alguno que cuadre en USD (Tolerancia $1.00)
-            match_huerfano = huerfanos[ (huerfanos['Monto_USD'] + saldo_usd_emb).abs() <= 1.00 ]
+            match_huerfano = huerfanos[ (huerfanos['Monto_USD_c'] + saldo_usd_emb).abs() <= 100 ]
             
             if not match_huerfano.empty:
-                idx_huerfano = (match_huerfano['Monto_USD'] + saldo_usd_emb).abs().idxmin()
+                idx_huerfano = (match_huerfano['Monto_USD_c'] + saldo_usd_emb).abs().idxmin()
                 indices = list(grupo_emb.index) + [idx_huerfano]
                 
                 # Verificamos saldos combinados para la etiqueta
-                res_usd = abs(round(df.loc[indices, 'Monto_USD'].sum(), 2))
-                res_bs = abs(round(df.loc[indices, 'Monto_BS'].sum(), 2))
+                res_usd = abs(grupo_nit.loc[indices, 'Monto_USD_c'].sum())
+                res_bs = abs(grupo_nit.loc[indices, 'Monto_BS_c'].sum())
                 
                 # Doble validación para decidir a qué pestaña va
-                if res_usd <= 0.01 and res_bs <= 1.00:
+                if res_usd <= 1 and res_bs <= 100:
                     etiqueta = f"RESCATE_HUERF_{emb}"
                 else:
                     etiqueta = f"REQUIERE_AJUSTE_HUERF_{emb}"
                 
-                df.loc[indices, ['Conciliado', 'Grupo_Conciliado']] = [True, etiqueta]
-                total_conciliados += len(indices)
+                acumular_cruce(acumulador, indices, etiqueta)
                 huerfanos = huerfanos.drop(idx_huerfano)
+    total_conciliados += volcar_acumulador(df, acumulador)
 
     # --- FASE 1.8: CRUCE POR COMBINATORIA DE EMBARQUES (BLINDADO USD/BS) ---
     df_p1_8 = df[~df['Conciliado']]
@@ -1487,54 +1675,54 @@ def run_conciliation_proveedores_costos(df, log_messages, progress_bar=None):
         if solo_emb.empty: continue
         
         # Saldos pendientes por cada moneda
-        saldos_usd_emb = solo_emb.groupby('Numero_Embarque')['Monto_USD'].sum().round(2)
-        saldos_bs_emb = solo_emb.groupby('Numero_Embarque')['Monto_BS'].sum().round(2)
+        saldos_usd_emb = solo_emb.groupby('Numero_Embarque')['Monto_USD_c'].sum()
+        saldos_bs_emb = solo_emb.groupby('Numero_Embarque')['Monto_BS_c'].sum()
         
-        embarques_lista = saldos_usd_emb[saldos_usd_emb.abs() > 0.01].index.tolist()
+        embarques_lista = saldos_usd_emb[saldos_usd_emb.abs() > 1].index.tolist()
         embarques_usados = set()
 
         for r in range(2, min(len(embarques_lista) + 1, 5)):
             for combo in combinations(embarques_lista, r):
                 if any(e in embarques_usados for e in combo): continue
                 
-                res_usd = abs(round(sum(saldos_usd_emb[list(combo)]), 2))
-                res_bs = abs(round(sum(saldos_bs_emb[list(combo)]), 2))
+                res_usd = abs(saldos_usd_emb[list(combo)].sum())
+                res_bs = abs(saldos_bs_emb[list(combo)].sum())
                 
-                if res_usd <= 1.00:
+                if res_usd <= 100:
                     indices_a_cerrar = solo_emb[solo_emb['Numero_Embarque'].isin(combo)].index
                     
                     # Decidimos etiqueta según doble llave
-                    if res_usd <= 0.01 and res_bs <= 1.00:
+                    if res_usd <= 1 and res_bs <= 100:
                         etiqueta = f"COMB_EMB_{nit}"
                     else:
                         etiqueta = f"REQUIERE_AJUSTE_COMB_{nit}"
                     
-                    df.loc[indices_a_cerrar, ['Conciliado', 'Grupo_Conciliado']] = [True, etiqueta]
-                    total_conciliados += len(indices_a_cerrar)
+                    acumular_cruce(acumulador, indices_a_cerrar, etiqueta)
                     embarques_usados.update(combo)
+    total_conciliados += volcar_acumulador(df, acumulador)
 
     # --- FASES FINALES DE SEGURIDAD (FUENTE, REFERENCIA, GLOBAL) ---
     # Fase 1.5: Match Fuente
     df_p1_5 = df[~df['Conciliado']]
-    grupos_fuente = df_p1_5[df_p1_5['Fuente'].notna() & (df_p1_5['Fuente'] != '')].groupby(['NIT_Reporte', 'Fuente'])
+    grupos_fuente = df_p1_5[df_p1_5['Fuente'].notna() & (df_p1_5['Fuente'] != '')].groupby(['NIT_Reporte', 'Fuente'], observed=True)
     for (nit, fuente), grupo in grupos_fuente:
-        if len(grupo) >= 2 and abs(round(grupo['Monto_USD'].sum(), 2)) <= 0.01:
-            df.loc[grupo.index, ['Conciliado', 'Grupo_Conciliado']] = [True, f"FUENTE_{fuente[:15]}"]
-            total_conciliados += len(grupo)
+        if len(grupo) >= 2 and abs(grupo['Monto_USD_c'].sum()) <= 1:
+            acumular_cruce(acumulador, grupo.index, f"FUENTE_{fuente[:15]}")
+    total_conciliados += volcar_acumulador(df, acumulador)
 
     # Fase 2: Match Referencia
     df_p2 = df[~df['Conciliado']]
-    for (nit, ref), grupo in df_p2.groupby(['NIT_Reporte', 'Referencia']):
-        if len(grupo) >= 2 and abs(round(grupo['Monto_USD'].sum(), 2)) <= 0.01:
-            df.loc[grupo.index, ['Conciliado', 'Grupo_Conciliado']] = [True, f"REF_{ref[:15]}"]
-            total_conciliados += len(grupo)
+    for (nit, ref), grupo in df_p2.groupby(['NIT_Reporte', 'Referencia'], observed=True):
+        if len(grupo) >= 2 and abs(grupo['Monto_USD_c'].sum()) <= 1:
+            acumular_cruce(acumulador, grupo.index, f"REF_{ref[:15]}")
+    total_conciliados += volcar_acumulador(df, acumulador)
 
     # Fase 3: Saldo Global por NIT
     df_p3 = df[~df['Conciliado']]
     for nit, grupo in df_p3.groupby('NIT_Reporte'):
-        if nit != 'ND' and len(grupo) >= 2 and abs(round(grupo['Monto_USD'].sum(), 2)) <= 0.01:
-            df.loc[grupo.index, ['Conciliado', 'Grupo_Conciliado']] = [True, f"SALDO_NIT_{nit}"]
-            total_conciliados += len(grupo)
+        if nit != 'ND' and len(grupo) >= 2 and abs(grupo['Monto_USD_c'].sum()) <= 1:
+            acumular_cruce(acumulador, grupo.index, f"SALDO_NIT_{nit}")
+    total_conciliados += volcar_acumulador(df, acumulador)
             
     log_messages.append(f"✔️ Conciliación finalizada. Total: {total_conciliados} movimientos.")
     return df
@@ -1615,7 +1803,7 @@ def run_conciliation_cdc_factoring(df, log_messages, progress_bar=None):
     """
     log_messages.append("\n--- INICIANDO LÓGICA DE CDC - FACTORING (USD) ---")
     
-    df = normalizar_datos_cdc_factoring(df, log_messages)
+    df = asegurar_centimos(normalizar_datos_cdc_factoring(df, log_messages))
     if progress_bar: progress_bar.progress(0.2, text="Fase de Normalización completada.")
 
     total_conciliados = 0
@@ -1623,20 +1811,15 @@ def run_conciliation_cdc_factoring(df, log_messages, progress_bar=None):
     # --- FASE 0: CONCILIACIÓN AUTOMÁTICA (DIFERENCIAL CAMBIARIO) ---
     # Detectamos ajustes contables por valoración de moneda.
     # Buscamos en Referencia, Fuente y Descripción si existe.
-    def es_ajuste_cambiario(row):
-        texto_completo = (str(row.get('Referencia', '')) + " " + 
-                          str(row.get('Fuente', '')) + " " + 
-                          str(row.get('Descripción', ''))).upper()
-        
-        palabras_clave = ['DIFERENCIA DE CAMBIO', 'DIFERENCIAS DE CAMBIO', 'DIFERENCIAL CAMBIARIO', 'AJUSTE CAMBIARIO', 'DIFF']
-        
-        for palabra in palabras_clave:
-            if palabra in texto_completo:
-                return True
-        return False
+    palabras_clave = ['DIFERENCIA DE CAMBIO', 'DIFERENCIAS DE CAMBIO', 'DIFERENCIAL CAMBIARIO', 'AJUSTE CAMBIARIO', 'DIFF']
+    texto_completo = pd.Series('', index=df.index)
+    for i, col in enumerate(['Referencia', 'Fuente', 'Descripción']):
+        valores = df[col].astype(str) if col in df.columns else ''
+        texto_completo = texto_completo + (" " if i else "") + valores
 
     # Aplicamos el filtro
-    indices_dif = df[df.apply(es_ajuste_cambiario, axis=1) & (~df['Conciliado'])].index
+    mask_dif = es_ajuste_cambiario_vectorizado(texto_completo, [((palabras_clave,), (True,))])
+    indices_dif = df[mask_dif & (~df['Conciliado'])].index
 
     if not indices_dif.empty:
         df.loc[indices_dif, 'Conciliado'] = True
@@ -1654,15 +1837,14 @@ def run_conciliation_cdc_factoring(df, log_messages, progress_bar=None):
     
     log_messages.append(f"ℹ️ Se encontraron {len(grupos)} contratos para analizar.")
 
+    acumulador = nuevo_acumulador()
     for (nit, contrato), grupo in grupos:
         if len(grupo) < 2: continue
         
         # Validar suma cero en Dólares
-        if np.isclose(grupo['Monto_USD'].sum(), 0, atol=TOLERANCIA_MAX_USD):
-            indices = grupo.index
-            df.loc[indices, 'Conciliado'] = True
-            df.loc[indices, 'Grupo_Conciliado'] = f"FACT_{nit}_{contrato}"
-            total_conciliados += len(indices)
+        if abs(grupo['Monto_USD_c'].sum()) <= TOLERANCIA_MAX_USD_C:
+            acumular_cruce(acumulador, grupo.index, f"FACT_{nit}_{contrato}")
+    total_conciliados += volcar_acumulador(df, acumulador)
 
     if total_conciliados > 0:
         log_messages.append(f"✔️ Conciliación Factoring: {total_conciliados} movimientos conciliados.")
@@ -1702,6 +1884,7 @@ def run_conciliation_envios_cofersa(df, log_messages, progress_bar=None):
     
     total_conciliados = 0
     indices_usados = set()
+    acumulador = nuevo_acumulador()
 
     # --- FASE ÚNICA: ANÁLISIS DE GRUPOS POR TIPO ---
     df_procesable = df[df['Ref_Norm'] != 'SIN_TIPO'].copy()
@@ -1713,10 +1896,8 @@ def run_conciliation_envios_cofersa(df, log_messages, progress_bar=None):
             suma_usd = round(grupo['Neto Dólar'].sum(), 2)
             
             if abs(suma_local) <= TOLERANCIA_ESTRICTA and abs(suma_usd) <= TOLERANCIA_ESTRICTA:
-                idx_grupo = grupo.index
-                df.loc[idx_grupo, 'Conciliado'] = True
-                df.loc[idx_grupo, 'Estado_Cofersa'] = f'GRUPO_CERRADO_{tipo_val}'
-                indices_usados.update(idx_grupo)
+                acumular_cruce(acumulador, grupo.index, f'GRUPO_CERRADO_{tipo_val}')
+                indices_usados.update(grupo.index)
                 continue # Pasa al siguiente grupo
             
             # --- SUB-FASE A: BUSCAR PARES EXACTOS DENTRO DEL TIPO ---
@@ -1736,11 +1917,9 @@ def run_conciliation_envios_cofersa(df, log_messages, progress_bar=None):
                     idx_c = match_credito.index[0]
                     # Validamos que el par también sume cero en USD o sea despreciable
                     # Si no suma cero en USD, lo dejamos para la sub-fase B
-                    if abs(row_d['Neto Dólar'] + df.loc[idx_c, 'Neto Dólar']) <= TOLERANCIA_ESTRICTA:
-                        indices_pareja = [idx_d, idx_c]
-                        df.loc[indices_pareja, 'Conciliado'] = True
-                        df.loc[indices_pareja, 'Estado_Cofersa'] = f'PAR_BI_MONEDA_{tipo_val}'
-                        indices_usados.update(indices_pareja)
+                    if abs(row_d['Neto Dólar'] + creditos.at[idx_c, 'Neto Dólar']) <= TOLERANCIA_ESTRICTA:
+                        acumular_cruce(acumulador, [idx_d, idx_c], f'PAR_BI_MONEDA_{tipo_val}')
+                        indices_usados.update([idx_d, idx_c])
 
             # --- SUB-FASE B: VERIFICAR SI EL RESTO DEL GRUPO SUMA CERO ---
             # Lo que no se concilió como par exacto, vemos si suma cero como bloque
@@ -1749,11 +1928,9 @@ def run_conciliation_envios_cofersa(df, log_messages, progress_bar=None):
             if len(remanente_grupo) >= 2:
                 suma_remanente = round(remanente_grupo['Neto Local'].sum(), 2)
                 if abs(suma_remanente) <= TOLERANCIA_ESTRICTA:
-                    indices_rem = remanente_grupo.index
-                    df.loc[indices_rem, 'Conciliado'] = True
-                    df.loc[indices_rem, 'Estado_Cofersa'] = f'GRUPO_NETO_{tipo_val}'
-                    indices_usados.update(indices_rem)
-                    total_conciliados += len(indices_rem)
+                    total_conciliados += acumular_cruce(acumulador, remanente_grupo.index, f'GRUPO_NETO_{tipo_val}')
+                    indices_usados.update(remanente_grupo.index)
+        volcar_acumulador(df, acumulador, col_etiqueta='Estado_Cofersa')
 
     if progress_bar:
         progress_bar.progress(1.0)
@@ -1787,8 +1964,8 @@ def normalizar_fondos_transito_cofersa(df):
         return nums[0] if nums else ""
 
     df['Ref_Norm'] = df['Referencia'].astype(str).str.strip().str.upper()
-    df['Ref_Num'] = df['Referencia'].apply(extraer_id)
-    df['Fuente_Num'] = df['Fuente'].apply(extraer_id)
+    df['Ref_Num'] = texto_celdas(df['Referencia']).apply(extraer_id)
+    df['Fuente_Num'] = texto_celdas(df['Fuente']).apply(extraer_id)
     return df
     
 def run_conciliation_fondos_fondos_cofersa(df, log_messages, progress_bar=None):
@@ -1812,8 +1989,8 @@ def run_conciliation_fondos_fondos_cofersa(df, log_messages, progress_bar=None):
 
     log_messages.append("⚙️ Preparando llaves de cruce...")
     df['Ref_Norm'] = df['Referencia'].astype(str).str.strip().str.upper()
-    df['Ref_Num'] = df['Referencia'].apply(extraer_id)
-    df['Fuente_Num'] = df['Fuente'].apply(extraer_id)
+    df['Ref_Num'] = texto_celdas(df['Referencia']).apply(extraer_id)
+    df['Fuente_Num'] = texto_celdas(df['Fuente']).apply(extraer_id)
     
     # Asegurar tipos de datos numéricos
     df['Monto_CRC'] = pd.to_numeric(df['Monto_CRC'], errors='coerce').fillna(0).round(2)
@@ -1821,6 +1998,8 @@ def run_conciliation_fondos_fondos_cofersa(df, log_messages, progress_bar=None):
     
     total_conciliados = 0
     indices_usados = set()
+    acumulador = nuevo_acumulador()
+    columnas_etiqueta = ('Grupo_Conciliado', 'Estado_Cofersa')
 
     # --- FASE 1: PARES EXACTOS (TEXTO + CRC + USD) ---
     log_messages.append("⚡ Fase 1: Emparejamiento por texto y montos...")
@@ -1835,9 +2014,9 @@ def run_conciliation_fondos_fondos_cofersa(df, log_messages, progress_bar=None):
         while debs and creds:
             idx_d, idx_c = debs.pop(0), creds.pop(0)
             if abs(df.at[idx_d, 'Monto_CRC'] + df.at[idx_c, 'Monto_CRC']) <= 0.01:
-                df.loc[[idx_d, idx_c], ['Conciliado', 'Grupo_Conciliado', 'Estado_Cofersa']] = [True, "PAR_TEXTO_BIMONEDA", "PAR_TEXTO_BIMONEDA"]
+                total_conciliados += acumular_cruce(acumulador, [idx_d, idx_c], "PAR_TEXTO_BIMONEDA")
                 indices_usados.update([idx_d, idx_c])
-                total_conciliados += 2
+    volcar_acumulador(df, acumulador, columnas_etiqueta)
 
     # --- FASE 2: CRUCE POR ID DE DOCUMENTO (Optimizado con Diccionario) ---
     log_messages.append("⚡ Fase 2: Cruce inteligente por número de depósito...")
@@ -1867,13 +2046,12 @@ def run_conciliation_fondos_fondos_cofersa(df, log_messages, progress_bar=None):
                     if idx_c in indices_usados: continue
                     # Validación de tolerancia USD
                     if abs(row_d['Monto_USD'] + df.at[idx_c, 'Monto_USD']) <= 0.00:
-                        etiqueta = f"DEPOSITO_{doc_id}"
-                        df.loc[[idx_d, idx_c], ['Conciliado', 'Grupo_Conciliado', 'Estado_Cofersa']] = [True, etiqueta, etiqueta]
+                        total_conciliados += acumular_cruce(acumulador, [idx_d, idx_c], f"DEPOSITO_{doc_id}")
                         indices_usados.update([idx_d, idx_c])
-                        total_conciliados += 2
                         mapa_creditos[key].pop(i)
                         break
                 if idx_d in indices_usados: break
+    volcar_acumulador(df, acumulador, columnas_etiqueta)
 
     # --- FASE 3: CRUCE CC VS CB (Sufijos de 4 dígitos) ---
     log_messages.append("⚡ Fase 3: Cruce por terminación de 4 dígitos...")
@@ -1902,12 +2080,11 @@ def run_conciliation_fondos_fondos_cofersa(df, log_messages, progress_bar=None):
                 for i, idx_cb in enumerate(mapa_cb[key_cc]):
                     if idx_cb in indices_usados: continue
                     if abs(row_cc['Monto_USD'] + df.at[idx_cb, 'Monto_USD']) <= 1.00:
-                        etiqueta = f"CRUCE_CC_CB_{sufijo_cc}"
-                        df.loc[[idx_cc, idx_cb], ['Conciliado', 'Grupo_Conciliado', 'Estado_Cofersa']] = [True, etiqueta, etiqueta]
+                        total_conciliados += acumular_cruce(acumulador, [idx_cc, idx_cb], f"CRUCE_CC_CB_{sufijo_cc}")
                         indices_usados.update([idx_cc, idx_cb])
-                        total_conciliados += 2
                         mapa_cb[key_cc].pop(i)
                         break
+    volcar_acumulador(df, acumulador, columnas_etiqueta)
 
     # --- FASE 4: CRUCE ESPECIAL PAGO-CLICK (V19 - BÚSQUEDA INTEGRAL) ---
     log_messages.append("--- Fase 4: Cruce Especial PAGO-CLICK (Identificador de 5 dígitos) ---")
@@ -1954,11 +2131,10 @@ def run_conciliation_fondos_fondos_cofersa(df, log_messages, progress_bar=None):
                     if abs(row_a['Monto_CRC'] + row_b['Monto_CRC']) <= 0.01:
                         if abs(row_a['Monto_USD'] + row_b['Monto_USD']) <= 1.00:
                             
-                            etiqueta = f"CLICK_{id_ref_a or id_fnt_a}"
-                            df.loc[[idx_a, idx_b], ['Conciliado', 'Grupo_Conciliado', 'Estado_Cofersa']] = [True, etiqueta, etiqueta]
+                            total_conciliados += acumular_cruce(acumulador, [idx_a, idx_b], f"CLICK_{id_ref_a or id_fnt_a}")
                             indices_usados.update([idx_a, idx_b])
-                            total_conciliados += 2
                             break # Ya encontramos pareja para la Fila A
+        volcar_acumulador(df, acumulador, columnas_etiqueta)
 
     # Limpiar columnas auxiliares
     if '_Key1' in df.columns: df.drop(columns=['_Key1'], inplace=True)
@@ -1986,7 +2162,7 @@ def run_conciliation_dev_proveedores_cofersa(df, log_messages, moneda_base='CRC'
         match = re.search(r'([EM]\d+)', str(texto).upper())
         return match.group(1) if match else 'SIN_EMB'
 
-    df['EMB_Key'] = df['Referencia'].apply(extraer_emb)
+    df['EMB_Key'] = texto_celdas(df['Referencia']).apply(extraer_emb)
     
     # 3. Limpieza de NIT y Estados
     df['NIT'] = df['NIT'].astype(str).str.strip().replace(['NAN', 'NONE', '0', '0.0'], 'SIN_NIT')
@@ -2000,6 +2176,7 @@ def run_conciliation_dev_proveedores_cofersa(df, log_messages, moneda_base='CRC'
     df_procesable = df[(df['EMB_Key'] != 'SIN_EMB') & (df['NIT'] != 'SIN_NIT')].copy()
     
     if not df_procesable.empty:
+        acumulador = nuevo_acumulador()
         grupos = df_procesable.groupby(['NIT', 'EMB_Key'])
         for (nit, emb), grupo in grupos:
             if len(grupo) < 2: continue
@@ -2007,10 +2184,8 @@ def run_conciliation_dev_proveedores_cofersa(df, log_messages, moneda_base='CRC'
             suma_grupo = round(grupo[col_monto].sum(), 2)
             
             if abs(suma_grupo) <= TOLERANCIA:
-                indices = grupo.index
-                df.loc[indices, 'Conciliado'] = True
-                df.loc[indices, 'Estado_Cofersa'] = f'DEV_PROV_{emb}'
-                total_conciliados += len(indices)
+                total_conciliados += acumular_cruce(acumulador, grupo.index, f'DEV_PROV_{emb}')
+        volcar_acumulador(df, acumulador, col_etiqueta='Estado_Cofersa')
 
     log_messages.append(f"✔️ Proceso finalizado. Se conciliaron {total_conciliados} movimientos por NIT/EMBARQUE.")
     return df
@@ -2073,12 +2248,15 @@ def _extraer_factura_cp(aplicacion):
     return ''
 
 # --- Función: Carga y Preparación ---
+PALABRAS_ENCABEZADO_CP = ['PROVEEDOR', 'RIF', 'ASIENTO', 'TIPO', 'FECHA', 'COMPROBANTE', 'MONTO', 'APLICACION']
+PALABRAS_ENCABEZADO_IVA = ['RIF PROV', 'RAZON SOCIAL', 'DOCUMENTO', 'COMPROBANTE', 'IVA RETENIDO']
+
 def preparar_df_cp(file_cp):
     """
     Carga y prepara el archivo CP.
     """
-    # 1. Leemos el archivo asumiendo encabezado en fila 5 (índice 4)
-    df = pd.read_excel(file_cp, header=4, dtype=str)
+    # 1. Encabezado ubicado por palabras clave (habitualmente fila 5, que queda como respaldo)
+    df, _ = leer_excel_con_encabezado(file_cp, PALABRAS_ENCABEZADO_CP, minimo=3, por_defecto=4, dtype=str)
     # 2. Limpieza de nombres de columnas
     df.columns = [str(col).strip() for col in df.columns]
     # 3. Mapeo específico según tu aclaratoria
@@ -2149,7 +2327,8 @@ def preparar_df_cp(file_cp):
     return df
 
 def preparar_df_iva(file_iva):
-    df = pd.read_excel(file_iva, header=4, dtype=str).rename(columns={
+    df, _ = leer_excel_con_encabezado(file_iva, PALABRAS_ENCABEZADO_IVA, minimo=3, por_defecto=4, dtype=str)
+    df = df.rename(columns={
         'Rif Prov.': 'RIF', 'Nombre o Razón Social': 'Nombre_Proveedor', 
         'Nº Documento': 'Factura', 'No. Comprobante': 'Comprobante', 
         'IVA Retenido': 'Monto'
@@ -2250,33 +2429,45 @@ def preparar_df_islr(file_path):
 
     return df
 
-def _conciliar_iva(cp_row, df_iva):
+# --- Índices hash de los reportes GALAC (se construyen una vez por archivo) ---
+def _indexar_galac(df):
+    """
+    Posiciones de filas por (RIF, Comprobante), (RIF, Factura) y RIF, calculadas en una sola pasada.
+    Cada fila de CP resuelve sus búsquedas con sondeos de diccionario en vez de recorrer el reporte completo.
+    """
+    return {
+        'df': df,
+        'rif_comprobante': df.groupby(['RIF_norm', 'Comprobante_norm'], sort=False).indices,
+        'rif_factura': df.groupby(['RIF_norm', 'Factura_norm'], sort=False).indices,
+        'rif': df.groupby('RIF_norm', sort=False).indices,
+    }
+
+def _filas_galac(galac, indice, clave):
+    """Filas del reporte GALAC para una clave del índice (vacío si no existe), en su orden original."""
+    posiciones = galac[indice].get(clave)
+    return galac['df'].iloc[posiciones] if posiciones is not None else galac['df'].iloc[:0]
+
+def _conciliar_iva(cp_row, galac_iva):
     """
     Lógica de conciliación que compara el valor absoluto de los montos si detecta una Nota de Crédito.
     """
     rif_cp = cp_row['RIF_norm']
     comprobante_cp_norm = cp_row['Comprobante_norm']
     
-    # 1. Búsqueda principal (sin cambios)
-    match_encontrado = df_iva[
-        (df_iva['RIF_norm'] == rif_cp) & 
-        (df_iva['Comprobante_norm'] == comprobante_cp_norm)
-    ]
+    # 1. Búsqueda principal por (RIF, Comprobante)
+    match_encontrado = _filas_galac(galac_iva, 'rif_comprobante', (rif_cp, comprobante_cp_norm))
     
-    # 2. Lógica de error si no se encuentra (sin cambios)
+    # 2. Lógica de error si no se encuentra
     if match_encontrado.empty:
-        # Tu lógica de error inteligente para sugerir comprobantes se mantiene aquí...
-        probable_match = df_iva[
-            (df_iva['RIF_norm'] == rif_cp) &
-            (df_iva['Factura_norm'] == cp_row['Factura_norm']) &
-            (np.isclose(df_iva['Monto'].abs(), abs(cp_row['Monto']))) # Usamos abs aquí también por si acaso
-        ]
+        # Sugerencia: misma factura y mismo monto (en valor absoluto) para el RIF
+        candidatos = _filas_galac(galac_iva, 'rif_factura', (rif_cp, cp_row['Factura_norm']))
+        probable_match = candidatos[np.isclose(candidatos['Monto'].abs(), abs(cp_row['Monto']))]
         if not probable_match.empty and len(probable_match) == 1:
             comprobante_sugerido = probable_match.iloc[0]['Comprobante']
             mensaje_error = f"Comprobante no coincide. CP: {cp_row['Comprobante']}, GALAC sugiere: {comprobante_sugerido}"
             return 'No Conciliado', mensaje_error
         else:
-            registros_del_rif_en_galac = df_iva[df_iva['RIF_norm'] == rif_cp]
+            registros_del_rif_en_galac = _filas_galac(galac_iva, 'rif', rif_cp)
             if registros_del_rif_en_galac.empty:
                 return 'No Conciliado', 'RIF no se encuentra en GALAC'
             else:
@@ -2315,7 +2506,7 @@ def _conciliar_iva(cp_row, df_iva):
             errores.append(msg)
     return ('Conciliado', 'OK') if not errores else ('Parcialmente Conciliado', ' | '.join(errores))
 
-def _conciliar_islr(cp_row, df_islr):
+def _conciliar_islr(cp_row, galac_islr):
     """
     Maneja comprobantes con múltiples facturas Y múltiples retenciones para una misma factura.
     """
@@ -2324,14 +2515,11 @@ def _conciliar_islr(cp_row, df_islr):
     factura_cp_norm = cp_row['Factura_norm']
     
     # 1. Encontrar el grupo completo del comprobante
-    comprobante_group = df_islr[
-        (df_islr['RIF_norm'] == rif_cp) & 
-        (df_islr['Comprobante_norm'] == comprobante_cp_norm)
-    ]
+    comprobante_group = _filas_galac(galac_islr, 'rif_comprobante', (rif_cp, comprobante_cp_norm))
     
     if comprobante_group.empty:
         # Lógica de error si el comprobante no existe (se mantiene)
-        if rif_cp not in df_islr['RIF_norm'].values: return 'No Conciliado', 'RIF no se encuentra en el reporte de ISLR'
+        if rif_cp not in galac_islr['rif']: return 'No Conciliado', 'RIF no se encuentra en el reporte de ISLR'
         return 'No Conciliado', f"Comprobante de CP ({cp_row['Comprobante']}) no encontrado."
 
     # 2. Dentro de ese grupo, encontrar TODAS las retenciones para nuestra factura específica
@@ -2360,7 +2548,7 @@ def _conciliar_islr(cp_row, df_islr):
         
     return ('Conciliado', 'OK') if not errores else ('Parcialmente Conciliado', ' | '.join(errores))
     
-def _conciliar_municipal(cp_row, df_municipal):
+def _conciliar_municipal(cp_row, galac_municipal):
     """
     Aplica la lógica de conciliación Municipal.
     - Usa np.isclose para una comparación segura de montos.
@@ -2370,7 +2558,7 @@ def _conciliar_municipal(cp_row, df_municipal):
     monto_cp = cp_row['Monto']
     factura_cp_norm = cp_row['Factura_norm']
     
-    candidatos_por_rif = df_municipal[df_municipal['RIF_norm'] == rif_cp]
+    candidatos_por_rif = _filas_galac(galac_municipal, 'rif', rif_cp)
     
     if candidatos_por_rif.empty:
         return 'No Conciliado', 'RIF no se encuentra en GALAC'
@@ -2388,11 +2576,114 @@ def _conciliar_municipal(cp_row, df_municipal):
         factura_sugerida_galac = posibles_matches.iloc[0]['Factura_norm']
         msg = f"Numero de factura no coincide. CP: {factura_cp_norm}, GALAC sugiere: {factura_sugerida_galac}"
         return 'Parcialmente Conciliado', msg
-        
-def _traducir_resultados_para_reporte(row, asientos_en_cg_set, df_cg):
+
+# --- Conciliación primaria vectorizada (merge de CP contra cada reporte GALAC) ---
+# Resuelven de una vez las filas de CP que SÍ tienen coincidencia en su tipo declarado, con los mismos
+# estados y mensajes que _conciliar_iva/_islr/_municipal. Las filas sin coincidencia (residuo "No Conciliado")
+# no se devuelven: pasan fila a fila por esas funciones para los mensajes de sugerencia y la búsqueda cruzada.
+def _resultado_primario(indice, errores):
+    """Estado/Detalle a partir de listas paralelas de errores ('' = sin error)."""
+    detalles = [' | '.join(e for e in partes if e) for partes in zip(*errores)]
+    return pd.DataFrame({
+        'Estado_Conciliacion': ['Parcialmente Conciliado' if d else 'Conciliado' for d in detalles],
+        'Detalle': [d or 'OK' for d in detalles]
+    }, index=indice)
+
+def _primario_iva(cp, galac_iva):
+    """IVA: primera fila GALAC por (RIF, Comprobante); valida factura y monto (en valor absoluto si es Nota de Crédito)."""
+    primera = galac_iva['df'].drop_duplicates(['RIF_norm', 'Comprobante_norm'])[['RIF_norm', 'Comprobante_norm', 'Factura_norm', 'Monto']]
+    m = cp[['RIF_norm', 'Comprobante_norm', 'Factura_norm', 'Monto', 'Es_NC']].merge(
+        primera, on=['RIF_norm', 'Comprobante_norm'], how='left', suffixes=('', '_galac'), indicator=True)
+    m.index = cp.index
+    m = m[m['_merge'] == 'both']
+
+    err_factura = np.where(m['Factura_norm'] != m['Factura_norm_galac'],
+                           "Numero de factura no coincide. CP: " + m['Factura_norm'] + ", GALAC: " + m['Factura_norm_galac'], '')
+    monto_cp, monto_galac, es_nc = m['Monto'].to_numpy(float), m['Monto_galac'].to_numpy(float), m['Es_NC'].to_numpy(bool)
+    monto_ok = np.where(es_nc, np.isclose(np.abs(monto_cp), np.abs(monto_galac)), np.isclose(monto_cp, monto_galac))
+    err_monto = ['' if ok else (f"Monto (NC) no coincide. CP: {a:.2f}, GALAC: {b:.2f}" if nc else f"Monto no coincide. CP: {a:.2f}, GALAC: {b:.2f}")
+                 for ok, nc, a, b in zip(monto_ok, es_nc, monto_cp, monto_galac)]
+    return _resultado_primario(m.index, [err_factura, err_monto])
+
+def _primario_islr(cp, galac_islr):
+    """ISLR: suma de retenciones por (RIF, Comprobante, Factura) + aviso si el comprobante trae otras facturas."""
+    df_islr = galac_islr['df']
+    sumas = df_islr.groupby(['RIF_norm', 'Comprobante_norm', 'Factura_norm'], sort=False)['Monto'].sum().rename('Monto_galac').reset_index()
+    grupos = df_islr.groupby(['RIF_norm', 'Comprobante_norm'], sort=False).agg(
+        Facturas_distintas=('Factura_norm', 'nunique'), Facturas=('Factura', 'unique')).reset_index()
+    m = (cp[['RIF_norm', 'Comprobante_norm', 'Factura_norm', 'Monto', 'Comprobante']].assign(Fila=cp.index)
+         .merge(sumas, on=['RIF_norm', 'Comprobante_norm', 'Factura_norm'])
+         .merge(grupos, on=['RIF_norm', 'Comprobante_norm'])
+         .sort_values('Fila'))
+
+    monto_cp, monto_galac = m['Monto'].to_numpy(float), m['Monto_galac'].to_numpy(float)
+    err_monto = ['' if ok else f"Monto no coincide. CP: {a:.2f}, ISLR (suma de retenciones para factura): {b:.2f}"
+                 for ok, a, b in zip(np.isclose(monto_cp, monto_galac), monto_cp, monto_galac)]
+    info = [f"INFO: Comprobante {comp} incluye otras facturas en GALAC: {facturas.tolist()}" if distintas > 1 else ''
+            for comp, distintas, facturas in zip(m['Comprobante'], m['Facturas_distintas'], m['Facturas'])]
+    return _resultado_primario(m['Fila'].to_numpy(), [err_monto, info])
+
+def _primario_municipal(cp, galac_municipal):
+    """
+    Municipal: candidatos del RIF con el mismo monto; Conciliado si alguno trae la factura, si no sugiere el primero.
+    Los candidatos salen de una ventana por (RIF, monto) sobre GALAC ordenado, sin cruzar cada RIF completo.
+    """
+    df_mun = galac_municipal['df']
+    n_cp = len(cp)
+    # Clave entera código_RIF * base + rango del monto: ordena GALAC por (RIF, monto) sin perder precisión.
+    # El RIF vacío o NaN empareja consigo mismo, igual que en merge.
+    codigos, _ = pd.factorize(pd.concat([cp['RIF_norm'], df_mun['RIF_norm']], ignore_index=True), use_na_sentinel=False)
+    monto_cp, monto_galac = cp['Monto'].to_numpy(float), df_mun['Monto'].to_numpy(float)
+    margen = 2 * (1e-8 + 1e-5 * np.abs(monto_cp))  # Más holgada que np.isclose; el filtro exacto va abajo
+    valores, rango = np.unique(np.concatenate([monto_cp - margen, monto_cp + margen, monto_galac]), return_inverse=True)
+    base = len(valores) + 1
+    clave_galac = codigos[n_cp:].astype(np.int64) * base + rango[2 * n_cp:]
+    orden = np.argsort(clave_galac, kind='stable')  # Mismo (RIF, monto): orden del archivo
+    clave_ord = clave_galac[orden]
+    desde = np.searchsorted(clave_ord, codigos[:n_cp].astype(np.int64) * base + rango[:n_cp], side='left')
+    hasta = np.searchsorted(clave_ord, codigos[:n_cp].astype(np.int64) * base + rango[n_cp:2 * n_cp], side='right')
+    cantidad = np.maximum(hasta - desde, 0)
+
+    pos_cp = np.repeat(np.arange(n_cp), cantidad)
+    inicio_bloque = np.repeat(np.cumsum(cantidad) - cantidad, cantidad)
+    pos_galac = orden[np.repeat(desde, cantidad) + (np.arange(len(pos_cp)) - inicio_bloque)]
+    validos = np.isclose(monto_galac[pos_galac], monto_cp[pos_cp])
+    pos_cp, pos_galac = pos_cp[validos], pos_galac[validos]
+
+    m = pd.DataFrame({'Fila': cp.index.to_numpy()[pos_cp], 'Orden': pos_galac,
+                      'Factura_norm': cp['Factura_norm'].to_numpy()[pos_cp],
+                      'Factura_norm_galac': df_mun['Factura_norm'].to_numpy()[pos_galac]})
+    m = m.assign(Perfecto=m['Factura_norm_galac'] == m['Factura_norm']).sort_values(['Fila', 'Orden'])
+    por_fila = m.groupby('Fila', sort=False).agg(Perfecto=('Perfecto', 'any'), Factura_cp=('Factura_norm', 'first'), Sugerida=('Factura_norm_galac', 'first'))
+
+    errores = ['' if perfecto else f"Numero de factura no coincide. CP: {fac_cp}, GALAC sugiere: {sugerida}"
+               for perfecto, fac_cp, sugerida in zip(por_fila['Perfecto'], por_fila['Factura_cp'], por_fila['Sugerida'])]
+    return _resultado_primario(por_fila.index.to_numpy(), [errores])
+        
+def _indexar_cg(df_cg):
+    """
+    Pre-proceso único del diario CG para validar retenciones: cuentas reducidas a sus dígitos y montos
+    convertidos por columna (textos US/VE o números), sumados por (ASIENTO, cuenta).
+    'sumas' queda como {(asiento, cuenta_limpia): {'DEBITO_NORM': x, 'CREDITO_NORM': y}} con las columnas presentes.
+    """
+    indice = {'vacio': df_cg.empty, 'sumas': {}}
+    if df_cg.empty or not {'ASIENTO', 'CUENTACONTABLE'}.issubset(df_cg.columns): return indice
+
+    columnas = [c for c in ('DEBITO_NORM', 'CREDITO_NORM') if c in df_cg.columns]
+    base = pd.DataFrame({
+        'ASIENTO': df_cg['ASIENTO'],
+        'CUENTA_LIMPIA': df_cg['CUENTACONTABLE'].astype(str).str.replace(r'\D', '', regex=True)
+    })
+    for col in columnas: base[col] = convertir_montos(df_cg[col]).to_numpy()
+    grupos = base.groupby(['ASIENTO', 'CUENTA_LIMPIA'], sort=False)
+    indice['sumas'] = grupos[columnas].sum().to_dict('index') if columnas else {clave: {} for clave in grupos.size().index}
+    return indice
+
+def _traducir_resultados_para_reporte(row, asientos_en_cg_set, indice_cg):
     """
     La validación de CG ahora respeta
     tanto los errores de subtipo como los errores de monto de la conciliación de GALAC.
+    Las sumas del asiento por cuenta salen del índice precalculado (_indexar_cg).
     """
     
     # 1. ESTADO CP vs GALAC
@@ -2404,14 +2695,13 @@ def _traducir_resultados_para_reporte(row, asientos_en_cg_set, df_cg):
     
     # 2. VALIDACIÓN CONTABILIDAD GENERAL (CG)
     asiento_cp = row.get('Asiento', None)
-    if not asiento_cp or df_cg.empty:
+    if not asiento_cp or indice_cg['vacio']:
         return cp_vs_galac, 'No Aplica'
 
     if asiento_cp not in asientos_en_cg_set:
         return cp_vs_galac, 'Asiento no encontrado en CG'
 
     errores_cg = []
-    transacciones_asiento = df_cg[df_cg['ASIENTO'] == asiento_cp]
 
     # --- A. DEFINICIÓN DE CUENTA ESPERADA ---
     mapa_cuentas = {
@@ -2434,58 +2724,24 @@ def _traducir_resultados_para_reporte(row, asientos_en_cg_set, df_cg):
         # 1. ADN Numérico de la cuenta (Ej: '2.1.3.05.1.001' -> '213051001')
         cuenta_objetivo_clean = re.sub(r'\D', '', cuenta_objetivo)
         
-        # 2. ADN Numérico de las cuentas en el asiento
-        transacciones_asiento['CUENTA_LIMPIA'] = transacciones_asiento['CUENTACONTABLE'].astype(str).apply(lambda x: re.sub(r'\D', '', x))
+        # 2. Sumas de las líneas del asiento con esa cuenta (ya precalculadas)
+        sumas_cuenta = indice_cg['sumas'].get((asiento_cp, cuenta_objetivo_clean))
         
-        # 3. Filtrar líneas que coinciden
-        lineas_cuenta = transacciones_asiento[transacciones_asiento['CUENTA_LIMPIA'] == cuenta_objetivo_clean]
-        
-        if lineas_cuenta.empty:
+        if sumas_cuenta is None:
             # Si no hay match, informamos qué cuenta se buscó pero no se halló
             errores_cg.append(f'Cuenta {cuenta_objetivo} no hallada en este asiento del diario')
         else:
             monto_cp = row.get('Monto', 0)
             
-            # 4. Decidir columna (Normalmente Retención es CRÉDITO, salvo en Notas de Crédito)
+            # 3. Decidir columna (Normalmente Retención es CRÉDITO, salvo en Notas de Crédito)
             aplicacion_text = str(row.get('Aplicacion', '')).upper()
             es_nota_credito = any(x in aplicacion_text for x in ['NC', 'NOTA CREDITO'])
             
             # En Facturas (Normal), la retención va al CRÉDITO. En NC va al DÉBITO.
             columna_monto_cg = 'DEBITO_NORM' if es_nota_credito else 'CREDITO_NORM'
             
-            if columna_monto_cg in lineas_cuenta.columns:
-                # Convertimos a número de forma segura (limpiando posibles strings)
-                def clean_float(val):
-                    if pd.isna(val) or val == '-': 
-                        return 0.0
-                    
-                    # Si ya es un número (int o float), lo devolvemos tal cual
-                    if isinstance(val, (int, float, np.number)):
-                        return float(val)
-                    
-                    # Si es un texto, aplicamos la lógica de conversión de formato latino
-                    val_str = str(val).strip()
-                    if not val_str:
-                        return 0.0
-                        
-                    # Caso: "1.234,56" -> Eliminamos punto de mil, cambiamos coma por punto decimal
-                    if ',' in val_str and '.' in val_str:
-                        if val_str.rfind(',') > val_str.rfind('.'):
-                            val_str = val_str.replace('.', '').replace(',', '.')
-                        else:
-                            # Caso: "1,234.56" (Formato US)
-                            val_str = val_str.replace(',', '')
-                    elif ',' in val_str:
-                        # Caso: "355,44"
-                        val_str = val_str.replace(',', '.')
-                        
-                    try:
-                        return float(val_str)
-                    except:
-                        return 0.0
-
-                # Aplicamos la limpieza y sumamos
-                suma_cg = lineas_cuenta[columna_monto_cg].apply(clean_float).sum()
+            if columna_monto_cg in sumas_cuenta:
+                suma_cg = sumas_cuenta[columna_monto_cg]
                 
                 # Comparamos con tolerancia de 0.01 centavos
                 if not np.isclose(float(monto_cp), float(suma_cg), atol=0.01):
@@ -2547,45 +2803,59 @@ def run_conciliation_retenciones(file_cp, file_cg, file_iva, file_islr, file_mun
         
         log_messages.append("Iniciando conciliación por tipo de impuesto...")
         
-        resultados = []
-        
-        # --- 4. BUCLE PRINCIPAL DE CONCILIACIÓN ---
-        for index, row in df_cp.iterrows():
-            if 'ANULADO' in str(row.get('Aplicacion', '')).upper():
-                resultados.append({'Estado_Conciliacion': 'Anulado', 'Detalle': 'Movimiento Anulado en CP'})
-                continue
-
-            subtipo = str(row.get('Subtipo', '')).upper()
-            
-            if 'IVA' in subtipo:
-                tipo_primario = 'IVA'; busqueda_primaria = lambda r: _conciliar_iva(r, df_iva)
-                busquedas_cruzadas = [('ISLR', lambda r: _conciliar_islr(r, df_islr)), ('Municipal', lambda r: _conciliar_municipal(r, df_municipal))]
-            elif 'ISLR' in subtipo:
-                tipo_primario = 'ISLR'; busqueda_primaria = lambda r: _conciliar_islr(r, df_islr)
-                busquedas_cruzadas = [('IVA', lambda r: _conciliar_iva(r, df_iva)), ('Municipal', lambda r: _conciliar_municipal(r, df_municipal))]
-            elif 'MUNICIPAL' in subtipo:
-                tipo_primario = 'Municipal'; busqueda_primaria = lambda r: _conciliar_municipal(r, df_municipal)
-                busquedas_cruzadas = [('IVA', lambda r: _conciliar_iva(r, df_iva)), ('ISLR', lambda r: _conciliar_islr(r, df_islr))]
-            else:
-                resultados.append({'Estado_Conciliacion': 'No Conciliado', 'Detalle': 'Subtipo no reconocido'})
-                continue
-
-            estado, mensaje = busqueda_primaria(row)
+        # Índices (RIF, Comprobante) / (RIF, Factura) / RIF de cada reporte GALAC, una sola vez
+        galac_iva, galac_islr, galac_municipal = _indexar_galac(df_iva), _indexar_galac(df_islr), _indexar_galac(df_municipal)
+        
+        # Tipo declarado de cada fila (IVA / ISLR / Municipal), en el mismo orden de prioridad de siempre
+        cp = df_cp.reset_index(drop=True)
+        vacio = pd.Series('', index=cp.index)
+        aplicacion = cp['Aplicacion'].astype(str).str.upper() if 'Aplicacion' in cp.columns else vacio
+        subtipo = cp['Subtipo'].astype(str).str.upper() if 'Subtipo' in cp.columns else vacio
+        if 'Comprobante' not in cp.columns: cp['Comprobante'] = ''
+        cp['Es_NC'] = aplicacion.str.contains('NC', regex=False) | aplicacion.str.contains('NOTA CREDITO', regex=False)
+        anulado = aplicacion.str.contains('ANULADO', regex=False)
+        tipo = pd.Series(np.select(
+            [subtipo.str.contains('IVA', regex=False), subtipo.str.contains('ISLR', regex=False), subtipo.str.contains('MUNICIPAL', regex=False)],
+            ['IVA', 'ISLR', 'Municipal'], ''), index=cp.index)
+
+        conciliadores = {
+            'IVA': (_primario_iva, _conciliar_iva, galac_iva),
+            'ISLR': (_primario_islr, _conciliar_islr, galac_islr),
+            'Municipal': (_primario_municipal, _conciliar_municipal, galac_municipal),
+        }
+        df_resultados = pd.DataFrame({'Estado_Conciliacion': None, 'Detalle': None}, index=cp.index)
+        df_resultados.loc[anulado] = ['Anulado', 'Movimiento Anulado en CP']
+        df_resultados.loc[~anulado & (tipo == '')] = ['No Conciliado', 'Subtipo no reconocido']
+
+        # --- 4. CONCILIACIÓN PRIMARIA VECTORIZADA (un merge por tipo de impuesto) ---
+        for nombre_tipo, (primario, _, galac) in conciliadores.items():
+            filas = ~anulado & (tipo == nombre_tipo)
+            if filas.any():
+                encontrados = primario(cp[filas], galac)
+                df_resultados.loc[encontrados.index, ['Estado_Conciliacion', 'Detalle']] = encontrados.to_numpy()
+
+        # Residuo "No Conciliado": mensaje de sugerencia y búsqueda en los otros tipos, fila a fila
+        for i in df_resultados.index[df_resultados['Estado_Conciliacion'].isna()]:
+            row = cp.loc[i]
+            tipo_primario = tipo[i]
+            _, conciliar, galac = conciliadores[tipo_primario]
+            estado, mensaje = conciliar(row, galac)
 
             if estado == 'No Conciliado':
-                for nombre_otro_tipo, busqueda_otro_tipo in busquedas_cruzadas:
-                    estado_otro, _ = busqueda_otro_tipo(row)
+                for nombre_otro_tipo, (_, conciliar_otro, galac_otro) in conciliadores.items():
+                    if nombre_otro_tipo == tipo_primario: continue
+                    estado_otro, _ = conciliar_otro(row, galac_otro)
                     if estado_otro in ['Conciliado', 'Parcialmente Conciliado']:
                         estado = 'Error de Subtipo'; mensaje = f'Declarado como {tipo_primario}, pero encontrado en {nombre_otro_tipo}'; break
             
-            resultados.append({'Estado_Conciliacion': estado, 'Detalle': mensaje})
+            df_resultados.loc[i] = [estado, mensaje]
 
         # --- 5. POST-PROCESAMIENTO Y GENERACIÓN DEL REPORTE FINAL ---
-        df_resultados = pd.DataFrame(resultados)
         df_cp_temp = pd.concat([df_cp.reset_index(drop=True), df_resultados], axis=1)
 
+        indice_cg = _indexar_cg(df_cg_dummy)
         df_cp_temp[['CP_Vs_Galac', 'Validacion_CG']] = df_cp_temp.apply(
-            lambda row: _traducir_resultados_para_reporte(row, asientos_en_cg_set, df_cg_dummy), 
+            lambda row: _traducir_resultados_para_reporte(row, asientos_en_cg_set, indice_cg), 
             axis=1, 
             result_type='expand'
         )
@@ -2616,18 +2886,8 @@ def procesar_calculo_pensiones(file_mayor, file_nomina, tasa_cambio, nombre_empr
     log_messages.append(f"--- INICIANDO CÁLCULO DE PENSIONES (9%) - {nombre_empresa} ---")
     
     # 0. HERRAMIENTAS INTERNAS
-    def limpiar_monto_inteligente(valor):
-        if pd.isna(valor) or str(valor).strip() == '': return 0.0
-        if isinstance(valor, (int, float)): return float(valor)
-        t = str(valor).strip().replace('Bs', '').replace(' ', '').replace('\xa0', '')
-        if ',' in t and '.' in t:
-            if t.rfind(',') > t.rfind('.'): t = t.replace('.', '').replace(',', '.')
-            else: t = t.replace(',', '')
-        elif ',' in t: t = t.replace(',', '.')
-        elif '.' in t: 
-             if len(t.split('.')[-1]) == 3: t = t.replace('.', '')
-        try: return float(t)
-        except: return 0.0
+    # Montos del mayor/nómina en formato VE: "1.234" son miles y "1,234" lleva decimales
+    def limpiar_monto_inteligente(valor): return convertir_monto(valor, estilo='VE')
 
     mapa_nombres = { "FEBECA, C.A": "FEBECA", "MAYOR BEVAL, C.A": "BEVAL", "PRISMA, C.A": "PRISMA", "FEBECA, C.A (QUINCALLA)": "QUINCALLA" }
     keyword_empresa = mapa_nombres.get(nombre_empresa, nombre_empresa).upper()
@@ -2645,25 +2905,16 @@ def procesar_calculo_pensiones(file_mayor, file_nomina, tasa_cambio, nombre_empr
             s = "".join(c for c in unicodedata.normalize('NFD', str(texto)) if unicodedata.category(c) != 'Mn')
             return s.upper().strip()
 
-        # Cargamos todas las hojas del Excel
-        dict_hojas = pd.read_excel(file_mayor, sheet_name=None, header=None)
+        # Hojas recorridas de forma perezosa (solo sus primeras filas); se parsea completa únicamente la hoja con la tabla
+        keywords_objetivo = ['CUENTA', 'ASIENTO', 'FECHA', 'DEBITO', 'CREDITO', 'CENTRO']
         df_mayor = None
-        
-        keywords_objetivo = {'CUENTA', 'ASIENTO', 'FECHA', 'DEBITO', 'CREDITO', 'CENTRO'}
-
-        for nombre_hoja, df_raw in dict_hojas.items():
-            # Buscamos la fila que tenga el encabezado real
-            for i, row in df_raw.head(20).iterrows():
-                valores_fila = [normalizar_texto(v) for v in row.values]
-                # CORRECCIÓN DE SINTAXIS: palabra 'in' valores_fila
-                coincidencias = [palabra for palabra in valores_fila if any(k in palabra for k in keywords_objetivo)]
-                
-                if len(coincidencias) >= 2:
-                    df_mayor = df_raw.iloc[i + 1:].copy()
-                    df_mayor.columns = [normalizar_texto(c) for c in df_raw.iloc[i]]
-                    log_messages.append(f"✅ Tabla detectada en hoja '{nombre_hoja}', fila {i+1}")
-                    break
-            if df_mayor is not None: break
+
+        nombre_hoja, fila = buscar_hoja_con_encabezado(file_mayor, keywords_objetivo, minimo=2)
+        if nombre_hoja is not None:
+            file_mayor.seek(0)
+            df_mayor = pd.read_excel(file_mayor, sheet_name=nombre_hoja, header=fila)
+            df_mayor.columns = [normalizar_texto(c) for c in df_mayor.columns]
+            log_messages.append(f"✅ Tabla detectada en hoja '{nombre_hoja}', fila {fila+1}")
 
         if df_mayor is None:
             log_messages.append("❌ Error: No se detectó la tabla de datos en el archivo.")
@@ -2700,8 +2951,8 @@ def procesar_calculo_pensiones(file_mayor, file_nomina, tasa_cambio, nombre_empr
         cuentas_base = ['7.1.1.01.1.001', '7.1.1.09.1.003']
         df_filtrado = df_mayor[df_mayor[col_cta].astype(str).str.strip().isin(cuentas_base)].copy()
         
-        df_filtrado['Monto_Deb'] = df_filtrado[col_deb].apply(limpiar_monto_inteligente)
-        df_filtrado['Monto_Cre'] = df_filtrado[col_cre].apply(limpiar_monto_inteligente)
+        df_filtrado['Monto_Deb'] = convertir_montos(df_filtrado[col_deb], estilo='VE')
+        df_filtrado['Monto_Cre'] = convertir_montos(df_filtrado[col_cre], estilo='VE')
         df_filtrado['Base_Neta'] = df_filtrado['Monto_Deb'] - df_filtrado['Monto_Cre']
         df_filtrado['CC_Agrupado'] = df_filtrado[col_cc].astype(str).str.slice(0, 10)
         
@@ -2745,15 +2996,8 @@ def procesar_calculo_pensiones(file_mayor, file_nomina, tasa_cambio, nombre_empr
                 hoja_objetivo = hojas[0]
                 log_messages.append(f"⚠️ Usando primera hoja: '{hoja_objetivo}'")
             
-            # Leer encabezado
-            df_raw = pd.read_excel(xls_nomina, sheet_name=hoja_objetivo, header=None, nrows=20)
-            header_idx = 0
-            for i, row in df_raw.iterrows():
-                s = [str(x).upper().replace('\n', ' ').strip() for x in row.values]
-                if any("EMPRESA" in x for x in s) and (any("SALARIO" in x for x in s) or any("TOTAL" in x for x in s)):
-                    header_idx = i; break
-            
-            df_nom = pd.read_excel(xls_nomina, sheet_name=hoja_objetivo, header=header_idx)
+            # Encabezado: fila con EMPRESA y además SALARIO o TOTAL
+            df_nom, _ = leer_excel_con_encabezado(xls_nomina, ['EMPRESA', 'SALARIO', 'TOTAL'], hoja=hoja_objetivo, requeridas=['EMPRESA'], por_defecto=0)
             df_nom.columns = [str(c).strip().upper().replace('\n', ' ') for c in df_nom.columns]
             
             col_emp = next((c for c in df_nom.columns if 'EMPRESA' in c), None)
@@ -2876,6 +3120,17 @@ def normalizar_doc_fiscal(texto):
         return str(int(nums[-1]))
     return ""
 
+def normalizar_doc_fiscal_columna(serie):
+    """normalizar_doc_fiscal por columna: último bloque de dígitos sin ceros a la izquierda ('' si no hay)."""
+    limpio = texto_celdas(serie).str.replace('#', '', regex=False).str.replace('-', '', regex=False)
+    bloque = limpio.str.extract(r'(\d+)\D*$', expand=False)
+    return bloque.map(lambda d: str(int(d)), na_action='ignore').fillna("")
+
+def limpiar_nit_preservando_ceros(serie):
+    """NIT/RIF como texto de solo dígitos conservando ceros a la izquierda (471010.0 -> '471010'); vacío -> '0'."""
+    solo_numeros = texto_celdas(serie).str.split('.', n=1).str[0].str.replace(r'[^0-9]', '', regex=True)
+    return solo_numeros.mask(solo_numeros.isna() | (solo_numeros == ''), "0")
+
 def preparar_datos_softland_debito(df_diario, df_mayor, tag_casa):
     """
     Consolida Diario y Mayor agregando metadatos. 
@@ -2900,43 +3155,30 @@ def preparar_datos_softland_debito(df_diario, df_mayor, tag_casa):
         elif 'FUENTE' in c_norm: col_fue = c
         elif any(k in c_norm for k in ['NOMBRE', 'RAZON SOCIAL', 'DESCRIPCION NIT', 'CLIENTE']): col_nom = c
 
-    # --- SUB-FUNCIÓN 1: LIMPIEZA DE NIT PRESERVANDO CEROS ---
-    def limpiar_nit_preservando_ceros(val):
-        if pd.isna(val) or str(val).strip() == "": return "0"
-        # Quitamos decimales si Excel lo leyó como número (ej: 471010.0 -> 471010)
-        s_val = str(val).split('.')[0]
-        # Dejamos solo los dígitos, manteniendo la cadena de texto con sus ceros
-        solo_numeros = re.sub(r'[^0-9]', '', s_val)
-        return solo_numeros if solo_numeros else "0"
-
-    # --- SUB-FUNCIÓN 2: EXTRACCIÓN DE DOCUMENTO PRESERVANDO CEROS ---
-    def extraer_doc_softland(row):
-        # Intentamos primero con Fuente, luego con Referencia
-        for campo in [col_fue, col_ref]:
-            texto = row.get(campo, "")
-            if pd.isna(texto) or str(texto).strip() == "": continue
-            
-            # Limpiamos símbolos comunes que Softland añade al número
-            t_clean = str(texto).replace('#', '').replace('-', '').strip()
-            nums = re.findall(r'\d+', t_clean)
-            if nums:
-                # Retornamos el último bloque numérico como texto para mantener ceros
-                return str(nums[-1])
-        return ""
-
-    def detectar_tipo_softland(row):
-        texto = (str(row.get(col_fue, "")) + " " + str(row.get(col_ref, ""))).upper()
-        if "N/C" in texto or "NC" in texto: return "N/C"
-        if "N/D" in texto or "ND" in texto: return "N/D"
-        return "FACTURA"
-
-    # 3. Aplicar Transformaciones
+    # Columnas como texto (str() de cada celda, vacías -> ''); columna ausente -> vacía
+    def como_texto(col):
+        return texto_celdas(df_soft[col]) if col else pd.Series('', index=df_soft.index, dtype=object)
+
+    texto_fue, texto_ref = como_texto(col_fue), como_texto(col_ref)
+
+    # --- SUB-FUNCIÓN: EXTRACCIÓN DE DOCUMENTO PRESERVANDO CEROS ---
+    def ultimo_bloque_numerico(texto):
+        # Sin los símbolos que Softland añade al número; el último bloque de dígitos queda como texto (con sus ceros)
+        limpio = texto.str.replace('#', '', regex=False).str.replace('-', '', regex=False)
+        return limpio.str.extract(r'(\d+)\D*$', expand=False)
+
+    # 3. Aplicar Transformaciones (por columna)
     df_soft['CASA'] = tag_casa 
-    df_soft['_Doc_Norm'] = df_soft.apply(extraer_doc_softland, axis=1)
-    df_soft['_Tipo'] = df_soft.apply(detectar_tipo_softland, axis=1)
+    # Documento: primero desde Fuente y, si no trae dígitos, desde Referencia
+    df_soft['_Doc_Norm'] = ultimo_bloque_numerico(texto_fue).fillna(ultimo_bloque_numerico(texto_ref)).fillna("")
+    # Tipo: N/C o N/D según Fuente + Referencia (una celda vacía no aporta marca)
+    texto_tipo = (texto_fue + " " + texto_ref).str.upper()
+    df_soft['_Tipo'] = np.select(
+        [texto_tipo.str.contains('N/C|NC', regex=True), texto_tipo.str.contains('N/D|ND', regex=True)],
+        ['N/C', 'N/D'], 'FACTURA')
     
     # Aplicamos la limpieza técnica de NIT solicitada
-    df_soft['_NIT_Norm'] = df_soft[col_rif].apply(limpiar_nit_preservando_ceros) if col_rif else "0"
+    df_soft['_NIT_Norm'] = limpiar_nit_preservando_ceros(df_soft[col_rif]) if col_rif else "0"
     
     df_soft['_Nombre_Soft'] = df_soft[col_nom].fillna("SIN NOMBRE") if col_nom else "NOMBRE NO DETECTADO"
     
@@ -2971,38 +3213,41 @@ def run_conciliation_debito_fiscal(df_soft_total, df_imprenta_logica, tolerancia
     col_nom_imp = find_col(['NOMBRE O RAZON SOCIAL', 'NOMBRE', 'RAZON SOCIAL', 'CLIENTE'], df_imp)
 
     # --- 2. SUB-FUNCIONES DE LIMPIEZA TÉCNICA ---
-    def limpiar_nit_preservando_ceros(val):
-        if pd.isna(val) or str(val).strip() == "": return "0"
-        # Quitamos decimales de Excel (.0)
-        s_val = str(val).split('.')[0]
-        # Solo dígitos manteniendo la cadena de texto (preserva ceros)
-        solo_numeros = re.sub(r'[^0-9]', '', s_val)
-        return solo_numeros if solo_numeros else "0"
-
-    def identificar_tipo_y_doc_imp(row):
-        # Prioridad: N/C, luego N/D, luego Factura
-        if pd.notna(row.get(col_nc)) and str(row.get(col_nc)).strip() != "":
-            return normalizar_doc_fiscal(row.get(col_nc)), "N/C"
-        if pd.notna(row.get(col_nd)) and str(row.get(col_nd)).strip() != "":
-            return normalizar_doc_fiscal(row.get(col_nd)), "N/D"
-        
-        val_f = str(row.get(col_fact, "")).strip()
-        if val_f == "" or val_f.lower() == "nan": return "", "RESUMEN"
-        return normalizar_doc_fiscal(val_f), "FACTURA"
+    def identificar_tipo_y_doc_imp(df):
+        # Prioridad: N/C, luego N/D, luego Factura (por columna)
+        def con_valor(col):
+            if not col: return pd.Series(False, index=df.index)
+            return df[col].notna() & (texto_celdas(df[col]).str.strip() != "")
+
+        def como_doc(col):
+            return normalizar_doc_fiscal_columna(df[col]) if col else pd.Series("", index=df.index)
+
+        es_nc = con_valor(col_nc)
+        es_nd = ~es_nc & con_valor(col_nd)
+        val_f = df[col_fact].map(str).str.strip() if col_fact else pd.Series("", index=df.index)
+        es_resumen = ~es_nc & ~es_nd & ((val_f == "") | (val_f.str.lower() == "nan"))
+        condiciones = [es_nc, es_nd, es_resumen]
+        doc = np.select(condiciones, [como_doc(col_nc), como_doc(col_nd), ""], normalizar_doc_fiscal_columna(val_f))
+        tipo = np.select(condiciones, ["N/C", "N/D", "RESUMEN"], "FACTURA")
+        return doc, tipo
 
     # --- 3. PREPARACIÓN DE DATA IMPRENTA ---
-    # Filtro Anti-Totales y filas en verde del libro
+    # Filtro Anti-Totales y filas en verde del libro. Solo las columnas de texto pueden traer
+    # "TOTALES"/"RESUMEN" (un número o una fecha convertidos a texto nunca los contienen).
     if col_rif:
         df_imp = df_imp[df_imp[col_rif].notna()]
-        mask_totales = df_imp.astype(str).apply(lambda x: x.str.contains('TOTALES|RESUMEN', case=False, na=False)).any(axis=1)
+        cols_texto = df_imp.select_dtypes(include=['object', 'string', 'category']).columns
+        mask_totales = pd.Series(False, index=df_imp.index)
+        for col in cols_texto:
+            mask_totales |= df_imp[col].astype(str).str.contains('TOTALES|RESUMEN', case=False, na=False).to_numpy()
         df_imp = df_imp[~mask_totales]
 
     # Aplicar identificación de Doc y Tipo (Preservando ceros)
-    df_imp[['_Doc_Norm', '_Tipo']] = df_imp.apply(identificar_tipo_y_doc_imp, axis=1, result_type='expand')
+    df_imp['_Doc_Norm'], df_imp['_Tipo'] = identificar_tipo_y_doc_imp(df_imp)
     df_imp = df_imp[df_imp['_Doc_Norm'] != ""]
     
     # Limpieza de NIT (Preservando ceros)
-    df_imp['_NIT_Norm'] = df_imp[col_rif].apply(limpiar_nit_preservando_ceros) if col_rif else "0"
+    df_imp['_NIT_Norm'] = limpiar_nit_preservando_ceros(df_imp[col_rif]) if col_rif else "0"
     
     # Montos y Nombres
     df_imp['_Monto_Imprenta'] = pd.to_numeric(df_imp[col_iva], errors='coerce').fillna(0).abs()
@@ -3031,33 +3276,20 @@ def run_conciliation_debito_fiscal(df_soft_total, df_imprenta_logica, tolerancia
         suffixes=('_soft', '_imp')
     )
 
-    # --- 6. LÓGICA DE CLASIFICACIÓN DE ESTADO ---
-    def clasificar_resultado(row):
-        tipo_final = row['_Tipo_imp'] if pd.notna(row['_Tipo_imp']) else row['_Tipo_soft']
-        nombre_final = row['_Nombre_Imp'] if pd.notna(row['_Nombre_Imp']) else row['_Nombre_Soft']
-        m_s = float(row['_Monto_Bs_Soft']) if pd.notna(row['_Monto_Bs_Soft']) else 0.0
-        m_i = float(row['_Monto_Imprenta']) if pd.notna(row['_Monto_Imprenta']) else 0.0
-        
-        # 1. Ambos en cero (Filtro de exentos)
-        if m_i <= 0.001 and m_s <= 0.001: return "OK", tipo_final, nombre_final
-        
-        # 2. Solo en Softland
-        if row['_merge'] == 'left_only': 
-            return "NO APARECE EN LIBRO DE VENTAS", tipo_final, nombre_final
-        
-        # 3. Solo en Imprenta
-        if row['_merge'] == 'right_only': 
-            return "NO APARECE EN CONTABILIDAD", tipo_final, nombre_final
-        
-        # 4. En ambos pero con diferencia
-        dif = abs(m_s - m_i)
-        if dif > tolerancia_bs: 
-            return f"DIFERENCIA DE MONTO (Bs. {dif:,.2f})", tipo_final, nombre_final
-        
-        return "OK", tipo_final, nombre_final
-
-    # Aplicar Veredicto
-    merged[['Estado', '_Tipo_Final', '_Nombre_Final']] = merged.apply(clasificar_resultado, axis=1, result_type='expand')
+    # --- 6. LÓGICA DE CLASIFICACIÓN DE ESTADO (por columna) ---
+    m_s = pd.to_numeric(merged['_Monto_Bs_Soft'], errors='coerce').fillna(0.0).to_numpy(float)
+    m_i = pd.to_numeric(merged['_Monto_Imprenta'], errors='coerce').fillna(0.0).to_numpy(float)
+    dif = np.abs(m_s - m_i)
+    con_diferencia = dif > tolerancia_bs
+    msg_diferencia = np.full(len(merged), "", dtype=object)
+    msg_diferencia[con_diferencia] = [f"DIFERENCIA DE MONTO (Bs. {d:,.2f})" for d in dif[con_diferencia]]
+
+    # Aplicar Veredicto: 1. ambos en cero (exentos), 2. solo Softland, 3. solo Imprenta, 4. diferencia de monto
+    merged['Estado'] = np.select(
+        [(m_i <= 0.001) & (m_s <= 0.001), (merged['_merge'] == 'left_only').to_numpy(), (merged['_merge'] == 'right_only').to_numpy(), con_diferencia],
+        ["OK", "NO APARECE EN LIBRO DE VENTAS", "NO APARECE EN CONTABILIDAD", msg_diferencia], "OK")
+    merged['_Tipo_Final'] = merged['_Tipo_imp'].where(merged['_Tipo_imp'].notna(), merged['_Tipo_soft'])
+    merged['_Nombre_Final'] = merged['_Nombre_Imp'].where(merged['_Nombre_Imp'].notna(), merged['_Nombre_Soft'])
     
     log_messages.append(f"✔️ Auditoría finalizada con éxito.")
     return merged
@@ -3948,37 +4180,7 @@ def limpiar_monto_pdf(texto):
     Convierte texto a float. Maneja formatos US/VE, paréntesis y guiones (-).
     """
     if not texto: return 0.0
-    t = str(texto).strip()
-    
-    # CASO: Guion solo (Cero contable)
-    if t == '-': return 0.0
-        
-    t = t.replace(' ', '').replace('$', '').replace('Bs', '') # Limpieza general
-    
-    # Manejo de negativos (1.00) -> -1.00
-    signo = 1
-    if '(' in t and ')' in t:
-        signo = -1
-        t = t.replace('(', '').replace(')', '')
-    elif '-' in t:
-        signo = -1
-        t = t.replace('-', '') # Quitamos el menos para procesar el número
-        
-    # Detección de formato decimal (Inteligente)
-    idx_punto = t.rfind('.')
-    idx_coma = t.rfind(',')
-
-    if idx_punto > idx_coma:
-        t = t.replace(',', '') # US: 1,234.56 -> 1234.56
-    elif idx_coma > idx_punto:
-        t = t.replace('.', '').replace(',', '.') # VE: 1.234,56 -> 1234.56
-    elif idx_coma != -1 and idx_punto == -1:
-        t = t.replace(',', '.') # Solo comas
-        
-    try:
-        return float(t) * signo
-    except ValueError:
-        return 0.0
+    return convertir_monto(str(texto))
 
 def es_texto_numerico(texto):
     """
@@ -4497,16 +4699,11 @@ def extraer_saldos_cg_ajustes(archivo, log_messages):
     if not archivo: return datos_cg
     
     try:
-        archivo.seek(0)
-        df = pd.read_excel(archivo, header=None)
-        
-        # 1. Localizar inicio de datos
-        start_row = 0
-        for i, row in df.iterrows():
-            vals = [str(x).upper().strip() for x in row.values]
-            if "CUENTA" in vals:
-                start_row = i + 1
-                break
+        # 1. Los datos empiezan tras la celda "CUENTA"; sin ella se recorre la hoja desde el inicio
+        df, _ = leer_excel_con_encabezado(archivo, ['CUENTA'], minimo=1, exacto=True)
+        if df is None:
+            archivo.seek(0)
+            df = pd.read_excel(archivo, header=None)
         
         # 2. Sub-función de limpieza que NO borra decimales
         def clean_val_logic(v):
@@ -4519,9 +4716,8 @@ def extraer_saldos_cg_ajustes(archivo, log_messages):
             except:
                 return 0.0
 
-        # 3. Procesamiento de filas
-        for i in range(start_row, len(df)):
-            fila = df.iloc[i]
+        # 3. Procesamiento de filas (por posición de columna)
+        for fila in df.itertuples(index=False, name=None):
             cuenta = str(fila[0]).strip()
             
             # REGLA: Inicia con 1 o 2, tiene puntos y no es cuenta de grupo (.000)
@@ -4933,17 +5129,9 @@ def run_conciliation_comisiones_bancarias(df_cb_raw, df_cg_raw, empresa_sel, log
     mapeo_identidad = mapeos.get(empresa_sel, {})
     
     # --- 2. PROCESAMIENTO DEL REPORTE DE TESORERÍA (CB) ---
-    df_cb = df_cb_raw.copy()
-    header_found = False
-    for i in range(len(df_cb)):
-        row_values = [str(val).strip().upper() for val in df_cb.iloc[i].values]
-        if 'ASIENTO' in row_values:
-            df_cb.columns = [str(c).strip() for c in df_cb.iloc[i]]
-            df_cb = df_cb.iloc[i + 1:].reset_index(drop=True)
-            header_found = True
-            break
+    df_cb = aplicar_encabezado(df_cb_raw, ['ASIENTO'], filas_busqueda=None, exacto=True)
             
-    if not header_found:
+    if df_cb is None:
         log_messages.append("❌ ERROR: No se detectó la cabecera en el reporte de Tesorería.")
         return pd.DataFrame()
 
@@ -5081,19 +5269,12 @@ def run_conciliation_anexos(df_cb_raw, df_cg_raw, empresa_sel, log_messages):
     mapeo_identidad = mapeos.get(empresa_sel, {})
 
     # 2. PROCESAMIENTO DE TESORERÍA (CB)
-    header_idx = None
-    for i in range(min(15, len(df_cb_raw))):
-        fila = [str(x).upper().strip() for x in df_cb_raw.iloc[i].values]
-        if "ASIENTO" in fila:
-            header_idx = i
-            break
+    df_cb = aplicar_encabezado(df_cb_raw, ['ASIENTO'], filas_busqueda=15, exacto=True)
             
-    if header_idx is None:
+    if df_cb is None:
         log_messages.append("❌ ERROR: No se encontró la cabecera 'ASIENTO' en Anexos.")
         return pd.DataFrame()
 
-    df_cb = df_cb_raw.iloc[header_idx+1:].copy()
-    df_cb.columns = [str(c).strip() for c in df_cb_raw.iloc[header_idx].values]
     df_cb = df_cb[df_cb['Asiento'].notna() & df_cb['Asiento'].astype(str).str.contains(r'CB|CC|CG', na=False, case=False)]
 
     def clean_val(v):
@@ -5412,17 +5593,9 @@ def run_conciliation_comisiones_bancarias_cofersa(df_cb_raw, df_cg_raw, log_mess
     log_messages.append("--- Iniciando Auditoría Comisiones Cofersa ---")
 
     # 1. Preparar Reporte Tesorería
-    df_cb = df_cb_raw.copy()
-    header_found = False
-    for i in range(len(df_cb)):
-        row_values = [str(val).strip().upper() for val in df_cb.iloc[i].values]
-        if 'ASIENTO' in row_values:
-            df_cb.columns = [str(c).strip() for c in df_cb.iloc[i]]
-            df_cb = df_cb.iloc[i + 1:].reset_index(drop=True)
-            header_found = True
-            break
+    df_cb = aplicar_encabezado(df_cb_raw, ['ASIENTO'], filas_busqueda=None, exacto=True)
             
-    if not header_found:
+    if df_cb is None:
         log_messages.append("❌ ERROR: No se detectó la cabecera en el reporte de Tesorería.")
         return pd.DataFrame()
 
@@ -5493,15 +5666,8 @@ def run_conciliation_anexos_cofersa(df_cb_raw, df_cg_raw, log_messages):
     log_messages.append("--- INICIANDO AUDITORÍA ANEXOS COFERSA ---")
     
     # 1. Preparar CB
-    header_idx = None
-    for i in range(min(15, len(df_cb_raw))):
-        fila = [str(x).upper().strip() for x in df_cb_raw.iloc[i].values]
-        if "ASIENTO" in fila:
-            header_idx = i; break
-            
-    if header_idx is None: return pd.DataFrame()
-    df_cb = df_cb_raw.iloc[header_idx+1:].copy()
-    df_cb.columns = [str(c).strip() for c in df_cb_raw.iloc[header_idx].values]
+    df_cb = aplicar_encabezado(df_cb_raw, ['ASIENTO'], filas_busqueda=15, exacto=True)
+    if df_cb is None: return pd.DataFrame()
 
     # 2. Radar de Columnas CG
     c_asiento = buscar_columna_comisiones(df_cg_raw, ["ASIENTO"])
@@ -3,11 +3,16 @@
 import pandas as pd
 import numpy as np
 import re
+import os
+import json
+import hashlib
+import functools
 import xlsxwriter
 from io import BytesIO
 import streamlit as st    
 import unicodedata
 import datetime
+import time
 
 # ==============================================================================
 # 1. FUNCIONES AUXILIARES Y DE LIMPIEZA
@@ -22,11 +27,651 @@ def get_col_idx(df, possible_names):
         if col in possible_names:
             return idx
     return -1
-    
-@st.cache_data
+
+# --- Conversión vectorizada de montos (formatos US "1,234.56" y VE "1.234,56") ---
+def convertir_montos(valores, si_ambiguo='decimal', centimos=False, estilo=None, parentesis_negativo=True):
+    """
+    Convierte una columna de montos (números, textos US/VE, 'Bs', '$', '(1,00)', '1.234-')
+    a float en una sola pasada, usando operaciones Series.str sobre los valores únicos.
+    - Si la columna ya es numérica se devuelve tal cual (NaN -> 0).
+    - El separador decimal se decide por celda cuando es inequívoco ("1.234,56", "355,44",
+      "1,234,567"). Los casos dudosos ("1.234", "1,234") dependen de `estilo`:
+      None (por defecto) aplica `si_ambiguo`: 'decimal' los lee como 1.234, igual que los
+      limpiadores anteriores, y 'miles' como 1234. 'US' o 'VE' fijan ese estilo
+      ("1.234" es 1.234 en US y 1234 en VE).
+    - El signo menos siempre es negativo; los paréntesis solo con parentesis_negativo=True
+      (los cargadores de mayor los ignoran: "(1.234,56)" es 1234.56, como antes).
+    - Textos no convertibles valen 0. Con centimos=True devuelve int64 en céntimos.
+    """
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(valores)
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        montos = serie.astype(float).fillna(0.0)
+    else:
+        codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+        montos_unicos = _convertir_montos_unicos(pd.Series(unicos, dtype=object), si_ambiguo, estilo, parentesis_negativo)
+        montos = pd.Series(np.append(montos_unicos, 0.0)[codigos], index=serie.index)
+    if centimos:
+        return pd.Series(np.rint(montos.to_numpy() * 100).astype(np.int64), index=serie.index)
+    return montos
+
+def _tipo_texto_rapido():
+    """'string[pyarrow]' si pyarrow está instalado (operaciones .str en C++); si no, object."""
+    try:
+        import pyarrow  # noqa: F401
+        return 'string[pyarrow]'
+    except ImportError:
+        return object
+
+def _clasificar_montos(crudo):
+    """
+    Limpia textos de montos (Series de texto) y clasifica cada uno. Devuelve (t, decimal, solo_p, solo_c):
+    separador decimal 'P' punto, 'C' coma, 'M' solo miles/sin separador, 'A' ambiguo.
+    """
+    # El punto de "Bs." no es separador; uno inicial (".50", ",50") sí es el decimal
+    t = crudo.str.replace(r'[A-Za-zÀ-ÿ][.,]|[^\d.,]', '', regex=True).str.rstrip('.,')
+    inicial = t.str.contains(r'^[.,]\d+$', regex=True).to_numpy(dtype=bool)
+    tiene_p = t.str.contains('.', regex=False).to_numpy(dtype=bool)
+    tiene_c = t.str.contains(',', regex=False).to_numpy(dtype=bool)
+    ultimo_p = t.str.contains(r'\.\d*$', regex=True).to_numpy(dtype=bool)
+    varios = t.str.contains(r'\..*\.|,.*,', regex=True).to_numpy(dtype=bool)
+    cola_3 = t.str.contains(r'[.,]\d{3}$', regex=True).to_numpy(dtype=bool)
+    solo_p, solo_c = tiene_p & ~tiene_c, tiene_c & ~tiene_p
+
+    # Separador decimal por celda: 'P' punto, 'C' coma, 'M' solo miles/sin separador, 'A' ambiguo
+    decimal = np.select(
+        [inicial & solo_p, inicial & solo_c, tiene_p & tiene_c & ultimo_p, tiene_p & tiene_c, varios,
+         solo_p & ~cola_3, solo_c & ~cola_3, solo_p | solo_c],
+        ['P', 'C', 'P', 'C', 'M', 'P', 'C', 'A'], 'M')
+    return t, decimal, solo_p, solo_c
+
+def _convertir_montos_unicos(unicos, si_ambiguo, estilo=None, parentesis_negativo=True):
+    """Núcleo de convertir_montos sobre valores únicos (objeto). Devuelve un arreglo float."""
+    es_texto = unicos.map(type).eq(str).to_numpy()
+    resultado = pd.to_numeric(unicos.where(~es_texto), errors='coerce').to_numpy(dtype=float)
+    if not es_texto.any(): return np.nan_to_num(resultado)
+
+    crudo = unicos[es_texto].astype(_tipo_texto_rapido())
+    negativo = crudo.str.contains(r'[(\-]' if parentesis_negativo else '-', regex=True).to_numpy(dtype=bool)
+    t, decimal, solo_p, solo_c = _clasificar_montos(crudo)
+    ambiguo = decimal == 'A'
+    if estilo is None:
+        decimal = np.where(ambiguo, np.where(solo_p, 'P', 'C') if si_ambiguo == 'decimal' else 'M', decimal)
+    else:
+        # Estilo US: "1.234" es decimal y "1,234" son miles; estilo VE al revés
+        punto_decimal = estilo == 'US'
+        decimal = np.where(ambiguo & solo_p, 'P' if punto_decimal else 'M', decimal)
+        decimal = np.where(ambiguo & solo_c, 'M' if punto_decimal else 'C', decimal)
+
+    normalizar = {
+        'P': lambda x: x.str.replace(',', '', regex=False),
+        'C': lambda x: x.str.replace('.', '', regex=False).str.replace(',', '.', regex=False),
+        'M': lambda x: x.str.replace(r'[.,]', '', regex=True),
+    }
+    montos = np.zeros(len(t))
+    for separador, funcion in normalizar.items():
+        seleccion = np.flatnonzero(decimal == separador)
+        if not len(seleccion): continue
+        texto = funcion(t.iloc[seleccion])
+        valido = texto.str.contains(r'^\d*\.?\d+$', regex=True).to_numpy(dtype=bool)
+        montos[seleccion[valido]] = texto[valido].astype(float).to_numpy(dtype=float)
+    resultado[es_texto] = np.where(negativo, -montos, montos) + 0.0  # + 0.0 evita el -0.0 de un guion suelto
+    return np.nan_to_num(resultado)
+
+def convertir_monto(valor, si_ambiguo='decimal', estilo=None, parentesis_negativo=True):
+    """
+    Versión escalar de convertir_montos para valores sueltos (PDF, filas individuales):
+    mismas reglas por celda; lo dudoso sigue `estilo` ('US'/'VE') o, sin él, `si_ambiguo`.
+    """
+    if isinstance(valor, (int, float, np.number)): return 0.0 if pd.isna(valor) else float(valor)
+    if not isinstance(valor, str): return 0.0
+    negativo = '-' in valor or (parentesis_negativo and '(' in valor)
+    t = re.sub(r'[A-Za-zÀ-ÿ][.,]|[^\d.,]', '', valor).rstrip('.,')
+    n_p, n_c = t.count('.'), t.count(',')
+    if re.fullmatch(r'[.,]\d+', t): decimal = t[0]
+    elif n_p and n_c: decimal = '.' if t.rfind('.') > t.rfind(',') else ','
+    elif n_p > 1 or n_c > 1: decimal = None
+    elif n_p or n_c:
+        separador = '.' if n_p else ','
+        ambiguo = len(t) - t.rfind(separador) - 1 == 3
+        if not ambiguo: decimal = separador
+        elif estilo: decimal = separador if (separador == '.') == (estilo == 'US') else None
+        else: decimal = separador if si_ambiguo == 'decimal' else None
+    else: decimal = None
+
+    if decimal == '.': t = t.replace(',', '')
+    elif decimal == ',': t = t.replace('.', '').replace(',', '.')
+    else: t = t.replace('.', '').replace(',', '')
+    try: monto = float(t)
+    except ValueError: return 0.0
+    return -monto if negativo and monto else monto
+
+# --- Lectura de Excel: motores intercambiables (calamine / openpyxl solo-lectura) ---
+PALABRAS_ENCABEZADO_MAYOR = ['ASIENTO', 'FUENTE', 'FECHA', 'REFERENCIA', 'NIT', 'DEBITO', 'CREDITO', 'DÉBITO', 'CRÉDITO']
+FILAS_VISTA_PREVIA = 15
+
+def calamine_disponible():
+    """True si python-calamine está instalado (pandas lo expone como engine='calamine')."""
+    try:
+        import python_calamine  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+# Firmas (bytes iniciales) de los formatos aceptados; lo que no coincide se trata como CSV
+FIRMAS_FORMATO = ((b'PAR1', 'parquet'), (b'PK\x03\x04', 'xlsx'), (b'\xd0\xcf\x11\xe0', 'xls'))
+
+def formato_archivo(archivo_buffer):
+    """Formato real del archivo según sus primeros bytes (no la extensión): 'xlsx', 'xls', 'parquet' o 'csv'."""
+    archivo_buffer.seek(0)
+    cabecera = archivo_buffer.read(8)
+    archivo_buffer.seek(0)
+    return next((formato for firma, formato in FIRMAS_FORMATO if cabecera.startswith(firma)), 'csv')
+
+def elegir_motor_excel(archivo_buffer, motor='auto'):
+    """Elige el motor para un archivo: el indicado, o calamine si está instalado y si no openpyxl (xlrd para .xls)."""
+    if motor != 'auto': return motor
+    if calamine_disponible(): return 'calamine'
+    return 'xlrd' if formato_archivo(archivo_buffer) == 'xls' else 'openpyxl'
+
+def motor_lectura(archivo_buffer, motor='auto'):
+    """Cómo leer el archivo: 'parquet', 'csv' o el motor de Excel que corresponda."""
+    formato = formato_archivo(archivo_buffer)
+    return formato if formato in ('parquet', 'csv') else elegir_motor_excel(archivo_buffer, motor)
+
+def _filas_hoja_openpyxl(hoja, **kwargs_filas):
+    """
+    Tuplas de valores de una hoja openpyxl solo-lectura sin confiar en su rango <dimension> guardado,
+    que muchas exportaciones de ERP traen errado: como pandas, se lee hasta la última celda real
+    y se quitan las celdas vacías del final de cada fila (las filas quedan de largo variable).
+    """
+    hoja.reset_dimensions()
+    for fila in hoja.iter_rows(values_only=True, **kwargs_filas):
+        fin = len(fila)
+        while fin and fila[fin - 1] is None: fin -= 1
+        yield fila[:fin]
+
+def _tabla_de_filas(encabezado, filas):
+    """DataFrame de filas de largo variable; el encabezado se completa con 'Unnamed: i' hasta la fila más ancha."""
+    df = pd.DataFrame(filas)
+    ancho = max(len(encabezado), df.shape[1])
+    columnas = _nombres_columnas_unicos(tuple(encabezado) + (None,) * (ancho - len(encabezado)))
+    return df.reindex(columns=range(ancho)).set_axis(columnas, axis=1)
+
+def _filas_openpyxl(archivo_buffer, desde=0, hasta=None):
+    """Recorre la primera hoja en modo solo-lectura devolviendo tuplas de valores (sin estilos)."""
+    from openpyxl import load_workbook
+    archivo_buffer.seek(0)
+    libro = load_workbook(archivo_buffer, read_only=True, data_only=True)
+    try:
+        return list(_filas_hoja_openpyxl(libro.worksheets[0], min_row=desde + 1, max_row=hasta))
+    finally:
+        libro.close()
+
+def vista_previa_excel(archivo_buffer, motor, nrows=FILAS_VISTA_PREVIA):
+    """Primeras filas de la primera hoja, sin encabezado, para detectar dónde empieza la tabla."""
+    if motor == 'openpyxl':
+        return pd.DataFrame(_filas_openpyxl(archivo_buffer, hasta=nrows))
+    archivo_buffer.seek(0)
+    return pd.read_excel(archivo_buffer, engine=motor, header=None, nrows=nrows)
+
+# --- Detección del encabezado (servicio común de todos los cargadores) ---
+FILAS_BUSQUEDA_ENCABEZADO = 20
+
+def _texto_encabezado(valor):
+    """Texto de una celda para comparar encabezados: sin acentos, en mayúsculas y sin saltos de línea."""
+    texto = unicodedata.normalize('NFD', str(valor).replace('\n', ' '))
+    return ''.join(c for c in texto if unicodedata.category(c) != 'Mn').upper().strip()
+
+def detectar_fila_encabezado(df_vista, palabras_clave, minimo=2, exacto=False, requeridas=(), por_defecto=0):
+    """
+    Devuelve la fila (base 0) que contiene más palabras clave (sin importar acentos ni mayúsculas).
+    - exacto=True: la palabra debe ser la celda completa ('ASIENTO' sí, 'ASIENTOS DEL MES' no).
+    - requeridas: palabras que la fila debe tener obligatoriamente.
+    Si ninguna fila llega a `minimo` coincidencias devuelve `por_defecto`.
+    """
+    claves = list(dict.fromkeys(_texto_encabezado(p) for p in palabras_clave))
+    requeridas = [_texto_encabezado(p) for p in requeridas]
+    mejor_fila, mejor_puntaje = por_defecto, 0
+    for i, fila in enumerate(df_vista.itertuples(index=False)):
+        celdas = [_texto_encabezado(v) for v in fila if pd.notna(v)]
+        if exacto:
+            presentes = set(celdas)
+            contiene = presentes.__contains__
+        else:
+            texto = ' '.join(celdas)
+            contiene = texto.__contains__
+        if not all(contiene(p) for p in requeridas): continue
+        puntaje = sum(1 for p in claves if contiene(p))
+        if puntaje >= minimo and puntaje > mejor_puntaje: mejor_fila, mejor_puntaje = i, puntaje
+    return mejor_fila
+
+def leer_excel_con_encabezado(archivo, palabras_clave, hoja=0, filas_busqueda=FILAS_BUSQUEDA_ENCABEZADO, minimo=2,
+                              exacto=False, requeridas=(), por_defecto=None, **kwargs_lectura):
+    """
+    Lee una hoja ubicando antes su encabezado: primero solo `filas_busqueda` filas (nrows) para
+    puntuar las palabras clave, luego una única lectura completa con header=, sin re-cortar la tabla.
+    `archivo` puede ser un buffer o un pd.ExcelFile. Devuelve (df, fila_encabezado);
+    (None, None) si no se encontró el encabezado y no hay `por_defecto`.
+    """
+    if hasattr(archivo, 'seek'): archivo.seek(0)
+    vista = pd.read_excel(archivo, sheet_name=hoja, header=None, nrows=filas_busqueda)
+    fila = detectar_fila_encabezado(vista, palabras_clave, minimo, exacto, requeridas, por_defecto)
+    if fila is None: return None, None
+    if hasattr(archivo, 'seek'): archivo.seek(0)
+    return pd.read_excel(archivo, sheet_name=hoja, header=fila, **kwargs_lectura), fila
+
+def iterar_hojas_excel(archivo, filas=FILAS_BUSQUEDA_ENCABEZADO):
+    """
+    Recorre las hojas de un .xlsx de forma perezosa (openpyxl solo-lectura): por cada hoja entrega
+    (nombre, DataFrame con sus primeras `filas` filas) sin parsear el resto del libro.
+    """
+    from openpyxl import load_workbook
+    archivo.seek(0)
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        for hoja in libro.worksheets:
+            yield hoja.title, pd.DataFrame(list(_filas_hoja_openpyxl(hoja, max_row=filas)))
+    finally:
+        libro.close()
+
+def buscar_hoja_con_encabezado(archivo, palabras_clave, filas=FILAS_BUSQUEDA_ENCABEZADO, minimo=2, exacto=False, requeridas=()):
+    """Primera hoja cuyas primeras filas contienen el encabezado buscado. Devuelve (nombre_hoja, fila) o (None, None)."""
+    for nombre, vista in iterar_hojas_excel(archivo, filas):
+        fila = detectar_fila_encabezado(vista, palabras_clave, minimo, exacto, requeridas, por_defecto=None)
+        if fila is not None: return nombre, fila
+    return None, None
+
+def aplicar_encabezado(df, palabras_clave, filas_busqueda=FILAS_BUSQUEDA_ENCABEZADO, minimo=1, exacto=False, requeridas=()):
+    """
+    Para DataFrames ya leídos: si sus columnas ya son el encabezado las deja (sin espacios sobrantes);
+    si no, lo busca en las primeras filas (todas con filas_busqueda=None) y corta la tabla ahí.
+    Devuelve None si no aparece.
+    """
+    if detectar_fila_encabezado(pd.DataFrame([list(df.columns)]), palabras_clave, minimo, exacto, requeridas, por_defecto=None) is None:
+        vista = df if filas_busqueda is None else df.head(filas_busqueda)
+        fila = detectar_fila_encabezado(vista, palabras_clave, minimo, exacto, requeridas, por_defecto=None)
+        if fila is None: return None
+        columnas = df.iloc[fila].values
+        df = df.iloc[fila + 1:].reset_index(drop=True)
+        df.columns = columnas
+    else:
+        df = df.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+def _nombres_columnas_unicos(encabezado):
+    """Nombres de columna al estilo pandas: 'Unnamed: i' para vacíos y sufijo .1, .2 para repetidos."""
+    nombres, vistos = [], {}
+    for i, valor in enumerate(encabezado):
+        nombre = f'Unnamed: {i}' if valor is None or (isinstance(valor, str) and not valor.strip()) else valor
+        if nombre in vistos:
+            vistos[nombre] += 1
+            nombre = f'{nombre}.{vistos[nombre]}'
+        else:
+            vistos[nombre] = 0
+        nombres.append(nombre)
+    return nombres
+
+def leer_excel_rapido(archivo_buffer, log_messages, motor='auto', palabras_encabezado=PALABRAS_ENCABEZADO_MAYOR):
+    """
+    Lee la primera hoja de un Excel con el motor más rápido disponible.
+    1. Vista previa de las primeras filas para ubicar el encabezado.
+    2. Lectura completa desde esa fila: calamine si está instalado, si no
+       openpyxl en modo solo-lectura (solo valores). Si calamine falla se reintenta con openpyxl.
+    Registra en el log el motor usado. Con palabras_encabezado=None se toma la fila 0 como encabezado.
+    """
+    nombre = getattr(archivo_buffer, 'name', 'archivo')
+    motor = elegir_motor_excel(archivo_buffer, motor)
+    try:
+        fila_encabezado = detectar_fila_encabezado(vista_previa_excel(archivo_buffer, motor), palabras_encabezado) if palabras_encabezado else 0
+        inicio = time.perf_counter()
+        if motor == 'openpyxl':
+            filas = _filas_openpyxl(archivo_buffer, desde=fila_encabezado)
+            df = _tabla_de_filas(filas[0], filas[1:]) if filas else pd.DataFrame()
+            df = df.fillna(np.nan)  # Celdas vacías como NaN (igual que read_excel/read_csv), no None
+            df.dropna(how='all', inplace=True)
+            df.reset_index(drop=True, inplace=True)
+        else:
+            archivo_buffer.seek(0)
+            df = pd.read_excel(archivo_buffer, engine=motor, header=fila_encabezado)
+    except Exception as e:
+        if motor == 'openpyxl': raise
+        log_messages.append(f"⚠️ El motor '{motor}' no pudo leer '{nombre}' ({e}). Reintentando con openpyxl...")
+        return leer_excel_rapido(archivo_buffer, log_messages, motor='openpyxl', palabras_encabezado=palabras_encabezado)
+
+    segundos = time.perf_counter() - inicio
+    log_messages.append(f"ℹ️ '{nombre}' leído con motor {motor} en {segundos:.1f} s ({len(df)} filas, encabezado en fila {fila_encabezado + 1}).")
+    return df
+
+# --- CSV y Parquet exportados directamente del ERP ---
+def _decodificar_csv(contenido):
+    """Texto del CSV: UTF-8 (con o sin BOM) y, si no lo es, Latin-1 (exportaciones de Windows)."""
+    try:
+        return contenido.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return contenido.decode('latin-1')
+
+def leer_csv_rapido(archivo_buffer, log_messages, palabras_encabezado=PALABRAS_ENCABEZADO_MAYOR):
+    """
+    Lee un CSV con el parser en C de pandas. Separador (, ; tab |) detectado sobre la muestra inicial
+    y encabezado ubicado con las mismas palabras clave que en Excel. Todo se lee como texto (un "1.500" VE
+    no es 1.5 ni un NIT "00123" pierde ceros): los montos los tipa convertir_montos y las fechas se leen día/mes/año.
+    """
+    import csv
+    from io import StringIO
+    from itertools import islice
+    nombre = getattr(archivo_buffer, 'name', 'archivo')
+    inicio = time.perf_counter()
+    archivo_buffer.seek(0)
+    texto = _decodificar_csv(archivo_buffer.read())
+    try:
+        separador = csv.Sniffer().sniff(texto[:20_000], delimiters=',;\t|').delimiter
+    except csv.Error:
+        separador = ','
+    fila_encabezado = 0
+    if palabras_encabezado:
+        vista = pd.DataFrame(list(islice(csv.reader(StringIO(texto), delimiter=separador), FILAS_VISTA_PREVIA)))
+        fila_encabezado = detectar_fila_encabezado(vista, palabras_encabezado)
+    df = pd.read_csv(StringIO(texto), sep=separador, skiprows=fila_encabezado, skip_blank_lines=False, dtype=str)
+    df.dropna(how='all', inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    for col in df.columns:
+        if 'FECHA' in _texto_encabezado(col) and df[col].dtype == object:
+            df[col] = pd.to_datetime(df[col], dayfirst=True, format='mixed', errors='coerce')
+    log_messages.append(f"ℹ️ '{nombre}' leído como CSV (separador '{separador}') en {time.perf_counter() - inicio:.1f} s ({len(df)} filas, encabezado en fila {fila_encabezado + 1}).")
+    return df
+
+def leer_tabla_rapido(archivo_buffer, log_messages, motor='auto', palabras_encabezado=PALABRAS_ENCABEZADO_MAYOR):
+    """Lee Excel, CSV o Parquet según los bytes iniciales del archivo (ver motor_lectura)."""
+    if motor == 'auto': motor = motor_lectura(archivo_buffer)
+    if motor == 'parquet':
+        nombre = getattr(archivo_buffer, 'name', 'archivo')
+        inicio = time.perf_counter()
+        archivo_buffer.seek(0)
+        df = pd.read_parquet(archivo_buffer).fillna(np.nan)  # Nulos de texto como NaN, no None
+        log_messages.append(f"ℹ️ '{nombre}' leído como Parquet en {time.perf_counter() - inicio:.1f} s ({len(df)} filas).")
+        return df
+    if motor == 'csv':
+        return leer_csv_rapido(archivo_buffer, log_messages, palabras_encabezado)
+    return leer_excel_rapido(archivo_buffer, log_messages, motor=motor, palabras_encabezado=palabras_encabezado)
+
+# --- Lectura por lotes (streaming) para saldos anteriores de varios años ---
+UMBRAL_BYTES_POR_LOTES = 20_000_000  # Desde este tamaño el archivo anterior se lee por lotes
+FILAS_POR_LOTE = 50_000
+
+def tamano_archivo(archivo):
+    """Tamaño en bytes de un archivo subido o buffer, sin leerlo."""
+    if getattr(archivo, 'size', None) is not None: return archivo.size
+    posicion = archivo.tell()
+    archivo.seek(0, os.SEEK_END)
+    tamano = archivo.tell()
+    archivo.seek(posicion)
+    return tamano
+
+def iterar_lotes_excel(archivo_buffer, filas_por_lote=FILAS_POR_LOTE, fila_encabezado=0):
+    """
+    Genera la primera hoja en DataFrames crudos de hasta `filas_por_lote` filas (openpyxl solo-lectura),
+    sin filas vacías. Una hoja sin datos genera un único DataFrame vacío con sus columnas.
+    """
+    from itertools import islice
+    from openpyxl import load_workbook
+    archivo_buffer.seek(0)
+    libro = load_workbook(archivo_buffer, read_only=True, data_only=True)
+    hubo_datos = False
+    try:
+        filas = _filas_hoja_openpyxl(libro.worksheets[0], min_row=fila_encabezado + 1)
+        encabezado = next(filas, ())
+        columnas = _nombres_columnas_unicos(encabezado)
+        while True:
+            bloque = list(islice(filas, filas_por_lote))
+            if not bloque: break
+            df_lote = _tabla_de_filas(encabezado, bloque).fillna(np.nan).dropna(how='all')
+            del bloque
+            if df_lote.empty: continue
+            hubo_datos = True
+            yield df_lote.reset_index(drop=True)
+    finally:
+        libro.close()
+    if not hubo_datos:
+        yield pd.DataFrame(columns=columnas)
+
+def leer_excel_por_lotes(archivo_buffer, log_messages, procesar_lote, filas_por_lote=FILAS_POR_LOTE, palabras_encabezado=PALABRAS_ENCABEZADO_MAYOR):
+    """
+    Lee la primera hoja en streaming (iterar_lotes_excel) de `filas_por_lote` en `filas_por_lote` filas.
+    Cada lote pasa por `procesar_lote(df_lote, log)` (mapeo de columnas, limpieza de montos) y solo se
+    acumula el resultado ya limpio: la memoria pico depende del tamaño del lote y no del archivo.
+    El log de procesar_lote se registra solo para el primer lote (los demás repetirían lo mismo).
+    """
+    nombre = getattr(archivo_buffer, 'name', 'archivo')
+    fila_encabezado = detectar_fila_encabezado(vista_previa_excel(archivo_buffer, 'openpyxl'), palabras_encabezado) if palabras_encabezado else 0
+    inicio = time.perf_counter()
+    lotes, total = [], 0
+    for df_lote in iterar_lotes_excel(archivo_buffer, filas_por_lote, fila_encabezado):
+        total += len(df_lote)
+        lotes.append(procesar_lote(df_lote, log_messages if not lotes else []))
+
+    df = pd.concat(lotes, ignore_index=True) if len(lotes) > 1 else lotes[0]
+    log_messages.append(f"ℹ️ '{nombre}' leído por lotes de {filas_por_lote} filas en {time.perf_counter() - inicio:.1f} s ({total} filas, {len(lotes)} lotes, encabezado en fila {fila_encabezado + 1}).")
+    return df
+
+# --- Lectura en paralelo de los archivos "actual" y "anterior" ---
+UMBRAL_BYTES_PARALELO = 1_000_000  # Hilos: por debajo, la lectura en serie ya es inmediata
+# Procesos 'spawn': cada trabajador importa utils/pandas/streamlit (~1.3 s) antes de leer, y openpyxl lee
+# ~2.2-3 s por MB. El pool solo ahorra la lectura de los archivos que no son el mayor: con 2 MB fuera del
+# mayor (~5 s en serie) la ganancia ya duplica el arranque; con 1 MB en total apenas lo empataba.
+UMBRAL_BYTES_PROCESOS = 2_000_000
+
+def _leer_excel_trabajador(contenido, nombre, motor, palabras_encabezado):
+    """Lee un Excel/CSV/Parquet desde sus bytes (ejecutable en otro proceso). Devuelve (df, log, error)."""
+    buffer = BytesIO(contenido)
+    buffer.name = nombre
+    log = []
+    try:
+        return leer_tabla_rapido(buffer, log, motor=motor, palabras_encabezado=palabras_encabezado), log, None
+    except Exception as e:
+        return None, log, e
+
+def leer_excels_en_paralelo(archivos, log_messages, motor='auto', palabras_encabezado=PALABRAS_ENCABEZADO_MAYOR):
+    """
+    Lee varios archivos a la vez con leer_tabla_rapido y devuelve [(df, error), ...] en el mismo orden.
+    - calamine, CSV y Parquet: hilos (el parseo ocurre en C/Rust, fuera del GIL).
+    - openpyxl: procesos 'spawn' (Python puro, el GIL serializa los hilos).
+    Archivos pequeños (UMBRAL_BYTES_PARALELO / UMBRAL_BYTES_PROCESOS), un solo núcleo o un fallo del pool -> lectura en serie.
+    """
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+    tareas = []
+    for archivo in archivos:
+        archivo.seek(0)
+        tareas.append((archivo.read(), getattr(archivo, 'name', 'archivo'), motor_lectura(archivo, motor), palabras_encabezado))
+        archivo.seek(0)
+
+    trabajadores = min(len(tareas), os.cpu_count() or 1)
+    con_hilos = all(t[2] in ('calamine', 'csv', 'parquet') for t in tareas)
+    tamanos = [len(t[0]) for t in tareas]
+    if con_hilos: en_paralelo = sum(tamanos) >= UMBRAL_BYTES_PARALELO
+    else: en_paralelo = sum(tamanos) - max(tamanos, default=0) >= UMBRAL_BYTES_PROCESOS  # Lo que se lee a la vez que el mayor
+    en_paralelo = en_paralelo and trabajadores > 1
+    resultados = None
+    if en_paralelo:
+        inicio = time.perf_counter()
+        try:
+            if con_hilos:
+                ejecutor = ThreadPoolExecutor(max_workers=trabajadores)
+            else:
+                import multiprocessing
+                ejecutor = ProcessPoolExecutor(max_workers=trabajadores, mp_context=multiprocessing.get_context('spawn'))
+            with ejecutor:
+                resultados = list(ejecutor.map(_leer_excel_trabajador, *zip(*tareas)))
+            log_messages.append(f"ℹ️ {len(tareas)} archivos leídos en paralelo en {time.perf_counter() - inicio:.1f} s.")
+        except Exception as e:
+            log_messages.append(f"⚠️ No se pudo leer en paralelo ({e}). Leyendo en serie...")
+    if resultados is None:
+        resultados = [_leer_excel_trabajador(*t) for t in tareas]
+
+    salida = []
+    for df, log, error in resultados:
+        log_messages.extend(log)
+        salida.append((df, error))
+    return salida
+
+# --- Caché de carga por contenido (SHA-256 de los archivos + versión del cargador + huella del código) ---
+DIRECTORIO_CACHE_CARGA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache_carga')
+LIMITE_CACHE_CARGA_BYTES = 512 * 1024 * 1024  # Tope en disco; se descartan primero las entradas menos usadas
+
+def _huella_codigo_carga():
+    """Huella de la limpieza: el código de este módulo (cargadores, lectores, montos) y la versión de pandas."""
+    with open(os.path.abspath(__file__), 'rb') as f:
+        return hashlib.sha256(f.read() + pd.__version__.encode()).hexdigest()[:16]
+
+HUELLA_CODIGO_CARGA = _huella_codigo_carga()
+
+def columnas_mixtas_a_texto(df):
+    """Columnas object con números y textos mezclados -> texto (NaN se conserva). Parquet exige un tipo por columna."""
+    for i in range(df.shape[1]):
+        serie = df.iloc[:, i]
+        if serie.dtype == object and pd.api.types.infer_dtype(serie, skipna=True).startswith('mixed'):
+            df.isetitem(i, serie.where(serie.isna(), serie.astype(str)))
+    return df
+
+# --- Compactación de tipos del mayor cargado ---
+UMBRAL_CATEGORIA = 0.5  # Textos con menos de un 50% de valores distintos -> category
+COLUMNAS_SIN_COMPACTAR = ('Grupo_Conciliado', 'Referencia_Normalizada_Literal')  # Las fases escriben etiquetas nuevas aquí
+COLUMNAS_CENTIMOS = ('Monto_BS_c', 'Monto_USD_c')  # Montos enteros: aunque solo traigan 0/1 no son banderas
+
+def _tipo_texto_compacto():
+    """Texto respaldado por pyarrow con NaN como faltante (comparaciones y .str devuelven bool de numpy); si no, object."""
+    try:
+        import pyarrow  # noqa: F401
+        return pd.StringDtype('pyarrow', na_value=np.nan)
+    except ImportError:
+        return object
+
+def compactar_tipos(df, log_messages, texto_libre=False):
+    """
+    Reduce la memoria del mayor cargado sin cambiar sus valores:
+    - Claves de texto con pocos valores distintos (Fuente, NIT, Tipo...) -> category.
+    - Banderas object con solo True/False -> bool; banderas enteras con solo 0/1 -> int8.
+    - Con texto_libre=True, el resto del texto (Referencia, Asiento...) -> cadenas pyarrow.
+      Solo para DataFrames que se guardan en sesión: en las fases de cruce los recortes
+      por fila de las cadenas pyarrow son más lentos que con object.
+    Las fases que recorren Fuente/Referencia celda a celda lo hacen sobre texto_celdas (logic.py).
+    Registra en el log la memoria antes y después.
+    """
+    antes = df.memory_usage(deep=True).sum()
+    df = columnas_mixtas_a_texto(df)
+    tipo_texto = _tipo_texto_compacto() if texto_libre else object
+    for i, col in enumerate(df.columns):
+        serie = df.iloc[:, i]
+        if col in COLUMNAS_SIN_COMPACTAR: continue
+        if pd.api.types.is_integer_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+            if col not in COLUMNAS_CENTIMOS and serie.isin((0, 1)).all(): df.isetitem(i, serie.astype(np.int8))
+            continue
+        if serie.dtype != object: continue
+        tipo = pd.api.types.infer_dtype(serie, skipna=True)
+        if tipo == 'boolean' and serie.notna().all():
+            df.isetitem(i, serie.astype(bool))
+        elif tipo == 'string':
+            if serie.nunique(dropna=True) <= len(serie) * UMBRAL_CATEGORIA: df.isetitem(i, serie.astype('category'))
+            elif tipo_texto is not object: df.isetitem(i, serie.astype(tipo_texto))
+    despues = df.memory_usage(deep=True).sum()
+    log_messages.append(f"ℹ️ Tipos compactados: memoria {antes / 1e6:.1f} MB -> {despues / 1e6:.1f} MB.")
+    return df
+
+def descompactar_tipos(df):
+    """Copia con category y cadenas pyarrow de vuelta a object, para los reportes que rellenan texto libremente."""
+    df = df.copy()
+    for i in range(df.shape[1]):
+        if isinstance(df.iloc[:, i].dtype, (pd.CategoricalDtype, pd.StringDtype)):
+            df.isetitem(i, df.iloc[:, i].astype(object))
+    return df
+
+def _huella_entrada(entrada):
+    """Bytes que identifican una entrada: el contenido del archivo o, si es un DataFrame, su hash por filas."""
+    if isinstance(entrada, pd.DataFrame):
+        return (str(list(entrada.columns)) + str(list(entrada.dtypes))).encode() + pd.util.hash_pandas_object(entrada).values.tobytes()
+    if hasattr(entrada, 'getvalue'): return entrada.getvalue()
+    entrada.seek(0)
+    contenido = entrada.read()
+    entrada.seek(0)
+    return contenido
+
+def _clave_cache_carga(nombre_cargador, version, entradas):
+    sha = hashlib.sha256(f'{nombre_cargador}|v{version}|{HUELLA_CODIGO_CARGA}'.encode())
+    for entrada in entradas:
+        huella = _huella_entrada(entrada)
+        sha.update(len(huella).to_bytes(8, 'little'))
+        sha.update(huella)
+    return sha.hexdigest()
+
+def _podar_cache_carga():
+    """Borra las entradas usadas hace más tiempo hasta quedar bajo LIMITE_CACHE_CARGA_BYTES."""
+    entradas = []
+    for f in os.listdir(DIRECTORIO_CACHE_CARGA):
+        if f.endswith('.parquet'):
+            ruta = os.path.join(DIRECTORIO_CACHE_CARGA, f)
+            entradas.append((os.path.getmtime(ruta), os.path.getsize(ruta), ruta))
+    total = sum(e[1] for e in entradas)
+    for _, tamano, ruta in sorted(entradas):
+        if total <= LIMITE_CACHE_CARGA_BYTES: break
+        for r in (ruta, ruta[:-len('.parquet')] + '.log.json'):
+            if os.path.exists(r): os.remove(r)
+        total -= tamano
+
+def cache_de_carga(version):
+    """
+    Decorador para cargadores (actual, anterior, log_messages) -> DataFrame.
+    Guarda el DataFrame limpio en Parquet bajo la clave SHA-256 de los archivos + versión del cargador:
+    volver a correr sobre los mismos archivos no re-parsea nada. La clave lleva además la huella del
+    código de utils.py, así que cualquier cambio en la limpieza invalida lo guardado aunque no se suba
+    `version` (que queda para forzarlo por otros motivos, p. ej. cambios de lógica fuera de este módulo).
+    El log de la carga se guarda aparte y se repite en cada acierto, marcado como tal.
+    """
+    def decorador(cargador):
+        @functools.wraps(cargador)
+        def envoltura(uploaded_actual, uploaded_anterior, log_messages):
+            clave = _clave_cache_carga(cargador.__name__, version, [uploaded_actual, uploaded_anterior])
+            ruta = os.path.join(DIRECTORIO_CACHE_CARGA, f'{clave}.parquet')
+            ruta_log = os.path.join(DIRECTORIO_CACHE_CARGA, f'{clave}.log.json')
+            if os.path.exists(ruta):
+                try:
+                    df = pd.read_parquet(ruta).fillna(np.nan)  # Nulos de texto como NaN, no None (igual que la carga)
+                    with open(ruta_log, encoding='utf-8') as f: log_original = json.load(f)
+                    os.utime(ruta)  # LRU: marca la entrada como recién usada
+                    log_messages.append(f"♻️ Archivos sin cambios: datos limpios tomados de la caché de carga ({clave[:12]}). Registro de la carga original:")
+                    log_messages.extend(log_original)
+                    return df
+                except Exception as e:
+                    log_messages.append(f"⚠️ No se pudo usar la caché de carga ({e}). Procesando los archivos...")
+
+            log_carga = []
+            df = cargador(uploaded_actual, uploaded_anterior, log_carga)
+            log_messages.extend(log_carga)
+            if df is None: return None
+            # Mismo DataFrame en la primera corrida y en las siguientes (las que vienen de Parquet)
+            df = columnas_mixtas_a_texto(df)
+            try:
+                os.makedirs(DIRECTORIO_CACHE_CARGA, exist_ok=True)
+                df.to_parquet(ruta + '.tmp', index=False)
+                with open(ruta_log, 'w', encoding='utf-8') as f: json.dump(log_carga, f, ensure_ascii=False)
+                os.replace(ruta + '.tmp', ruta)
+                _podar_cache_carga()
+            except Exception as e:
+                log_messages.append(f"⚠️ No se pudo guardar la caché de carga ({e}).")
+            return df
+        return envoltura
+    return decorador
+
+@cache_de_carga(version=2)
 def cargar_y_limpiar_datos(uploaded_actual, uploaded_anterior, log_messages):
-    """Carga, limpia y unifica los archivos de Excel."""
-    
+    """
+    Carga, limpia y unifica los archivos de Excel.
+    uploaded_anterior puede ser un DataFrame del almacén de saldos abiertos: ya viene limpio y no se re-lee.
+    Acepta .xlsx, .xls, CSV y Parquet (formato detectado por sus bytes iniciales).
+    Un .xlsx anterior desde UMBRAL_BYTES_POR_LOTES se lee y limpia por lotes (leer_excel_por_lotes).
+    """
+    COLUMNAS_MONTO = ['Débito Bolivar', 'Crédito Bolivar', 'Débito Dolar', 'Crédito Dolar']
+
     # --- FUNCIONES AUXILIARES INTERNAS ---
     def mapear_columnas_financieras(df, log_messages):
         DEBITO_SYNONYMS = ['debito', 'debitos', 'débito', 'débitos', 'debe']
@@ -57,35 +702,21 @@ def cargar_y_limpiar_datos(uploaded_actual, uploaded_anterior, log_messages):
         df.rename(columns=column_mapping, inplace=True)
         return df
 
-    def limpiar_numero_avanzado(texto):
-        if texto is None or str(texto).strip().lower() == 'nan': return '0.0'
-        
-        # Limpieza inicial
-        t = re.sub(r'[^\d.,-]', '', str(texto).strip())
-        if not t: return '0.0'
-        
-        # Detección inteligente
-        idx_punto = t.rfind('.')
-        idx_coma = t.rfind(',')
-
-        if idx_punto > idx_coma:
-            # Formato "81,268.96" -> Eliminar comas
-            return t.replace(',', '')
-            
-        elif idx_coma > idx_punto:
-            # Formato "81.268,96" -> Eliminar puntos, coma a punto
-            return t.replace('.', '').replace(',', '.')
-            
-        return t.replace(',', '.') # Fallback estándar
+    def procesar_excel(lectura):
+        df, error = lectura
+        if error is not None:
+            log_messages.append(f"❌ Error al leer el archivo Excel: {error}")
+            return None
+        return limpiar_df(df, log_messages)
 
-    def procesar_excel(archivo_buffer):
+    def leer_anterior_por_lotes(archivo):
         try:
-            archivo_buffer.seek(0)
-            df = pd.read_excel(archivo_buffer, engine='openpyxl')
+            return leer_excel_por_lotes(archivo, log_messages, limpiar_df)
         except Exception as e:
             log_messages.append(f"❌ Error al leer el archivo Excel: {e}")
             return None
 
+    def limpiar_df(df, log_messages):
         COLUMN_STANDARDIZATION_MAP = {
             'Asiento': ['ASIENTO', 'Asiento'],
             'Fuente': ['FUENTE', 'Fuente'],
@@ -114,15 +745,26 @@ def cargar_y_limpiar_datos(uploaded_actual, uploaded_anterior, log_messages):
         df['Referencia'] = df.get('Referencia', pd.Series(dtype='str')).astype(str).str.strip()
         df['Fecha'] = pd.to_datetime(df.get('Fecha'), errors='coerce')
 
-        for col in ['Débito Bolivar', 'Crédito Bolivar', 'Débito Dolar', 'Crédito Dolar']:
+        for col in COLUMNAS_MONTO:
             if col in df.columns:
-                temp_serie = df[col].apply(limpiar_numero_avanzado)
-                df[col] = pd.to_numeric(temp_serie, errors='coerce').fillna(0.0).round(2)
+                # Sin estilo de columna (cada lote se lee igual que la tabla completa); paréntesis sin signo, como antes
+                df[col] = convertir_montos(df[col], parentesis_negativo=False).round(2)
         return df
 
     # --- EJECUCIÓN PRINCIPAL ---
-    df_actual = procesar_excel(uploaded_actual)
-    df_anterior = procesar_excel(uploaded_anterior)
+    if isinstance(uploaded_anterior, pd.DataFrame):
+        # Saldos anteriores desde el almacén local: solo se lee el Excel del mes actual
+        df_actual = procesar_excel(leer_excels_en_paralelo([uploaded_actual], log_messages)[0])
+        df_anterior = uploaded_anterior.copy()
+    elif formato_archivo(uploaded_anterior) == 'xlsx' and tamano_archivo(uploaded_anterior) >= UMBRAL_BYTES_POR_LOTES:
+        # Saldos anteriores de varios años: el archivo grande se lee y limpia por lotes
+        df_actual = procesar_excel(leer_excels_en_paralelo([uploaded_actual], log_messages)[0])
+        df_anterior = leer_anterior_por_lotes(uploaded_anterior)
+    else:
+        # Lectura simultánea de ambos archivos; la limpieza, el concat y los netos van después
+        lectura_actual, lectura_anterior = leer_excels_en_paralelo([uploaded_actual, uploaded_anterior], log_messages)
+        df_actual = procesar_excel(lectura_actual)
+        df_anterior = procesar_excel(lectura_anterior)
 
     if df_actual is None or df_anterior is None:
         st.error("❌ ¡Error Fatal! No se pudo procesar uno o ambos archivos Excel.")
@@ -157,14 +799,17 @@ def cargar_y_limpiar_datos(uploaded_actual, uploaded_anterior, log_messages):
 
     df_full['Monto_BS'] = (df_full.get('Débito Bolivar', 0) - df_full.get('Crédito Bolivar', 0)).round(2)
     df_full['Monto_USD'] = (df_full.get('Débito Dolar', 0) - df_full.get('Crédito Dolar', 0)).round(2)
+    # Montos en céntimos enteros: los cruces comparan y agrupan enteros exactos, sin deriva de flotantes
+    for col in ['Monto_BS', 'Monto_USD']:
+        df_full[f'{col}_c'] = np.rint(df_full[col].fillna(0) * 100).astype('int64')
     df_full[['Conciliado', 'Grupo_Conciliado', 'Referencia_Normalizada_Literal']] = [False, np.nan, np.nan]
 
     # --- LOG DE VERIFICACIÓN (AHORA EN EL LUGAR CORRECTO) ---
     log_messages.append(f"✅ Datos cargados. Filas archivo anterior: {len(df_anterior)}, Actual: {len(df_actual)}. Total consolidado: {len(df_full)}")
     
-    return df_full
+    return compactar_tipos(df_full, log_messages)
 
-@st.cache_data
+@cache_de_carga(version=2)
 def cargar_datos_cofersa(uploaded_actual, uploaded_anterior, log_messages):
     import unicodedata
 
@@ -173,22 +818,10 @@ def cargar_datos_cofersa(uploaded_actual, uploaded_anterior, log_messages):
         return ''.join(c for c in unicodedata.normalize('NFD', texto)
                       if unicodedata.category(c) != 'Mn').upper().strip()
 
-    def limpiar_monto_robusto(val):
-        if pd.isna(val) or str(val).strip() in ['', '-', 'nan']: return 0.0
-        if isinstance(val, (int, float)): return float(val)
-        t = str(val).strip().replace('Bs', '').replace('$', '').replace(' ', '')
-        if ',' in t and '.' in t:
-            if t.rfind(',') > t.rfind('.'): t = t.replace(',', '')
-            else: t = t.replace('.', '').replace(',', '.')
-        elif ',' in t: t = t.replace(',', '.')
-        t = re.sub(r'[^\d.-]', '', t)
-        try: return float(t)
-        except: return 0.0
-
-    def procesar_excel_cofersa(archivo_buffer):
+    def procesar_excel_cofersa(lectura):
         try:
-            archivo_buffer.seek(0)
-            df = pd.read_excel(archivo_buffer, engine='openpyxl')
+            df, error = lectura
+            if error is not None: raise error
             
             # --- MAPEO DE COLUMNAS DENTRO DEL PROCESADOR ---
             rename_map = {}
@@ -212,7 +845,7 @@ def cargar_datos_cofersa(uploaded_actual, uploaded_anterior, log_messages):
 
             # Limpieza de montos inmediata
             for c in ['Débito Colones', 'Crédito Colones', 'Débito Dolar', 'Crédito Dolar']:
-                if c in df.columns: df[c] = df[c].apply(limpiar_monto_robusto)
+                if c in df.columns: df[c] = convertir_montos(df[c], parentesis_negativo=False)
                 else: df[c] = 0.0
             
             return df
@@ -221,8 +854,9 @@ def cargar_datos_cofersa(uploaded_actual, uploaded_anterior, log_messages):
             return None
 
     # --- EJECUCIÓN PRINCIPAL DE CARGA ---
-    df_act = procesar_excel_cofersa(uploaded_actual)
-    df_ant = procesar_excel_cofersa(uploaded_anterior)
+    lectura_act, lectura_ant = leer_excels_en_paralelo([uploaded_actual, uploaded_anterior], log_messages, palabras_encabezado=None)
+    df_act = procesar_excel_cofersa(lectura_act)
+    df_ant = procesar_excel_cofersa(lectura_ant)
 
     if df_act is None or df_ant is None: return None
 
@@ -238,7 +872,7 @@ def cargar_datos_cofersa(uploaded_actual, uploaded_anterior, log_messages):
     df_full['Conciliado'] = False
     
     log_messages.append(f"✅ Datos cargados y normalizados a Colones.")
-    return df_full
+    return compactar_tipos(df_full, log_messages)
     
 @st.cache_data
 def generar_excel_saldos_abiertos(df_saldos_abiertos):
@@ -247,6 +881,7 @@ def generar_excel_saldos_abiertos(df_saldos_abiertos):
     Mantiene el formato numérico correcto para que la herramienta lo lea bien el próximo mes.
     """
     output = BytesIO()
+    df_saldos_abiertos = descompactar_tipos(df_saldos_abiertos)
     
     # Definir las columnas estándar que espera la herramienta al cargar
     columnas_exportar = [
@@ -291,6 +926,58 @@ def generar_excel_saldos_abiertos(df_saldos_abiertos):
 
     return output.getvalue()
 
+# --- Almacén local de saldos abiertos (Parquet por empresa + cuenta + periodo) ---
+DIRECTORIO_SALDOS_ABIERTOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saldos_abiertos')
+COLUMNAS_SALDOS_ABIERTOS = [
+    'Asiento', 'Referencia', 'Fecha',
+    'Débito Bolivar', 'Crédito Bolivar',
+    'Débito Dolar', 'Crédito Dolar',
+    'Fuente', 'Nombre del Proveedor', 'NIT', 'Descripcion NIT'
+]
+
+def _segmento_ruta(texto):
+    """Convierte casa/cuenta en un nombre de carpeta seguro ('FEBECA, C.A' -> 'FEBECA_C.A')."""
+    return re.sub(r'[^\w.\-]+', '_', str(texto).strip()).strip('_') or 'SIN_NOMBRE'
+
+def _carpeta_saldos_abiertos(casa, cuenta):
+    num_cta = str(cuenta).split(' - ')[0]
+    return os.path.join(DIRECTORIO_SALDOS_ABIERTOS, _segmento_ruta(casa), _segmento_ruta(num_cta))
+
+def _ruta_saldos_abiertos(casa, cuenta, periodo):
+    return os.path.join(_carpeta_saldos_abiertos(casa, cuenta), f'{periodo}.parquet')
+
+def periodo_de_fecha(fecha):
+    """Periodo 'AAAA-MM' de una fecha; None si no es válida."""
+    return None if pd.isna(fecha) else pd.Timestamp(fecha).strftime('%Y-%m')
+
+def guardar_saldos_abiertos(df_saldos_abiertos, casa, cuenta, periodo):
+    """
+    Guarda los pendientes del periodo ya limpios (mismas columnas que el Excel de saldos).
+    El próximo mes se cargan con cargar_saldos_abiertos sin volver a parsear ni normalizar.
+    Devuelve la ruta escrita.
+    """
+    cols_existentes = [c for c in COLUMNAS_SALDOS_ABIERTOS if c in df_saldos_abiertos.columns]
+    df_guardar = columnas_mixtas_a_texto(df_saldos_abiertos[cols_existentes].reset_index(drop=True))
+
+    ruta = _ruta_saldos_abiertos(casa, cuenta, periodo)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = ruta + '.tmp'
+    df_guardar.to_parquet(temporal, index=False)
+    os.replace(temporal, ruta)  # Escritura atómica: nunca queda un archivo a medias
+    return ruta
+
+def listar_periodos_saldos(casa, cuenta):
+    """Periodos guardados para la empresa y cuenta, del más reciente al más antiguo."""
+    carpeta = _carpeta_saldos_abiertos(casa, cuenta)
+    if not os.path.isdir(carpeta): return []
+    return sorted((f[:-len('.parquet')] for f in os.listdir(carpeta) if f.endswith('.parquet')), reverse=True)
+
+def cargar_saldos_abiertos(casa, cuenta, periodo):
+    """Saldos abiertos guardados, listos para usarse como 'saldos anteriores' en cargar_y_limpiar_datos."""
+    df = pd.read_parquet(_ruta_saldos_abiertos(casa, cuenta, periodo))
+    if 'Fecha' in df.columns: df['Fecha'] = pd.to_datetime(df['Fecha'], errors='coerce')
+    return df
+
 # ==============================================================================
 # 2. LOGICA MODULAR PARA REPORTES EXCEL
 # ==============================================================================
@@ -1083,6 +1770,7 @@ def generar_reporte_excel(_df_full, df_saldos_abiertos, df_conciliados, _estrate
     Nombres corregidos para evitar NameError.
     """
     output_excel = BytesIO()
+    _df_full, df_saldos_abiertos, df_conciliados = (descompactar_tipos(d) for d in (_df_full, df_saldos_abiertos, df_conciliados))
     
     with pd.ExcelWriter(output_excel, engine='xlsxwriter') as writer:
         workbook = writer.book
@@ -2754,6 +3442,7 @@ def generar_reporte_debito_fiscal(df_incidencias_raw, df_soft_raw, df_imp_raw):
 
 def generar_reporte_cofersa(df_procesado):
     output = BytesIO()
+    df_procesado = descompactar_tipos(df_procesado)
     
     # --- LIMPIEZA Y PREPARACIÓN ---
     cols_moneda = ['Débito Colones', 'Crédito Colones', 'Neto Colones', 'Débito Dolar', 'Crédito Dolar', 'Neto Dólar']
@@ -2912,24 +3601,15 @@ def generar_reporte_cofersa(df_procesado):
     return output.getvalue()
     
 
-@st.cache_data
+@cache_de_carga(version=2)
 def cargar_datos_fondos_cofersa(uploaded_actual, uploaded_anterior, log_messages):
     """
     Cargador exclusivo para Fondos en Tránsito COFERSA.
     Mapea 'Local' a 'Colones' y elimina referencias a VES.
     """
-    def limpiar_monto(val):
-        if pd.isna(val) or str(val).strip() in ['', '-', 'nan']: return 0.0
-        if isinstance(val, (int, float)): return float(val)
-        t = str(val).strip().replace(' ', '')
-        if ',' in t and '.' in t:
-            if t.rfind(',') > t.rfind('.'): t = t.replace('.', '').replace(',', '.')
-            else: t = t.replace(',', '')
-        elif ',' in t: t = t.replace(',', '.')
-        return pd.to_numeric(re.sub(r'[^\d.-]', '', t), errors='coerce') or 0.0
-
-    def procesar(buffer):
-        df = pd.read_excel(buffer, engine='openpyxl')
+    def procesar(lectura):
+        df, error = lectura
+        if error is not None: raise error
         rename_map = {}
         for col in df.columns:
             # NORMALIZACIÓN: Quitamos acentos y pasamos a mayúsculas (DÉBITOS -> DEBITOS)
@@ -2961,10 +3641,8 @@ def cargar_datos_fondos_cofersa(uploaded_actual, uploaded_anterior, log_messages
         # Limpieza de montos y cálculo del Neto (Monto_CRC)
         for c in ['Debito_CRC', 'Credito_CRC', 'Debito_USD', 'Credito_USD']:
             if c in df.columns:
-                # 1. Limpiamos caracteres extraños (comas, espacios, etc.)
-                df[c] = df[c].apply(limpiar_monto)
-                # 2. FORZAMOS a que Pandas lo vea como un número (esto quita el TypeError)
-                df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0.0)
+                # Texto US/VE o número: siempre sale float (NaN -> 0)
+                df[c] = convertir_montos(df[c], parentesis_negativo=False)
             else:
                 df[c] = 0.0
         
@@ -2973,14 +3651,15 @@ def cargar_datos_fondos_cofersa(uploaded_actual, uploaded_anterior, log_messages
         df['Monto_USD'] = (df['Debito_USD'] - df['Credito_USD']).round(2)
         return df
 
-    df_act = procesar(uploaded_actual)
-    df_ant = procesar(uploaded_anterior)
+    lectura_act, lectura_ant = leer_excels_en_paralelo([uploaded_actual, uploaded_anterior], log_messages, palabras_encabezado=None)
+    df_act = procesar(lectura_act)
+    df_ant = procesar(lectura_ant)
     df_full = pd.concat([df_ant, df_act], ignore_index=True)
     df_full['Fecha'] = pd.to_datetime(df_full['Fecha'], errors='coerce')
     df_full['Conciliado'] = False
     
     log_messages.append("✅ Datos de Fondos COFERSA cargados (CRC/USD).")
-    return df_full
+    return compactar_tipos(df_full, log_messages)
 
 def _generar_hoja_pendientes_fondos_cofersa(workbook, formatos, df_saldos, estrategia, casa, fecha_maxima):
     """Genera la hoja de saldos abiertos con la columna Monto Colones poblada correctamente."""